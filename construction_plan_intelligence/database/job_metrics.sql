@@ -0,0 +1,88 @@
+-- Construction Plan Intelligence - Job Metrics
+-- Purpose: Per-job, per-pass token / latency / cost accounting written by the worker
+-- Run after schema_fixed.sql (views use security_invoker, Postgres 15+)
+
+-- ============================================================================
+-- JOB METRICS
+-- ============================================================================
+
+-- One row per extraction pass per job (re-analysis replaces the rows), plus a
+-- pass = 'job' row with the job's memory profile (MEMORY_PROFILE), failed jobs included
+CREATE TABLE IF NOT EXISTS plan_job_metrics (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  job_id UUID NOT NULL REFERENCES plan_jobs(id) ON DELETE CASCADE,
+  user_id UUID NOT NULL,            -- Copied from plan_jobs for cheap aggregation
+  model TEXT NOT NULL,              -- OpenAI model name (e.g., gpt-4o)
+  pass TEXT NOT NULL,               -- pass1 | escalation | pass2 | job
+  calls INT NOT NULL DEFAULT 0,     -- API calls (chunks + retries)
+  prompt_tokens INT NOT NULL DEFAULT 0,
+  completion_tokens INT NOT NULL DEFAULT 0,
+  total_tokens INT NOT NULL DEFAULT 0,
+  image_count INT NOT NULL DEFAULT 0,
+  payload_bytes BIGINT NOT NULL DEFAULT 0,
+  wall_time_s NUMERIC(10, 3) NOT NULL DEFAULT 0,
+  cost_usd NUMERIC(12, 6) NOT NULL DEFAULT 0,
+  skipped TEXT,                     -- Reason if the pass did not run (local_audit | budget | cache | confident)
+  batch BOOLEAN NOT NULL DEFAULT FALSE,
+  peak_rss_mb NUMERIC(10, 1),       -- pass = 'job': peak worker RSS during the job
+  memory JSONB,                     -- pass = 'job': per-stage memory profile
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE plan_job_metrics ADD COLUMN IF NOT EXISTS peak_rss_mb NUMERIC(10, 1);
+ALTER TABLE plan_job_metrics ADD COLUMN IF NOT EXISTS memory JSONB;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_plan_job_metrics_pass ON plan_job_metrics(job_id, pass);
+CREATE INDEX IF NOT EXISTS idx_plan_job_metrics_user ON plan_job_metrics(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_plan_job_metrics_model ON plan_job_metrics(model, created_at DESC);
+
+-- ============================================================================
+-- AGGREGATES
+-- ============================================================================
+
+-- Daily spend and latency per user and model
+CREATE OR REPLACE VIEW plan_usage_by_user_model
+WITH (security_invoker = true) AS
+SELECT
+  user_id,
+  model,
+  date_trunc('day', created_at) AS day,
+  COUNT(DISTINCT job_id) AS jobs,
+  SUM(calls) AS calls,
+  SUM(prompt_tokens) AS prompt_tokens,
+  SUM(completion_tokens) AS completion_tokens,
+  SUM(total_tokens) AS total_tokens,
+  SUM(image_count) AS images,
+  SUM(payload_bytes) AS payload_bytes,
+  SUM(wall_time_s) AS wall_time_s,
+  SUM(cost_usd) AS cost_usd
+FROM plan_job_metrics
+WHERE pass <> 'job'
+GROUP BY user_id, model, date_trunc('day', created_at);
+
+-- Pass-level breakdown per model (where latency and spend go)
+CREATE OR REPLACE VIEW plan_usage_by_pass
+WITH (security_invoker = true) AS
+SELECT
+  model,
+  pass,
+  COUNT(*) FILTER (WHERE skipped IS NULL) AS runs,
+  COUNT(*) FILTER (WHERE skipped IS NOT NULL) AS skipped,
+  AVG(total_tokens) FILTER (WHERE skipped IS NULL) AS avg_tokens,
+  AVG(wall_time_s) FILTER (WHERE skipped IS NULL) AS avg_wall_time_s,
+  SUM(cost_usd) AS cost_usd
+FROM plan_job_metrics
+WHERE pass <> 'job'
+GROUP BY model, pass;
+
+-- ============================================================================
+-- ROW LEVEL SECURITY (RLS) POLICIES
+-- ============================================================================
+
+ALTER TABLE plan_job_metrics ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS job_metrics_select_own ON plan_job_metrics;
+
+-- Metrics: Users can see only their own (the worker writes with the service role)
+CREATE POLICY job_metrics_select_own ON plan_job_metrics
+  FOR SELECT USING (user_id = auth.uid());
@@ -0,0 +1,487 @@
+"""
+Batch Extraction Module
+Offline 2-pass extraction for non-urgent jobs (nightly backfills, bulk re-analysis)
+using the OpenAI Batch API
+
+Usage:
+    python batch_extract.py --status queued --limit 500
+    python batch_extract.py --job-id <uuid> --job-id <uuid>
+
+For local testing, run mock_batch_server.py and set
+OPENAI_BATCH_BASE_URL=http://localhost:8089/v1
+"""
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from openai import OpenAI
+
+import config
+import supabase_io as sio
+import openai_extract
+import request_payload
+import stage_metrics
+import validate
+from worker import PlanProcessor, configure_logging
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def get_batch_client() -> OpenAI:
+    """Create the OpenAI client used for batch files and batches"""
+    return OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BATCH_BASE_URL)
+
+
+# ============================================================================
+# BATCH FILES
+# ============================================================================
+
+class BatchFileWriter:
+    """Writes batch request lines to JSONL files, rotating at the API size limits"""
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str,
+        max_requests: int = config.BATCH_MAX_REQUESTS,
+        max_bytes: int = config.BATCH_MAX_FILE_MB * 1024 * 1024
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.paths: List[str] = []
+        self._file = None
+        self._count = 0
+        self._bytes = 0
+
+    def add(self, custom_id: str, body: Dict):
+        """
+        Append one chat completion request
+
+        Args:
+            custom_id: ID echoed back in the result line
+            body: Chat completion request body
+        """
+        request = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": body,
+        }
+        line_bytes = request_payload.json_length(request) + 1
+
+        if (
+            self._file is None
+            or self._count >= self.max_requests
+            or self._bytes + line_bytes > self.max_bytes
+        ):
+            self._rotate()
+
+        # Images are base64-encoded from disk straight into the file
+        for chunk in request_payload.iter_json_bytes(request):
+            self._file.write(chunk)
+        self._file.write(b"\n")
+        self._count += 1
+        self._bytes += line_bytes
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        path = self.directory / f"{self.prefix}_{len(self.paths):03d}.jsonl"
+        self.paths.append(str(path))
+        self._file = open(path, "wb")
+        self._count = 0
+        self._bytes = 0
+
+    def close(self) -> List[str]:
+        """
+        Close the current file
+
+        Returns:
+            Paths of all written batch files
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self.paths
+
+
+def submit_batch(client: OpenAI, batch_file_path: str, description: str) -> Dict:
+    """
+    Upload a batch input file and create the batch
+
+    Args:
+        client: OpenAI client
+        batch_file_path: Path to JSONL batch file
+        description: Batch description (stored in metadata)
+
+    Returns:
+        Batch object dict
+    """
+    with open(batch_file_path, "rb") as f:
+        input_file = client.files.create(
+            file=(Path(batch_file_path).name, f),
+            purpose="batch",
+        )
+
+    # The pinned SDK has no batches resource, so call the endpoint directly
+    batch = client.post(
+        "/batches",
+        body={
+            "input_file_id": input_file.id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": config.BATCH_COMPLETION_WINDOW,
+            "metadata": {"description": description},
+        },
+        cast_to=Dict[str, Any],
+    )
+
+    logger.info(f"Submitted batch {batch['id']} ({batch_file_path})")
+    return batch
+
+
+def wait_for_batch(
+    client: OpenAI,
+    batch_id: str,
+    poll_interval: int = config.BATCH_POLL_INTERVAL_SECONDS,
+    max_wait_seconds: float = config.BATCH_MAX_WAIT_HOURS * 3600
+) -> Dict:
+    """
+    Poll a batch until it reaches a terminal status
+
+    Args:
+        client: OpenAI client
+        batch_id: Batch ID
+        poll_interval: Seconds between polls
+        max_wait_seconds: Give up after this long (the batch is cancelled)
+
+    Returns:
+        Final batch object dict
+
+    Raises:
+        TimeoutError: If the batch did not finish within max_wait_seconds
+    """
+    deadline = time.monotonic() + max_wait_seconds
+    while True:
+        batch = client.get(f"/batches/{batch_id}", cast_to=Dict[str, Any])
+        status = batch.get("status")
+
+        if status in TERMINAL_BATCH_STATUSES:
+            logger.info(f"Batch {batch_id} finished with status: {status}")
+            return batch
+
+        if time.monotonic() >= deadline:
+            try:
+                client.post(f"/batches/{batch_id}/cancel", cast_to=Dict[str, Any])
+            except Exception as e:
+                logger.warning(f"Failed to cancel batch {batch_id}: {e}")
+            raise TimeoutError(f"Batch {batch_id} still {status} after {max_wait_seconds / 3600:.1f}h")
+
+        counts = batch.get("request_counts") or {}
+        logger.info(
+            f"Batch {batch_id} {status}: "
+            f"{counts.get('completed', 0)}/{counts.get('total', '?')} requests done"
+        )
+        time.sleep(poll_interval)
+
+
+def read_batch_results(client: OpenAI, batch: Dict) -> Dict[str, Dict]:
+    """
+    Download and parse a finished batch's output and error files
+
+    Args:
+        client: OpenAI client
+        batch: Final batch object dict
+
+    Returns:
+        Dict mapping custom_id -> {"result": parsed JSON or None,
+                                   "error": message or None,
+                                   "usage": token usage dict}
+    """
+    results: Dict[str, Dict] = {}
+
+    for file_key in ["output_file_id", "error_file_id"]:
+        file_id = batch.get(file_key)
+        if not file_id:
+            continue
+
+        content = client.files.content(file_id).text
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+
+            item = json.loads(line)
+            custom_id = item.get("custom_id")
+            response = item.get("response") or {}
+            body = response.get("body") or {}
+            entry = {"result": None, "error": None, "usage": {}}
+
+            if item.get("error"):
+                entry["error"] = str(item["error"])
+            elif response.get("status_code") != 200:
+                entry["error"] = f"HTTP {response.get('status_code')}: {body.get('error')}"
+            else:
+                openai_extract.record_usage(entry["usage"], body.get("usage"))
+                try:
+                    text = body["choices"][0]["message"]["content"] or ""
+                    entry["result"] = openai_extract.parse_json_response(text)
+                except (KeyError, IndexError, ValueError) as e:
+                    entry["error"] = f"Invalid JSON in batch response: {e}"
+
+            results[custom_id] = entry
+
+    return results
+
+
+def run_batch_round(client: OpenAI, batch_paths: List[str], label: str) -> Dict[str, Dict]:
+    """
+    Submit batch files, wait for all of them, and collect results
+
+    Args:
+        client: OpenAI client
+        batch_paths: Batch JSONL files
+        label: Round label (e.g., "pass1")
+
+    Returns:
+        Dict mapping custom_id -> result entry (see read_batch_results)
+    """
+    batches = [
+        submit_batch(client, path, f"plan extraction {label} ({Path(path).name})")
+        for path in batch_paths
+    ]
+
+    results: Dict[str, Dict] = {}
+    for batch in batches:
+        final_batch = wait_for_batch(client, batch["id"])
+        results.update(read_batch_results(client, final_batch))
+
+    return results
+
+
+# ============================================================================
+# JOB ORCHESTRATION
+# ============================================================================
+
+def run_batch_extraction(jobs: List[Dict], work_dir: Optional[str] = None) -> Dict[str, bool]:
+    """
+    Run 2-pass extraction for many jobs through the Batch API and save the results
+
+    Pass 1 requests for all jobs go into one batch round. Pass 2 audits go into
+    a second round, only for jobs whose local consistency checks fail
+    (or for all jobs when EXTRACTION_LOCAL_AUDIT is disabled).
+
+    Jobs are claimed first (supabase_io.claim_jobs); jobs a worker took since
+    they were listed are skipped. When a batch round fails, times out or is
+    interrupted, claimed jobs without a result go back to their previous status.
+
+    Args:
+        jobs: Job dicts (from supabase_io.list_jobs)
+        work_dir: Optional directory for batch files (default: temp dir)
+
+    Returns:
+        Dict mapping job_id -> success (claimed jobs only)
+    """
+    claimed = sio.claim_jobs(jobs)
+    if len(claimed) < len(jobs):
+        logger.warning(f"Skipping {len(jobs) - len(claimed)} jobs already processing or claimed by a worker")
+
+    outcome: Dict[str, bool] = {}
+    try:
+        _extract_claimed_jobs(claimed, work_dir, outcome)
+    finally:
+        for job in claimed:
+            if job["id"] not in outcome:
+                logger.warning(f"Batch extraction did not finish job {job['id']}, returning it to '{job['status']}'")
+                sio.update_job_status(job["id"], job["status"])
+                outcome[job["id"]] = False
+
+    succeeded = sum(1 for ok in outcome.values() if ok)
+    logger.info(f"Batch extraction finished: {succeeded}/{len(outcome)} jobs succeeded")
+
+    return outcome
+
+
+def _extract_claimed_jobs(jobs: List[Dict], work_dir: Optional[str], outcome: Dict[str, bool]):
+    """Body of run_batch_extraction(): records each finished job in outcome"""
+    work_dir = work_dir or tempfile.mkdtemp(prefix="plan_batch_")
+    client = get_batch_client()
+    prepared_jobs: Dict[str, Dict] = {}
+
+    # 1. Prepare each job and write its Pass 1 request
+    writer = BatchFileWriter(work_dir, "pass1")
+    for job in jobs:
+        processor = PlanProcessor(job)
+        try:
+            workspace = processor.setup_workspace()
+            local_file = processor.download_input(workspace)
+            prepared = processor.prepare(local_file, workspace)
+
+            page_groups_map = {
+                page_no: group
+                for group, pages in (prepared["page_groups"] or {}).items()
+                for page_no, _ in pages
+            }
+            tiles: List[Dict] = []
+            messages = openai_extract.build_pass1_messages(
+                prepared["image_paths"],
+                prepared["page_info"],
+                prepared["page_numbers"],
+                page_groups_map,
+                tiles_out=tiles,
+                page_texts=prepared["page_texts"]
+            )
+            writer.add(
+                f"{processor.job_id}:pass1",
+                {"messages": messages, **openai_extract.completion_params(stream=False)}
+            )
+
+            image_count, payload_bytes = openai_extract.measure_messages(messages)
+            prepared_jobs[processor.job_id] = {
+                "processor": processor,
+                "evidence": prepared["evidence"],
+                "page_numbers": prepared["page_numbers"],
+                "tiles": tiles,
+                "pass1_stats": {"calls": 1, "image_count": image_count, "payload_bytes": payload_bytes},
+                "pass2_stats": {},
+                "pass2_skipped": None,
+            }
+
+        except Exception as e:
+            logger.error(f"Batch preparation failed for job {processor.job_id}: {e}")
+            sio.update_job_status(processor.job_id, 'failed', str(e))
+            outcome[processor.job_id] = False
+
+        finally:
+            # Requests are on disk; page images are no longer needed
+            processor.cleanup_workspace()
+
+    pass1_paths = writer.close()
+    if not prepared_jobs:
+        return
+
+    # 2. Pass 1 round
+    logger.info(f"Batch Pass 1: {len(prepared_jobs)} jobs in {len(pass1_paths)} files")
+    started = time.perf_counter()
+    pass1_results = run_batch_round(client, pass1_paths, "pass1")
+    pass1_time = time.perf_counter() - started
+
+    final_results: Dict[str, Dict] = {}
+    writer = BatchFileWriter(work_dir, "pass2")
+    for job_id, job_state in prepared_jobs.items():
+        entry = pass1_results.get(f"{job_id}:pass1")
+        if not entry or entry["result"] is None:
+            error = entry["error"] if entry else "Missing from batch output"
+            logger.error(f"Batch Pass 1 failed for job {job_id}: {error}")
+            sio.update_job_status(job_id, 'failed', f"Batch extraction failed: {error}")
+            outcome[job_id] = False
+            continue
+
+        pass1_result = openai_extract.map_tile_evidence(entry["result"], job_state["tiles"])
+        job_state["pass1_result"] = pass1_result
+        openai_extract.record_usage(job_state["pass1_stats"], entry["usage"])
+
+        violations = None
+        if config.EXTRACTION_LOCAL_AUDIT:
+            violations = validate.check_consistency(pass1_result, job_state["page_numbers"])
+            if not violations:
+                job_state["pass2_skipped"] = "local_audit"
+                final_results[job_id] = pass1_result
+                continue
+
+        if openai_extract.pass2_exceeds_budget(job_state["pass1_stats"], pass1_result):
+            logger.warning(f"Batch Pass 2 skipped for job {job_id} (per-job budget would be exceeded)")
+            job_state["pass2_skipped"] = "budget"
+            review = pass1_result.setdefault("review", {})
+            review["needs_review"] = True
+            review.setdefault("flags", []).append("Audit skipped: per-job extraction budget exceeded")
+            final_results[job_id] = pass1_result
+            continue
+
+        messages = openai_extract.build_pass2_messages(pass1_result, violations)
+        image_count, payload_bytes = openai_extract.measure_messages(messages)
+        job_state["pass2_stats"] = {"calls": 1, "image_count": image_count, "payload_bytes": payload_bytes}
+        writer.add(
+            f"{job_id}:pass2",
+            {"messages": messages, **openai_extract.completion_params(stream=False)}
+        )
+
+    # 3. Pass 2 round (audits only where needed)
+    pass2_paths = writer.close()
+    pass2_time = 0.0
+    if pass2_paths:
+        logger.info(f"Batch Pass 2: auditing in {len(pass2_paths)} files")
+        started = time.perf_counter()
+        pass2_results = run_batch_round(client, pass2_paths, "pass2")
+        pass2_time = time.perf_counter() - started
+
+        for job_id, job_state in prepared_jobs.items():
+            if job_id in final_results or "pass1_result" not in job_state:
+                continue
+            entry = pass2_results.get(f"{job_id}:pass2")
+            if entry:
+                openai_extract.record_usage(job_state["pass2_stats"], entry["usage"])
+            if entry and entry["result"] is not None:
+                final_results[job_id] = entry["result"]
+            else:
+                # If audit fails, keep the Pass 1 result (same as the interactive path)
+                logger.warning(f"Batch Pass 2 failed for job {job_id}, using Pass 1 result")
+                final_results[job_id] = job_state["pass1_result"]
+
+    # 4. Validate and save
+    for job_id, final_result in final_results.items():
+        job_state = prepared_jobs[job_id]
+        processor = job_state["processor"]
+        # Wall time is the shared batch round time (the job waited for the whole round)
+        metrics = openai_extract.summarize_job(
+            {
+                "pass1": openai_extract.summarize_pass(
+                    job_state["pass1_stats"], pass1_time, batch=True
+                ),
+                "pass2": openai_extract.summarize_pass(
+                    job_state["pass2_stats"],
+                    0.0 if job_state["pass2_skipped"] else pass2_time,
+                    skipped=job_state["pass2_skipped"],
+                    batch=True
+                ),
+            },
+            budget_exceeded=job_state["pass2_skipped"] == "budget"
+        )
+        stage_metrics.record_passes(metrics)
+        try:
+            outcome[job_id] = processor.save_results(final_result, job_state["evidence"], metrics)
+        except Exception as e:
+            logger.error(f"Saving batch result failed for job {job_id}: {e}")
+            sio.update_job_status(job_id, 'failed', str(e))
+            outcome[job_id] = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch extraction for non-urgent plan jobs")
+    parser.add_argument("--status", help="Select jobs with this status (e.g., queued, completed)")
+    parser.add_argument("--job-id", action="append", dest="job_ids", help="Explicit job ID (repeatable)")
+    parser.add_argument("--limit", type=int, default=100, help="Maximum number of jobs")
+    parser.add_argument("--work-dir", help="Directory for batch JSONL files")
+    args = parser.parse_args()
+
+    if not args.status and not args.job_ids:
+        parser.error("Pass --status and/or --job-id")
+
+    jobs = sio.list_jobs(status=args.status, job_ids=args.job_ids, limit=args.limit)
+    logger.info(f"Selected {len(jobs)} jobs for batch extraction")
+
+    if jobs:
+        run_batch_extraction(jobs, args.work_dir)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    main()
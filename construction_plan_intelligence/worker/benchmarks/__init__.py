@@ -0,0 +1,3 @@
+"""
+Worker benchmarks (run from the worker directory: python -m benchmarks.run)
+"""
@@ -0,0 +1,304 @@
+"""
+PostgREST Stand-in
+A minimal PostgREST-compatible HTTP server over a Postgres database, so the
+Supabase client path of supabase_io can be load-tested without a Supabase stack
+
+Covers the table requests the worker makes: select with eq/neq/in/like/is
+filters, order, limit and count=exact; insert and upsert (on_conflict);
+update; delete. Each request runs as its own autocommit statement on a pooled
+connection, as in PostgREST, so client-side read-then-write sequences (like
+get_next_job over PostgREST) race the way they do in production.
+
+For load tests only: no auth, RLS, embedding or schema cache.
+
+Usage:
+    python -m benchmarks.postgrest_standin --database-url postgresql://localhost/plans --port 3000
+    NEXT_PUBLIC_SUPABASE_URL=http://127.0.0.1:3000 python -m benchmarks.queue_load --backend postgrest
+"""
+
+import argparse
+import json
+import logging
+import re
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+from uuid import UUID
+
+import psycopg
+from psycopg import sql
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+REST_PREFIX = "/rest/v1/"
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Query parameters that are not column filters
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+FILTER_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "LIKE"}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str, code: str = "PGRST100"):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def _identifier(name: str) -> sql.Identifier:
+    if not IDENTIFIER.match(name):
+        raise RequestError(400, f"Invalid identifier: {name!r}")
+    return sql.Identifier(name)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+# ============================================================================
+# QUERY TRANSLATION
+# ============================================================================
+
+def where_clause(params: List[Tuple[str, str]]) -> Tuple[sql.Composable, List]:
+    """Translate PostgREST column filters (col=op.value) into a WHERE clause"""
+    conditions = []
+    values: List = []
+    for column, expression in params:
+        if column in RESERVED_PARAMS:
+            continue
+        operator, _, value = expression.partition(".")
+        negate = operator == "not"
+        if negate:
+            operator, _, value = value.partition(".")
+
+        if operator in FILTER_OPERATORS:
+            if operator == "like":
+                value = value.replace("*", "%")
+            condition = sql.SQL("{} {} %s").format(_identifier(column), sql.SQL(FILTER_OPERATORS[operator]))
+            values.append(value)
+        elif operator == "in":
+            items = [item.strip().strip('"') for item in value.strip("()").split(",") if item.strip()]
+            condition = sql.SQL("{}::text = ANY(%s)").format(_identifier(column))
+            values.append(items)
+        elif operator == "is" and value in ("null", "true", "false"):
+            condition = sql.SQL("{} IS {}").format(_identifier(column), sql.SQL(value.upper()))
+        else:
+            raise RequestError(400, f"Unsupported filter: {column}={expression}")
+
+        conditions.append(sql.SQL("NOT ({})").format(condition) if negate else condition)
+
+    if not conditions:
+        return sql.SQL(""), values
+    return sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions), values
+
+
+def order_clause(order: Optional[str]) -> sql.Composable:
+    if not order:
+        return sql.SQL("")
+    terms = []
+    for term in order.split(","):
+        column, *modifiers = term.split(".")
+        direction = "DESC" if "desc" in modifiers else "ASC"
+        nulls = " NULLS FIRST" if "nullsfirst" in modifiers else " NULLS LAST" if "nullslast" in modifiers else ""
+        terms.append(sql.SQL("{} " + direction + nulls).format(_identifier(column)))
+    return sql.SQL(" ORDER BY ") + sql.SQL(", ").join(terms)
+
+
+def select_list(select: Optional[str]) -> sql.Composable:
+    if not select or select.strip() == "*":
+        return sql.SQL("*")
+    return sql.SQL(", ").join(_identifier(column.strip()) for column in select.split(","))
+
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like PostgREST behind Kong
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes
+    pool: ConnectionPool = None
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    # ------------------------------------------------------------------ helpers
+
+    def _parse(self) -> Tuple[sql.Identifier, List[Tuple[str, str]], Dict[str, str]]:
+        url = urlsplit(self.path)
+        if not url.path.startswith(REST_PREFIX):
+            raise RequestError(404, f"Not found: {url.path}", "PGRST404")
+        table = _identifier(url.path[len(REST_PREFIX):].strip("/"))
+        params = parse_qsl(url.query, keep_blank_values=True)
+        return table, params, dict(params)
+
+    def _prefer(self) -> Dict[str, str]:
+        prefer = {}
+        for item in (self.headers.get("Prefer") or "").split(","):
+            key, _, value = item.strip().partition("=")
+            if key:
+                prefer[key] = value
+        return prefer
+
+    def _body(self):
+        return json.loads(self._raw_body or b"null")
+
+    def _send(self, status: int, payload=None, headers: Optional[Dict[str, str]] = None, body: bool = True):
+        data = json.dumps(payload, default=_json_default).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data) if body else 0))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body and data:
+            self.wfile.write(data)
+
+    def _execute(self, query: sql.Composable, values=None, fetch: bool = True) -> List[Dict]:
+        with self.pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(query, values)
+            return cur.fetchall() if fetch and cur.description else []
+
+    def _handle(self, method):
+        # Always drain the body (the client sends one even with GET) to keep the connection usable
+        self._raw_body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            method()
+        except RequestError as e:
+            self._send(e.status, {"code": e.code, "message": str(e), "details": None, "hint": None})
+        except psycopg.Error as e:
+            status = 409 if e.sqlstate in ("23505", "23503") else 400
+            self._send(status, {"code": e.sqlstate, "message": str(e), "details": None, "hint": None})
+
+    # ------------------------------------------------------------------ verbs
+
+    def _select(self, body: bool = True):
+        table, params, query = self._parse()
+        where, values = where_clause(params)
+        statement = sql.SQL("SELECT {} FROM {}").format(select_list(query.get("select")), table) + where
+        statement += order_clause(query.get("order"))
+        if query.get("limit"):
+            statement += sql.SQL(" LIMIT {}").format(sql.Literal(int(query["limit"])))
+        if query.get("offset"):
+            statement += sql.SQL(" OFFSET {}").format(sql.Literal(int(query["offset"])))
+        rows = self._execute(statement, values)
+
+        headers = {"Content-Range": f"0-{max(len(rows) - 1, 0)}/*"}
+        if self._prefer().get("count") in ("exact", "planned", "estimated"):
+            count = self._execute(sql.SQL("SELECT count(*) AS count FROM {}").format(table) + where, values)
+            headers["Content-Range"] = f"0-{max(len(rows) - 1, 0)}/{count[0]['count']}"
+        self._send(200, rows, headers, body=body)
+
+    def _insert(self):
+        table, _, query = self._parse()
+        payload = self._body()
+        rows = payload if isinstance(payload, list) else [payload]
+        if not rows:
+            return self._send(201, [])
+        columns = sorted({column for row in rows for column in row})
+        column_list = sql.SQL(", ").join(_identifier(column) for column in columns)
+
+        statement = sql.SQL("INSERT INTO {table} ({columns}) SELECT {columns} FROM json_populate_recordset(NULL::{table}, %s)").format(
+            table=table, columns=column_list
+        )
+        prefer = self._prefer()
+        resolution = prefer.get("resolution")
+        if resolution:
+            conflict = sql.SQL(", ").join(
+                _identifier(column.strip()) for column in (query.get("on_conflict") or "id").split(",")
+            )
+            if resolution == "ignore-duplicates":
+                statement += sql.SQL(" ON CONFLICT ({}) DO NOTHING").format(conflict)
+            else:
+                updates = sql.SQL(", ").join(
+                    sql.SQL("{0} = EXCLUDED.{0}").format(_identifier(column)) for column in columns
+                )
+                statement += sql.SQL(" ON CONFLICT ({}) DO UPDATE SET {}").format(conflict, updates)
+        statement += sql.SQL(" RETURNING *")
+
+        result = self._execute(statement, [json.dumps(rows)])
+        self._send(201, result if prefer.get("return") == "representation" else None)
+
+    def _update(self):
+        table, params, _ = self._parse()
+        changes = self._body() or {}
+        if not changes:
+            raise RequestError(400, "Empty update")
+        where, values = where_clause(params)
+        columns = sorted(changes)
+        statement = sql.SQL("UPDATE {table} SET ({columns}) = (SELECT {columns} FROM json_populate_record(NULL::{table}, %s))").format(
+            table=table, columns=sql.SQL(", ").join(_identifier(column) for column in columns)
+        )
+        rows = self._execute(statement + where + sql.SQL(" RETURNING *"), [json.dumps(changes), *values])
+        self._send(200, rows if self._prefer().get("return") == "representation" else None)
+
+    def _delete(self):
+        table, params, _ = self._parse()
+        where, values = where_clause(params)
+        rows = self._execute(sql.SQL("DELETE FROM {}").format(table) + where + sql.SQL(" RETURNING *"), values)
+        self._send(200, rows if self._prefer().get("return") == "representation" else None)
+
+    def do_GET(self):
+        self._handle(self._select)
+
+    def do_HEAD(self):
+        self._handle(lambda: self._select(body=False))
+
+    def do_POST(self):
+        self._handle(self._insert)
+
+    def do_PATCH(self):
+        self._handle(self._update)
+
+    def do_DELETE(self):
+        self._handle(self._delete)
+
+
+def serve(database_url: str, host: str = "127.0.0.1", port: int = 3000, pool_size: int = 20) -> ThreadingHTTPServer:
+    """
+    Start the stand-in on a background thread
+
+    Returns:
+        The server (call shutdown() to stop it)
+    """
+    pool = ConnectionPool(
+        database_url, min_size=1, max_size=pool_size, kwargs={"autocommit": True}, name="postgrest-standin", open=True
+    )
+    handler = type("Handler", (StandinHandler,), {"pool": pool})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="postgrest-standin", daemon=True).start()
+    logger.info(f"PostgREST stand-in on http://{host}:{server.server_address[1]} ({pool_size} connections)")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal PostgREST stand-in over Postgres (load tests)")
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--pool-size", type=int, default=20, help="Postgres connections (PostgREST db-pool)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = serve(args.database_url, args.host, args.port, args.pool_size)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
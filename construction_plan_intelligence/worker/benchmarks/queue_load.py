@@ -0,0 +1,363 @@
+"""
+Queue Contention Load Test
+Runs many worker processes against a local database seeded with synthetic
+plan_jobs and reports how job claiming holds up as the worker count grows
+
+Each worker process loops like the real worker: get_next_job(), a mock
+extraction (sampled latency + synthetic result + validation), then
+save_analysis() and update_job_status() in one transaction. Per level it
+reports claim latency (p50/p90/p99/max), duplicate claims, empty claims,
+save latency, job latency and jobs/s.
+
+Backends (the same supabase_io code paths the worker uses):
+- postgres:  DATABASE_URL, direct pooled connections (SKIP LOCKED claims)
+- postgrest: the Supabase client against NEXT_PUBLIC_SUPABASE_URL, or with
+             --standin against a local PostgREST stand-in over --database-url
+
+Jobs are seeded under file_path loadtest/<run id>/ and deleted after each
+level. Use a dedicated database: workers claim ANY queued job, so the run
+refuses to start while other jobs are queued.
+
+Usage (from the worker directory):
+    python -m benchmarks.queue_load --backend postgres --database-url postgresql://localhost/plans \\
+        --jobs 10000 --workers 1,4,8,16,20 --out queue.json
+    python -m benchmarks.queue_load --backend postgrest --standin --database-url postgresql://localhost/plans
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.run import compare, git_info, host_info, print_comparison
+
+SCHEMA = "plan-worker-queue-load/1"
+SEED_BATCH_SIZE = 1000
+
+
+# ============================================================================
+# WORKER PROCESS
+# ============================================================================
+
+def worker_main(worker_no: int, params: Dict, barrier, results):
+    """One load-test worker: claim, mock-extract and complete jobs until the queue is empty"""
+    import supabase_io as sio
+    import validate
+    from extraction_backends import synthetic_extraction
+    from latency import parse_latency_spec
+
+    rng = random.Random(params["seed"] * 1000 + worker_no)
+    sample_work = parse_latency_spec(params["work_latency"])
+    claims, empty_claims = [], []
+
+    # Open connections before the clock starts
+    sio.count_jobs("queued")
+    barrier.wait()
+    deadline = time.monotonic() + params["timeout"]
+
+    while time.monotonic() < deadline:
+        started_at = time.time()
+        started = time.perf_counter()
+        job = sio.get_next_job()
+        claim_s = time.perf_counter() - started
+
+        if job is None:
+            empty_claims.append(claim_s)
+            if not sio.count_jobs("queued"):
+                break
+            time.sleep(params["poll_interval"])
+            continue
+
+        # Mock extraction
+        time.sleep(sample_work(rng))
+        extraction = validate.validate_with_repair(synthetic_extraction(job["id"]))
+
+        saving = time.perf_counter()
+        with sio.transaction():
+            sio.save_analysis(
+                job_id=job["id"],
+                model="synthetic",
+                quantities=extraction,
+                confidence={"doors": extraction["doors"]["confidence"]},
+                evidence={"load_test": params["run_id"]},
+                needs_review=False
+            )
+            sio.update_job_status(job["id"], "completed")
+        save_s = time.perf_counter() - saving
+
+        claims.append({
+            "job_id": job["id"],
+            "started_at": started_at,
+            "claim_s": claim_s,
+            "save_s": save_s,
+            "done_at": time.time(),
+        })
+
+    results.put({"worker": worker_no, "claims": claims, "empty_claims": empty_claims})
+
+
+# ============================================================================
+# SEEDING
+# ============================================================================
+
+def seed_prefix(run_id: str) -> str:
+    return f"loadtest/{run_id}/"
+
+
+def seed_jobs(count: int, run_id: str) -> List[str]:
+    """Insert `count` queued jobs (oldest first by index); returns their IDs"""
+    import postgres_io
+    import supabase_io as sio
+
+    user_id = str(uuid.uuid4())
+    prefix = seed_prefix(run_id)
+
+    if postgres_io.enabled():
+        with postgres_io.transaction() as conn:
+            rows = conn.execute(
+                """
+                INSERT INTO plan_jobs (user_id, file_path, file_type, created_at)
+                SELECT %s, %s || i || '.pdf', 'pdf', now() + i * interval '1 microsecond'
+                FROM generate_series(1, %s) AS i
+                RETURNING id
+                """,
+                (user_id, prefix, count)
+            ).fetchall()
+        return [str(row[0]) for row in rows]
+
+    created = datetime.now(timezone.utc)
+    ids = []
+    for offset in range(0, count, SEED_BATCH_SIZE):
+        batch = [
+            {
+                "user_id": user_id,
+                "file_path": f"{prefix}{i}.pdf",
+                "file_type": "pdf",
+                "created_at": (created + timedelta(microseconds=i)).isoformat(),
+            }
+            for i in range(offset, min(offset + SEED_BATCH_SIZE, count))
+        ]
+        response = sio.get_client().table("plan_jobs").insert(batch).execute()
+        ids.extend(row["id"] for row in response.data)
+    return ids
+
+
+def delete_jobs(run_id: str):
+    """Delete the run's jobs (analyses cascade)"""
+    import postgres_io
+    import supabase_io as sio
+
+    if postgres_io.enabled():
+        with postgres_io.transaction() as conn:
+            conn.execute("DELETE FROM plan_jobs WHERE file_path LIKE %s", (seed_prefix(run_id) + "%",))
+        return
+    sio.get_client().table("plan_jobs").delete().like("file_path", seed_prefix(run_id) + "*").execute()
+
+
+# ============================================================================
+# RESULTS
+# ============================================================================
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for no values)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def latency_ms(prefix: str, seconds: List[float]) -> Dict[str, float]:
+    return {
+        f"{prefix}_p50_ms": percentile(seconds, 50) * 1000,
+        f"{prefix}_p90_ms": percentile(seconds, 90) * 1000,
+        f"{prefix}_p99_ms": percentile(seconds, 99) * 1000,
+        f"{prefix}_max_ms": max(seconds, default=0.0) * 1000,
+    }
+
+
+def summarize(worker_results: List[Dict], seeded: List[str], elapsed_s: float) -> Dict:
+    """Aggregate one level's worker results"""
+    claims = [claim for result in worker_results for claim in result["claims"]]
+    empty = [seconds for result in worker_results for seconds in result["empty_claims"]]
+    seeded_ids = set(seeded)
+
+    claimed = {}
+    for claim in claims:
+        claimed[claim["job_id"]] = claimed.get(claim["job_id"], 0) + 1
+    completed = len(seeded_ids & set(claimed))
+
+    per_worker = [len(result["claims"]) for result in worker_results]
+    wall_s = (max(claim["done_at"] for claim in claims) - min(claim["started_at"] for claim in claims)) if claims else elapsed_s
+
+    return {
+        "jobs_completed": completed,
+        "jobs_unclaimed": len(seeded_ids) - completed,
+        "foreign_claims": sum(1 for job_id in claimed if job_id not in seeded_ids),
+        "claims": len(claims),
+        "duplicate_claims": len(claims) - len(claimed),
+        "duplicate_jobs": sum(1 for count in claimed.values() if count > 1),
+        "empty_claims": len(empty),
+        "wall_s": wall_s,
+        "jobs_per_s": completed / wall_s if wall_s else 0.0,
+        **latency_ms("claim", [claim["claim_s"] for claim in claims]),
+        **latency_ms("empty_claim", empty),
+        **latency_ms("save", [claim["save_s"] for claim in claims]),
+        **latency_ms("job", [claim["done_at"] - claim["started_at"] for claim in claims]),
+        "jobs_per_worker_min": min(per_worker, default=0),
+        "jobs_per_worker_max": max(per_worker, default=0),
+    }
+
+
+def run_level(workers: int, params: Dict) -> Dict:
+    """Seed jobs, run `workers` processes until the queue drains, clean up"""
+    import supabase_io as sio
+
+    queued = sio.count_jobs("queued")
+    if queued is None:
+        raise RuntimeError("Cannot read the queue (check the database / PostgREST URL)")
+    if queued and not params["allow_foreign_jobs"]:
+        raise RuntimeError(
+            f"{queued} jobs are already queued; use a dedicated database (or --allow-foreign-jobs)"
+        )
+
+    seeded = seed_jobs(params["jobs"], params["run_id"])
+    ctx = get_context("spawn")
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker_main, args=(worker_no, params, barrier, results), daemon=True)
+        for worker_no in range(workers)
+    ]
+    try:
+        for process in processes:
+            process.start()
+        barrier.wait(timeout=120)
+        started = time.perf_counter()
+        worker_results = [results.get(timeout=params["timeout"] + 60) for _ in processes]
+        elapsed_s = time.perf_counter() - started
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        if not params["keep"]:
+            delete_jobs(params["run_id"])
+
+    return {"workers": workers, **summarize(worker_results, seeded, elapsed_s)}
+
+
+def print_table(levels: List[Dict]):
+    header = f"{'workers':>7} {'jobs/s':>9} {'claim p50':>10} {'p99':>9} {'max':>9} {'save p99':>9} {'dup':>6} {'empty':>7} {'left':>5}"
+    print(header, file=sys.stderr)
+    for level in levels:
+        print(
+            f"{level['workers']:>7} {level['jobs_per_s']:>9.1f} {level['claim_p50_ms']:>8.2f}ms "
+            f"{level['claim_p99_ms']:>7.2f}ms {level['claim_max_ms']:>7.1f}ms {level['save_p99_ms']:>7.2f}ms "
+            f"{level['duplicate_claims']:>6} {level['empty_claims']:>7} {level['jobs_unclaimed']:>5}",
+            file=sys.stderr
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue contention load test for plan workers")
+    parser.add_argument("--backend", choices=["postgres", "postgrest"], default="postgres")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", ""),
+                        help="Postgres for --backend postgres / --standin (default: DATABASE_URL)")
+    parser.add_argument("--standin", action="store_true", help="Serve PostgREST locally over --database-url")
+    parser.add_argument("--standin-port", type=int, default=3000)
+    parser.add_argument("--standin-pool-size", type=int, default=20, help="Stand-in Postgres connections")
+    parser.add_argument("--jobs", type=int, default=2000, help="Jobs seeded per level")
+    parser.add_argument("--workers", default="1,2,4,8,16", help="Comma-separated worker counts")
+    parser.add_argument("--work-latency", default="fixed:0", help="Mock extraction time (latency spec)")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Sleep after an empty claim (s)")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-level limit (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded jobs after each level")
+    parser.add_argument("--allow-foreign-jobs", action="store_true", help="Run even if other jobs are queued")
+    parser.add_argument("--out", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Regression threshold (relative)")
+    args = parser.parse_args()
+
+    worker_counts = [int(count) for count in args.workers.split(",") if count.strip()]
+
+    # Worker processes inherit this configuration before they import config
+    os.environ["LOG_LEVEL"] = os.environ.get("LOG_LEVEL", "WARNING")
+    os.environ["DATABASE_POOL_MIN_SIZE"] = "1"
+    server = None
+    if args.backend == "postgres":
+        if not args.database_url:
+            parser.error("--backend postgres needs --database-url (or DATABASE_URL)")
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ.pop("DATABASE_URL", None)
+        if args.standin:
+            if not args.database_url:
+                parser.error("--standin needs --database-url (or DATABASE_URL)")
+            from benchmarks.postgrest_standin import serve
+            server = serve(args.database_url, port=args.standin_port, pool_size=args.standin_pool_size)
+            os.environ["NEXT_PUBLIC_SUPABASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+            os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "load.test")  # The stand-in ignores auth
+
+    params = {
+        "run_id": uuid.uuid4().hex[:12],
+        "jobs": args.jobs,
+        "work_latency": args.work_latency,
+        "poll_interval": args.poll_interval,
+        "timeout": args.timeout,
+        "seed": args.seed,
+        "keep": args.keep,
+        "allow_foreign_jobs": args.allow_foreign_jobs,
+    }
+
+    levels = []
+    try:
+        for workers in worker_counts:
+            print(f"Running {workers} workers on {args.jobs} jobs...", file=sys.stderr)
+            levels.append(run_level(workers, params))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print_table(levels)
+    report = {
+        "schema": SCHEMA,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git": git_info(),
+        "host": host_info(),
+        "params": {
+            "backend": args.backend,
+            "standin": args.standin,
+            "jobs": args.jobs,
+            "workers": args.workers,
+            "work_latency": args.work_latency,
+            "poll_interval": args.poll_interval,
+            "seed": args.seed,
+        },
+        "cases": {f"workers_{level['workers']}": {key: round(value, 6) if isinstance(value, float) else value
+                                                   for key, value in level.items()} for level in levels},
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+        print(f"Wrote {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print_comparison(compare(report, baseline, args.threshold), baseline)
+
+
+if __name__ == "__main__":
+    main()
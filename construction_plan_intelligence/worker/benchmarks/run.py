@@ -0,0 +1,511 @@
+"""
+Worker Benchmark Runner
+Times the pipeline on a synthetic plan set (see synthetic_plans) and writes
+machine-readable results that can be compared between commits
+
+Cases (each in a fresh process, so peak RSS is per case):
+- render:     PDF pages to PNG (+ pyramid): pages/s, ms/page
+- selection:  text extraction + keyword page selection latency, precision/recall
+- validation: schema validation / repair / consistency throughput
+- e2e:        PlanProcessor.process() on a job with local storage, the synthetic
+              extraction backend and in-memory job tables (no network or database)
+
+Usage (from the worker directory):
+    python -m benchmarks.run --pages 12 --scanned-ratio 0.25 --out bench.json
+    python -m benchmarks.run --out new.json --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.synthetic_plans import SHEET_SIZES, generate_plan_set
+
+SCHEMA = "plan-worker-benchmark/1"
+CASES = ["render", "selection", "validation", "e2e"]
+
+# Metric name suffixes where a larger value is better (all others: smaller is better)
+HIGHER_IS_BETTER = ("_per_s", "precision", "recall")
+
+# Changes in *_s metrics smaller than this are timer noise, never regressions
+NOISE_FLOOR_S = 0.005
+
+
+# ============================================================================
+# MEASUREMENT HELPERS
+# ============================================================================
+
+def _proc_status_mb(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (MB)"""
+    # VmHWM starts over at exec; ru_maxrss keeps the parent's peak from before the fork
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size (MB; None where /proc is unavailable)"""
+    return _proc_status_mb("VmRSS")
+
+
+def timed_runs(run, repeat: int, warmup: int) -> List[float]:
+    """Wall times (seconds) of `repeat` calls of run(), after `warmup` untimed calls"""
+    for _ in range(warmup):
+        run()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def stage_seconds() -> Dict[str, Dict[str, float]]:
+    """Current {stage: {"sum", "count"}} of the stage histogram (empty without prometheus_client)"""
+    import stage_metrics
+    if not stage_metrics.enabled():
+        return {}
+
+    stages: Dict[str, Dict[str, float]] = {}
+    for metric in stage_metrics.STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            for suffix in ("_sum", "_count"):
+                if sample.name.endswith(suffix):
+                    stage = stages.setdefault(sample.labels["stage"], {"sum": 0.0, "count": 0.0})
+                    stage[suffix[1:]] = sample.value
+    return stages
+
+
+def round_metrics(metrics: Dict) -> Dict:
+    return {key: round(value, 6) if isinstance(value, float) else value for key, value in metrics.items()}
+
+
+# ============================================================================
+# CASES (run in a child process)
+# ============================================================================
+
+def bench_render(params: Dict, workdir: Path) -> Dict:
+    import config
+    import pdf_to_images
+
+    pages = params["plan_set"]["page_count"]
+    run_no = iter(range(1_000_000))
+
+    def run():
+        output_dir = workdir / f"render_{next(run_no)}"
+        pyramid = {} if config.PAGE_PYRAMID else None
+        pdf_to_images.render_pdf_pages(params["pdf_path"], str(output_dir), pyramid_out=pyramid)
+
+    times = timed_runs(run, params["repeat"], params["warmup"])
+    median = statistics.median(times)
+    return {
+        "wall_s_median": median,
+        "wall_s_min": min(times),
+        "ms_per_page": median / pages * 1000,
+        "pages_per_s": pages / median,
+    }
+
+
+def _selection_quality(categorized: Dict[str, List[int]], manifest: Dict) -> Dict:
+    """Precision / recall of the selected pages against the manifest"""
+    expected = {page["page_no"] for page in manifest["pages"] if page["category"]}
+    selected = set(categorized.get("all_relevant", []))
+    quality = {
+        "relevant_precision": len(expected & selected) / len(selected) if selected else 1.0,
+        "relevant_recall": len(expected & selected) / len(expected) if expected else 1.0,
+    }
+    for category in ["schedule", "legend", "floor_plan"]:
+        wanted = {page["page_no"] for page in manifest["pages"] if page["category"] == category}
+        if wanted:
+            quality[f"{category}_recall"] = len(wanted & set(categorized.get(category, []))) / len(wanted)
+    return quality
+
+
+def bench_selection(params: Dict, workdir: Path) -> Dict:
+    import pdf_to_images
+    import select_pages
+
+    pdf_path = params["pdf_path"]
+    pages = params["plan_set"]["page_count"]
+    rendered = [(page_no, f"page_{page_no:03d}.png") for page_no in range(pages)]
+    iterations = params["selection_iterations"]
+
+    text_times = timed_runs(lambda: pdf_to_images.extract_text_from_pdf(pdf_path), params["repeat"], params["warmup"])
+    page_texts = pdf_to_images.extract_text_from_pdf(pdf_path)
+
+    def select():
+        categorized = select_pages.select_relevant_pages(page_texts, rendered)
+        priority = select_pages.get_page_priority(categorized)
+        select_pages.group_pages_for_extraction(categorized, priority)
+        return categorized
+
+    select_times = timed_runs(
+        lambda: [select() for _ in range(iterations)], params["repeat"], params["warmup"]
+    )
+    return {
+        "text_extraction_ms": statistics.median(text_times) * 1000,
+        "selection_ms": statistics.median(select_times) / iterations * 1000,
+        **_selection_quality(select(), params["manifest"]),
+    }
+
+
+def _corrupt(extraction: Dict) -> Dict:
+    """Typical model mistakes that send a result through repair"""
+    broken = json.loads(json.dumps(extraction))
+    broken.pop("meta", None)
+    broken["doors"]["total"] = str(broken["doors"]["total"])
+    broken["windows"]["confidence"] = "High"
+    broken["kitchen"]["linear_ft_est"] = -5
+    return broken
+
+
+def bench_validation(params: Dict, workdir: Path) -> Dict:
+    import validate
+    from extraction_backends import synthetic_extraction
+
+    count = params["validation_count"]
+    valid = [synthetic_extraction(f"bench-{params['seed']}-{i}") for i in range(count)]
+    broken = [_corrupt(extraction) for extraction in valid]
+
+    def run_all(function, items):
+        return lambda: [function(item) for item in items]
+
+    validate_times = timed_runs(run_all(validate.validate_with_repair, valid), params["repeat"], params["warmup"])
+    repair_times = timed_runs(run_all(validate.validate_with_repair, broken), params["repeat"], params["warmup"])
+    consistency_times = timed_runs(run_all(validate.check_consistency, valid), params["repeat"], params["warmup"])
+    many_times = timed_runs(lambda: validate.validate_many(valid + broken), params["repeat"], params["warmup"])
+
+    return {
+        "validate_per_s": count / statistics.median(validate_times),
+        "repair_per_s": count / statistics.median(repair_times),
+        "consistency_per_s": count / statistics.median(consistency_times),
+        "validate_many_per_s": 2 * count / statistics.median(many_times),
+    }
+
+
+class MemoryTables:
+    """
+    In-memory stand-in for postgres_io's job/metadata operations
+
+    install() routes supabase_io's table operations here (as with DATABASE_URL
+    set), so e2e runs time the worker without a database or PostgREST.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Dict] = {}
+        self.artifacts: List[Dict] = []
+        self.analyses: Dict[str, Dict] = {}
+        self.metrics: List[Dict] = []
+
+    def install(self):
+        import postgres_io
+        postgres_io.enabled = lambda: True
+        postgres_io.transaction = nullcontext
+        postgres_io.update_job_status = self.update_job_status
+        postgres_io.job_exists = lambda job_id: job_id in self.jobs
+        postgres_io.find_artifacts = self.find_artifacts
+        postgres_io.insert_artifacts = self.insert_artifacts
+        postgres_io.save_analysis = self.save_analysis
+        postgres_io.save_job_metrics = self.metrics.extend
+
+    def update_job_status(self, job_id: str, status: str, error: Optional[str] = None):
+        self.jobs[job_id]["status"] = status
+        if error:
+            self.jobs[job_id]["error"] = error
+
+    def find_artifacts(self, job_id: str, artifact_paths: List[str]) -> List[Dict]:
+        paths = set(artifact_paths)
+        return [row for row in self.artifacts if row["job_id"] == job_id and row["artifact_path"] in paths]
+
+    def insert_artifacts(self, rows: List[Dict]) -> List[str]:
+        ids = []
+        for row in rows:
+            record = {**row, "id": str(uuid.uuid4())}
+            self.artifacts.append(record)
+            ids.append(record["id"])
+        return ids
+
+    def save_analysis(self, job_id: str, **analysis) -> str:
+        self.analyses[job_id] = analysis
+        return str(uuid.uuid4())
+
+
+def bench_e2e(params: Dict, workdir: Path) -> Dict:
+    import storage_backends
+    import worker
+
+    tables = MemoryTables()
+    tables.install()
+    manifest = params["manifest"]
+
+    def run():
+        # Fresh storage per run: every upload is new, as for a first submission
+        storage = storage_backends.LocalStorage(root=str(workdir / f"storage_{uuid.uuid4().hex[:8]}"))
+        storage_backends.set_storage(storage)
+        job_id = str(uuid.uuid4())
+        file_path = f"bench/{job_id}.pdf"
+        storage.put("plans", file_path, params["pdf_path"])
+        tables.jobs[job_id] = {
+            "id": job_id, "user_id": None, "file_path": file_path, "file_type": "pdf", "status": "processing"
+        }
+        if not worker.PlanProcessor(tables.jobs[job_id]).process():
+            raise RuntimeError(f"e2e job failed: {tables.jobs[job_id].get('error')}")
+        return job_id
+
+    timed_runs(run, 0, params["warmup"])
+    before = stage_seconds()
+    times = timed_runs(run, params["repeat"], 0)
+    after = stage_seconds()
+
+    metrics = {
+        "wall_s_median": statistics.median(times),
+        "wall_s_min": min(times),
+        "wall_s_max": max(times),
+        "jobs_per_s": 1 / statistics.median(times),
+    }
+    # Per-stage time per job (stages that ran during the timed runs)
+    for stage, totals in sorted(after.items()):
+        seconds = totals["sum"] - before.get(stage, {}).get("sum", 0.0)
+        if totals["count"] - before.get(stage, {}).get("count", 0.0):
+            metrics[f"stage_{stage}_s"] = seconds / params["repeat"]
+
+    # Extracted counts vs. the schedules (meaningful with a real or replayed model)
+    if params["extraction_backend"] != "synthetic":
+        analysis = next(reversed(tables.analyses.values()))
+        for section in ["doors", "windows"]:
+            extracted = analysis["quantities"][section]["total"]
+            metrics[f"{section}_abs_error"] = abs(extracted - manifest["counts"][section]["total"])
+    return metrics
+
+
+BENCHMARKS = {
+    "render": bench_render,
+    "selection": bench_selection,
+    "validation": bench_validation,
+    "e2e": bench_e2e,
+}
+
+
+def run_case(name: str, params: Dict) -> Dict:
+    """Run one case (in a fresh child process) and report its metrics and peak RSS"""
+    # Imports (and their memory) count towards the baseline, not the case
+    import pdf_to_images, select_pages, validate, worker  # noqa: F401,E401
+    worker.configure_logging()
+
+    baseline_mb = rss_mb() or peak_rss_mb()
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir:
+        metrics = BENCHMARKS[name](params, Path(workdir))
+    peak_mb = peak_rss_mb()
+    return round_metrics({**metrics, "peak_rss_mb": peak_mb, "rss_growth_mb": peak_mb - baseline_mb})
+
+
+# ============================================================================
+# RESULTS
+# ============================================================================
+
+def git_info() -> Dict:
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", *args], capture_output=True, text=True, check=True, timeout=30
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "branch": git("rev-parse", "--abbrev-ref", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+    }
+
+
+def host_info() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """
+    Per-metric changes between two result files
+
+    Args:
+        threshold: Relative change (e.g. 0.05) beyond which a worse value is a regression
+
+    Returns:
+        [{"case", "metric", "baseline", "current", "change", "regression"}]
+    """
+    rows = []
+    for case, results in current["cases"].items():
+        old_results = baseline.get("cases", {}).get(case, {})
+        for metric, value in results.items():
+            old = old_results.get(metric)
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            if not isinstance(old, (int, float)) or isinstance(old, bool):
+                continue
+            change = (value - old) / old if old else 0.0
+            worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+            if metric.endswith("_s") and abs(value - old) < NOISE_FLOOR_S:
+                worse = 0.0
+            rows.append({
+                "case": case,
+                "metric": metric,
+                "baseline": old,
+                "current": value,
+                "change": round(change, 4),
+                "regression": worse > threshold,
+            })
+    return rows
+
+
+def print_comparison(rows: List[Dict], baseline: Dict):
+    print(f"\nCompared with {(baseline.get('git') or {}).get('commit') or 'baseline'}:", file=sys.stderr)
+    for row in rows:
+        marker = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"  {row['case']:<11} {row['metric']:<28} {row['baseline']:>12.4f} -> {row['current']:>12.4f} "
+            f"({row['change']:+.1%}){marker}",
+            file=sys.stderr
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the plan worker on a synthetic plan set")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"Comma-separated cases ({', '.join(CASES)})")
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--sheet", default="ARCH D", choices=sorted(SHEET_SIZES))
+    parser.add_argument("--scanned-ratio", type=float, default=0.25, help="Share of sheets rasterized as scans")
+    parser.add_argument("--scan-dpi", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per measurement (median reported)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs before measuring")
+    parser.add_argument("--dpi", type=int, help="PDF_DPI override")
+    parser.add_argument("--model-latency", default="fixed:0", help="SYNTHETIC_LATENCY for e2e (e.g. lognormal:4,0.5)")
+    parser.add_argument("--storage-latency", default="fixed:0", help="LOCAL_STORAGE_LATENCY for e2e")
+    parser.add_argument("--storage-bandwidth-mbit", type=float, default=0)
+    parser.add_argument("--extraction-backend", default="synthetic", help="EXTRACTION_BACKEND for e2e")
+    parser.add_argument("--selection-iterations", type=int, default=200)
+    parser.add_argument("--validation-count", type=int, default=500)
+    parser.add_argument("--log-level", default="CRITICAL", help="Worker LOG_LEVEL in the case processes")
+    parser.add_argument("--out", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Regression threshold (relative)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 if a metric regressed")
+    args = parser.parse_args()
+
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    unknown = [case for case in cases if case not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+
+    # Offline configuration, inherited by the case processes before they import config
+    os.environ.update({
+        "EXTRACTION_BACKEND": args.extraction_backend,
+        "SYNTHETIC_LATENCY": args.model_latency,
+        "SYNTHETIC_SEED": str(args.seed),
+        "EXTRACTION_CACHE_ENABLED": "false",
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_LATENCY": args.storage_latency,
+        "LOCAL_STORAGE_BANDWIDTH_MBIT": str(args.storage_bandwidth_mbit),
+        "LOG_LEVEL": args.log_level,
+    })
+    os.environ.pop("DATABASE_URL", None)
+    if args.dpi:
+        os.environ["PDF_DPI"] = str(args.dpi)
+
+    with tempfile.TemporaryDirectory(prefix="plan_bench_") as tmp:
+        pdf_path = str(Path(tmp) / "plan_set.pdf")
+        started = time.perf_counter()
+        manifest = generate_plan_set(pdf_path, args.pages, args.sheet, args.scanned_ratio, args.scan_dpi, args.seed)
+        plan_set = {
+            "page_count": args.pages,
+            "sheet": args.sheet,
+            "scanned_pages": sum(page["scanned"] for page in manifest["pages"]),
+            "file_bytes": os.path.getsize(pdf_path),
+            "counts": manifest["counts"],
+            "generate_s": round(time.perf_counter() - started, 3),
+        }
+        params = {
+            "pdf_path": pdf_path,
+            "manifest": manifest,
+            "plan_set": plan_set,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "extraction_backend": args.extraction_backend,
+            "selection_iterations": args.selection_iterations,
+            "validation_count": args.validation_count,
+        }
+
+        results = {}
+        for case in cases:
+            print(f"Running {case}...", file=sys.stderr)
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results[case] = pool.submit(run_case, case, params).result()
+
+    report = {
+        "schema": SCHEMA,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git": git_info(),
+        "host": host_info(),
+        "params": {
+            key: value for key, value in vars(args).items()
+            if key not in ("out", "compare", "fail_on_regression", "threshold", "log_level")
+        },
+        "plan_set": plan_set,
+        "cases": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+        print(f"Wrote {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if baseline.get("params") != report["params"]:
+            print("Warning: baseline was run with different parameters", file=sys.stderr)
+        rows = compare(report, baseline, args.threshold)
+        print_comparison(rows, baseline)
+        if args.fail_on_regression and any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
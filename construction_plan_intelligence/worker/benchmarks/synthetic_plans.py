@@ -0,0 +1,416 @@
+"""
+Synthetic Plan Sets
+Generates construction plan PDFs with known contents for benchmarks
+
+Sheets are drawn as vector pages (with a text layer, like CAD exports) and a
+chosen share is rasterized into scanned pages (image only, no text). The
+manifest returned with each PDF records every page's kind and the door and
+window counts in the schedules (also drawn as tagged symbols on the floor
+plans), so page selection and extraction can be scored against ground truth.
+
+Usage:
+    python -m benchmarks.synthetic_plans plans.pdf --pages 12 --sheet "ARCH D" --scanned-ratio 0.25
+"""
+
+import argparse
+import io
+import json
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+# Landscape sheet sizes (inches)
+SHEET_SIZES = {
+    "ANSI A": (11, 8.5),
+    "ANSI B": (17, 11),
+    "ANSI D": (34, 22),
+    "ARCH A": (12, 9),
+    "ARCH B": (18, 12),
+    "ARCH C": (24, 18),
+    "ARCH D": (36, 24),
+    "ARCH E": (48, 36),
+}
+
+DOOR_TYPES = ["entry", "interior", "sliding", "bifold", "other"]
+WINDOW_TYPES = ["fixed", "casement", "sliding", "other"]
+
+# Page kind -> select_pages category it should be found under (None = not relevant)
+KIND_CATEGORIES = {
+    "cover": None,
+    "legend": "legend",
+    "door_schedule": "schedule",
+    "window_schedule": "schedule",
+    "floor_plan": "floor_plan",
+    "elevation": None,
+}
+
+# Sheets included first for small sets, then floor plans / elevations alternate
+KIND_PRIORITY = ["door_schedule", "floor_plan", "window_schedule", "legend", "cover", "elevation"]
+SHEET_ORDER = ["cover", "legend", "door_schedule", "window_schedule", "floor_plan", "elevation"]
+
+FLOOR_NAMES = ["FIRST FLOOR PLAN", "SECOND FLOOR PLAN", "THIRD FLOOR PLAN", "GROUND FLOOR PLAN"]
+ROOM_NAMES = ["LIVING", "KITCHEN", "DINING", "BEDROOM", "BATH", "CLOSET", "LAUNDRY", "GARAGE", "OFFICE"]
+
+
+# ============================================================================
+# LAYOUT
+# ============================================================================
+
+def sheet_kinds(pages: int) -> List[str]:
+    """Page kinds of a plan set with `pages` sheets, in sheet order"""
+    kinds = KIND_PRIORITY[:pages]
+    extra = pages - len(kinds)
+    kinds += ["floor_plan" if i % 3 < 2 else "elevation" for i in range(extra)]
+    return sorted(kinds, key=SHEET_ORDER.index)
+
+
+def schedule_counts(rng: random.Random) -> Dict[str, Dict[str, int]]:
+    """Door and window counts by type (ground truth for the schedules)"""
+    return {
+        "doors": {key: rng.randint(1, 12) if key != "other" else rng.randint(0, 2) for key in DOOR_TYPES},
+        "windows": {key: rng.randint(1, 14) if key != "other" else rng.randint(0, 2) for key in WINDOW_TYPES},
+    }
+
+
+def _split(total: int, parts: int) -> List[int]:
+    """Split a count over `parts` floors as evenly as possible"""
+    if parts <= 0:
+        return []
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+# ============================================================================
+# DRAWING
+# ============================================================================
+
+class SheetWriter:
+    """Draws one sheet: border, title block and content in sheet-relative units"""
+
+    def __init__(self, page: fitz.Page, sheet_no: str, title: str):
+        self.page = page
+        self.width = page.rect.width
+        self.height = page.rect.height
+        self.unit = min(self.width, self.height) / 100  # 1% of the short side
+        self.margin = 3 * self.unit
+        self.shape = page.new_shape()
+        self._border(sheet_no, title)
+
+    def text(self, x: float, y: float, text: str, size: float = 1.2):
+        self.page.insert_text((x, y), text, fontsize=size * self.unit, fontname="helv")
+
+    def rect(self, x0: float, y0: float, x1: float, y1: float, width: float = 0.1):
+        self.shape.draw_rect(fitz.Rect(x0, y0, x1, y1))
+        self.shape.finish(width=width * self.unit, color=(0, 0, 0))
+
+    def line(self, x0: float, y0: float, x1: float, y1: float, width: float = 0.1):
+        self.shape.draw_line((x0, y0), (x1, y1))
+        self.shape.finish(width=width * self.unit, color=(0, 0, 0))
+
+    def door(self, x: float, y: float, tag: str):
+        """Door leaf + quarter-circle swing + tag"""
+        leaf = 2.5 * self.unit
+        self.line(x, y, x, y - leaf, width=0.15)
+        self.shape.draw_sector((x, y), (x, y - leaf), 90, fullSector=False)
+        self.shape.finish(width=0.05 * self.unit, color=(0, 0, 0), dashes="[2] 0")
+        self.text(x + 0.4 * self.unit, y + 1.4 * self.unit, tag, size=0.8)
+
+    def window(self, x: float, y: float, tag: str):
+        """Three parallel lines across a wall + tag"""
+        span = 3 * self.unit
+        for offset in (-0.3, 0, 0.3):
+            self.line(x, y + offset * self.unit, x + span, y + offset * self.unit, width=0.05)
+        self.text(x, y - 0.8 * self.unit, tag, size=0.8)
+
+    def _border(self, sheet_no: str, title: str):
+        m = self.margin
+        self.rect(m, m, self.width - m, self.height - m, width=0.25)
+        # Title block (bottom right)
+        x0, y0 = self.width - m - 28 * self.unit, self.height - m - 9 * self.unit
+        self.rect(x0, y0, self.width - m, self.height - m, width=0.15)
+        self.text(x0 + self.unit, y0 + 2.2 * self.unit, "SYNTHETIC RESIDENCE", size=1.4)
+        self.text(x0 + self.unit, y0 + 4.6 * self.unit, title, size=1.2)
+        self.text(x0 + self.unit, y0 + 7.4 * self.unit, f"SHEET {sheet_no}    SCALE 1/4\" = 1'-0\"", size=1.0)
+
+    def table(self, x: float, y: float, title: str, header: List[str], rows: List[List[str]]):
+        """Ruled table with a title row"""
+        col = 9 * self.unit
+        row_h = 2 * self.unit
+        self.text(x, y - 0.8 * self.unit, title, size=1.8)
+        for r, cells in enumerate([header] + rows):
+            top = y + r * row_h
+            for c, cell in enumerate(cells):
+                self.rect(x + c * col, top, x + (c + 1) * col, top + row_h, width=0.06)
+                self.text(x + c * col + 0.5 * self.unit, top + 1.4 * self.unit, cell, size=1.0)
+
+    def commit(self):
+        self.shape.commit()
+
+
+def draw_cover(sheet: SheetWriter, index: List[Tuple[str, str]]):
+    u = sheet.unit
+    sheet.text(sheet.margin + 6 * u, sheet.margin + 14 * u, "SYNTHETIC RESIDENCE", size=5)
+    sheet.text(sheet.margin + 6 * u, sheet.margin + 20 * u, "CONSTRUCTION DOCUMENTS", size=2.5)
+    sheet.text(sheet.margin + 6 * u, sheet.margin + 30 * u, "SHEET INDEX", size=1.8)
+    for i, (sheet_no, title) in enumerate(index):
+        sheet.text(sheet.margin + 6 * u, sheet.margin + (33 + 2 * i) * u, f"{sheet_no}   {title}", size=1.1)
+
+
+def draw_legend(sheet: SheetWriter):
+    u = sheet.unit
+    x, y = sheet.margin + 6 * u, sheet.margin + 10 * u
+    sheet.text(x, y, "LEGEND", size=2.5)
+    sheet.door(x + u, y + 8 * u, "D#")
+    sheet.text(x + 8 * u, y + 7 * u, "DOOR - SEE DOOR SCHEDULE")
+    sheet.window(x, y + 13 * u, "W#")
+    sheet.text(x + 8 * u, y + 13.5 * u, "WINDOW - SEE WINDOW SCHEDULE")
+    sheet.rect(x, y + 17 * u, x + 4 * u, y + 19 * u, width=0.3)
+    sheet.text(x + 8 * u, y + 18.5 * u, "WALL")
+
+
+def draw_schedule(sheet: SheetWriter, title: str, prefix: str, counts: Dict[str, int], rng: random.Random):
+    rows = []
+    mark = 1
+    for type_name, qty in counts.items():
+        if not qty:
+            continue
+        # Some types split across two sizes, like real schedules
+        parts = [qty] if qty < 4 or rng.random() < 0.5 else [qty // 2, qty - qty // 2]
+        for part in parts:
+            width = rng.choice(["2'-6\"", "2'-8\"", "3'-0\"", "4'-0\"", "6'-0\""])
+            rows.append([f"{prefix}{mark}", type_name.upper(), width, "7'-0\"", str(part)])
+            mark += 1
+    rows.append(["", "TOTAL", "", "", str(sum(counts.values()))])
+    u = sheet.unit
+    sheet.table(sheet.margin + 6 * u, sheet.margin + 12 * u, title, ["MARK", "TYPE", "WIDTH", "HEIGHT", "QTY"], rows)
+
+
+def draw_floor_plan(sheet: SheetWriter, title: str, doors: List[str], windows: List[str], rng: random.Random):
+    u = sheet.unit
+    x0, y0 = sheet.margin + 6 * u, sheet.margin + 8 * u
+    x1 = sheet.width - sheet.margin - 34 * u
+    y1 = sheet.height - sheet.margin - 12 * u
+    sheet.text(x0, y1 + 5 * u, title, size=2.2)
+    sheet.rect(x0, y0, x1, y1, width=0.4)
+
+    # Room grid
+    cols, rows = 4, 3
+    cell_w, cell_h = (x1 - x0) / cols, (y1 - y0) / rows
+    for c in range(1, cols):
+        sheet.line(x0 + c * cell_w, y0, x0 + c * cell_w, y1, width=0.25)
+    for r in range(1, rows):
+        sheet.line(x0, y0 + r * cell_h, x1, y0 + r * cell_h, width=0.25)
+    for r in range(rows):
+        for c in range(cols):
+            sheet.text(x0 + c * cell_w + 2 * u, y0 + r * cell_h + 3 * u, rng.choice(ROOM_NAMES), size=1.1)
+
+    # Doors inside rooms, windows along the exterior walls
+    for i, tag in enumerate(doors):
+        r, c = divmod(i, cols)
+        sheet.door(
+            x0 + (c % cols) * cell_w + (2 + 4 * (r // rows)) * u,
+            y0 + (r % rows) * cell_h + cell_h - 2 * u,
+            tag
+        )
+    per_wall = max(1, (len(windows) + 1) // 2)
+    for i, tag in enumerate(windows):
+        wall_y = y0 if i < per_wall else y1
+        slot = i % per_wall
+        sheet.window(x0 + (slot + 0.5) * (x1 - x0) / per_wall - 1.5 * u, wall_y, tag)
+
+
+def draw_elevation(sheet: SheetWriter, title: str):
+    u = sheet.unit
+    x0, base = sheet.margin + 8 * u, sheet.height - sheet.margin - 20 * u
+    width, height = sheet.width * 0.5, 30 * u
+    sheet.rect(x0, base - height, x0 + width, base, width=0.4)
+    sheet.line(x0 - 4 * u, base, x0 + width + 4 * u, base, width=0.6)  # Grade
+    sheet.line(x0, base - height, x0 + width / 2, base - height - 12 * u, width=0.4)  # Roof
+    sheet.line(x0 + width / 2, base - height - 12 * u, x0 + width, base - height, width=0.4)
+    for i in range(5):
+        sheet.rect(x0 + (4 + 12 * i) * u, base - height + 8 * u, x0 + (10 + 12 * i) * u, base - height + 18 * u)
+    sheet.text(x0, base + 6 * u, title, size=2.2)
+
+
+# ============================================================================
+# SCANNING
+# ============================================================================
+
+def scan_page(page: fitz.Page, dpi: int, rng: random.Random) -> bytes:
+    """
+    Rasterize a page like a scanner: grayscale, slight skew, sensor noise
+
+    Returns:
+        JPEG bytes
+    """
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    img = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    img = img.rotate(rng.uniform(-0.6, 0.6), resample=Image.BILINEAR, fillcolor=255)
+
+    noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, 10, (img.height, img.width))
+    pixels = np.clip(np.asarray(img, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+
+    out = io.BytesIO()
+    Image.fromarray(pixels, "L").save(out, "JPEG", quality=75)
+    return out.getvalue()
+
+
+# ============================================================================
+# PLAN SETS
+# ============================================================================
+
+def generate_plan_set(
+    output_path: str,
+    pages: int = 8,
+    sheet: str = "ARCH D",
+    scanned_ratio: float = 0.0,
+    scan_dpi: int = 150,
+    seed: int = 0
+) -> Dict:
+    """
+    Write a synthetic plan set PDF
+
+    Args:
+        output_path: PDF path to write
+        pages: Number of sheets
+        sheet: Sheet size name (see SHEET_SIZES)
+        scanned_ratio: Share of sheets rasterized as scans (no text layer)
+        scan_dpi: Resolution of scanned sheets
+        seed: Random seed (same arguments + seed -> same PDF)
+
+    Returns:
+        Manifest:
+        {
+            "pages": [{"page_no", "kind", "sheet_no", "category", "scanned"}],
+            "counts": {"doors": {"total", "by_type"}, "windows": {...}},
+            "sheet": ..., "size_in": [w, h], "seed": ...
+        }
+
+    Raises:
+        ValueError: On an unknown sheet size or a page count below 1
+    """
+    if sheet not in SHEET_SIZES:
+        raise ValueError(f"Unknown sheet size {sheet!r} (one of {', '.join(SHEET_SIZES)})")
+    if pages < 1:
+        raise ValueError("pages must be at least 1")
+
+    rng = random.Random(seed)
+    kinds = sheet_kinds(pages)
+    counts = schedule_counts(rng)
+    width_in, height_in = SHEET_SIZES[sheet]
+
+    # Sheet numbers / titles
+    floors = [i for i, kind in enumerate(kinds) if kind == "floor_plan"]
+    titles, numbers = [], []
+    floor_no = elevation_no = 0
+    for kind in kinds:
+        if kind == "floor_plan":
+            titles.append(FLOOR_NAMES[floor_no % len(FLOOR_NAMES)])
+            numbers.append(f"A-{101 + floor_no}")
+            floor_no += 1
+        elif kind == "elevation":
+            titles.append(["NORTH", "SOUTH", "EAST", "WEST"][elevation_no % 4] + " ELEVATION")
+            numbers.append(f"A-{201 + elevation_no}")
+            elevation_no += 1
+        else:
+            titles.append({
+                "cover": "COVER SHEET",
+                "legend": "LEGEND",
+                "door_schedule": "DOOR SCHEDULE",
+                "window_schedule": "WINDOW SCHEDULE",
+            }[kind])
+            numbers.append({"cover": "G-001", "legend": "G-002", "door_schedule": "A-601",
+                            "window_schedule": "A-602"}[kind])
+
+    # Door / window instances per floor (tags match the schedule types)
+    door_tags = [tag for key, qty in counts["doors"].items() for tag in [key[0].upper() + "D"] * qty]
+    window_tags = [tag for key, qty in counts["windows"].items() for tag in [key[0].upper() + "W"] * qty]
+    doors_per_floor = _split(len(door_tags), len(floors))
+    windows_per_floor = _split(len(window_tags), len(floors))
+
+    vector = fitz.open()
+    for page_no, kind in enumerate(kinds):
+        page = vector.new_page(width=width_in * 72, height=height_in * 72)
+        writer = SheetWriter(page, numbers[page_no], titles[page_no])
+        if kind == "cover":
+            draw_cover(writer, list(zip(numbers, titles)))
+        elif kind == "legend":
+            draw_legend(writer)
+        elif kind == "door_schedule":
+            draw_schedule(writer, "DOOR SCHEDULE", "D", counts["doors"], rng)
+        elif kind == "window_schedule":
+            draw_schedule(writer, "WINDOW SCHEDULE", "W", counts["windows"], rng)
+        elif kind == "floor_plan":
+            floor = floors.index(page_no)
+            d0 = sum(doors_per_floor[:floor])
+            w0 = sum(windows_per_floor[:floor])
+            draw_floor_plan(
+                writer,
+                titles[page_no],
+                door_tags[d0:d0 + doors_per_floor[floor]],
+                window_tags[w0:w0 + windows_per_floor[floor]],
+                rng
+            )
+        else:
+            draw_elevation(writer, titles[page_no])
+        writer.commit()
+
+    scanned = set(rng.sample(range(pages), round(pages * min(max(scanned_ratio, 0.0), 1.0))))
+
+    out = fitz.open()
+    for page_no in range(pages):
+        if page_no in scanned:
+            page = out.new_page(width=width_in * 72, height=height_in * 72)
+            page.insert_image(page.rect, stream=scan_page(vector[page_no], scan_dpi, rng))
+        else:
+            out.insert_pdf(vector, from_page=page_no, to_page=page_no)
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    out.save(output_path, deflate=True)
+    out.close()
+    vector.close()
+
+    return {
+        "pages": [
+            {
+                "page_no": page_no,
+                "kind": kind,
+                "sheet_no": numbers[page_no],
+                "category": KIND_CATEGORIES[kind],
+                "scanned": page_no in scanned,
+            }
+            for page_no, kind in enumerate(kinds)
+        ],
+        "counts": {
+            section: {"total": sum(by_type.values()), "by_type": by_type}
+            for section, by_type in counts.items()
+        },
+        "sheet": sheet,
+        "size_in": [width_in, height_in],
+        "seed": seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic plan set PDF (+ .json manifest)")
+    parser.add_argument("output", help="PDF path to write")
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--sheet", default="ARCH D", choices=sorted(SHEET_SIZES))
+    parser.add_argument("--scanned-ratio", type=float, default=0.0, help="Share of sheets rasterized as scans")
+    parser.add_argument("--scan-dpi", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    manifest = generate_plan_set(
+        args.output, args.pages, args.sheet, args.scanned_ratio, args.scan_dpi, args.seed
+    )
+    manifest_path = Path(args.output).with_suffix(".json")
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    print(f"Wrote {args.output} ({args.pages} sheets) and {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ Centralized configuration for the Python worker
 """
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,18 +14,31 @@ load_dotenv()
 # ENVIRONMENT VARIABLES
 # ============================================================================
 
-# Supabase
-SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL")
-SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+# Credentials are read on first access (config.SUPABASE_URL etc., see __getattr__
+# below), so modules can be imported and CPU stages run without them. A missing
+# value raises when a client is created, not at import.
+CREDENTIALS = {
+    "SUPABASE_URL": "NEXT_PUBLIC_SUPABASE_URL",
+    "SUPABASE_SERVICE_ROLE_KEY": "SUPABASE_SERVICE_ROLE_KEY",
+    "OPENAI_API_KEY": "OPENAI_API_KEY",
+}
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
 
-# OpenAI
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+def __getattr__(name: str) -> str:
+    """
+    Resolve a credential from the environment on access
 
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY must be set")
+    Raises:
+        AttributeError: For names that are not credentials
+        ValueError: If the credential's env var is not set
+    """
+    env_name = CREDENTIALS.get(name)
+    if env_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = os.getenv(env_name)
+    if not value:
+        raise ValueError(f"{env_name} must be set")
+    return value
 
 # ============================================================================
 # PROCESSING CONFIGURATION
@@ -37,6 +51,127 @@ PDF_FORMAT = "PNG"  # Output format for rendered pages
 # OpenAI Model
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")  # gpt-4o supports vision
 
+# Extraction backend: openai | replay (recorded responses) | synthetic (offline load testing)
+EXTRACTION_BACKEND = os.getenv("EXTRACTION_BACKEND", "openai")
+EXTRACTION_REPLAY_DIR = os.getenv(
+    "EXTRACTION_REPLAY_DIR",
+    os.path.join(tempfile.gettempdir(), "plan_extraction_replay")
+)
+EXTRACTION_REPLAY_MODE = os.getenv("EXTRACTION_REPLAY_MODE", "replay")  # replay | record (call OpenAI on miss)
+EXTRACTION_REPLAY_REALTIME = os.getenv("EXTRACTION_REPLAY_REALTIME", "false").lower() == "true"  # Replay latency
+SYNTHETIC_LATENCY = os.getenv("SYNTHETIC_LATENCY", "lognormal:4,0.5")  # fixed|uniform|normal|lognormal:<args>
+SYNTHETIC_SEED = int(os.getenv("SYNTHETIC_SEED", "0"))
+SYNTHETIC_STRAY_EVIDENCE_RATE = float(os.getenv("SYNTHETIC_STRAY_EVIDENCE_RATE", "0.1"))  # Pass 1 cites an unsent page
+
+# Client-side rate limits shared by all workers on a host (0 = disabled; set to your account's quota)
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "0"))  # Requests per minute
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "0"))  # Tokens per minute
+OPENAI_RATE_LIMIT_RETRIES = int(os.getenv("OPENAI_RATE_LIMIT_RETRIES", "5"))  # Waits after a 429 before failing
+# Per-model limits, "model=rpm:tpm,...": OpenAI limits each model separately, so e.g. the
+# escalation cheap model gets its own budget (unlisted models use the two limits above)
+OPENAI_MODEL_RATE_LIMITS = {
+    model.strip(): tuple(int(value) for value in limits.split(":"))
+    for model, _, limits in (
+        item.partition("=") for item in os.getenv("OPENAI_MODEL_RATE_LIMITS", "").split(",") if item.strip()
+    )
+}
+RATE_LIMIT_STATE_DIR = os.getenv(
+    "RATE_LIMIT_STATE_DIR",
+    os.path.join(tempfile.gettempdir(), "plan_rate_limit")
+)
+
+# Async extraction (split pages into schedule/legend/floor plan chunks, call concurrently)
+EXTRACTION_ASYNC = os.getenv("EXTRACTION_ASYNC", "false").lower() == "true"
+EXTRACTION_CHUNK_MAX_PAGES = int(os.getenv("EXTRACTION_CHUNK_MAX_PAGES", "4"))  # Pages per request
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "4"))  # In-flight requests per job
+
+# Local consistency audit (run Pass 2 only when deterministic checks fail)
+EXTRACTION_LOCAL_AUDIT = os.getenv("EXTRACTION_LOCAL_AUDIT", "true").lower() == "true"
+
+# Structured outputs (schema-constrained JSON) and streamed responses
+EXTRACTION_STRUCTURED_OUTPUT = os.getenv("EXTRACTION_STRUCTURED_OUTPUT", "true").lower() == "true"
+EXTRACTION_STREAM = os.getenv("EXTRACTION_STREAM", "true").lower() == "true"  # Abort malformed output early
+EXTRACTION_MAX_ATTEMPTS = int(os.getenv("EXTRACTION_MAX_ATTEMPTS", "2"))  # Attempts per call on malformed JSON
+EXTRACTION_STREAM_PAYLOAD = os.getenv("EXTRACTION_STREAM_PAYLOAD", "true").lower() == "true"  # Encode images while sending
+
+# Confidence-driven escalation (cheap model on low-resolution pages first; the main model
+# re-extracts at full resolution only sections with low confidence or failed consistency checks)
+EXTRACTION_ESCALATION = os.getenv("EXTRACTION_ESCALATION", "false").lower() == "true"
+ESCALATION_CHEAP_MODEL = os.getenv("ESCALATION_CHEAP_MODEL", "gpt-4o-mini")
+ESCALATION_LOW_RES_MAX_SIDE = int(os.getenv("ESCALATION_LOW_RES_MAX_SIDE", "1024"))  # Longest side, no tiles
+ESCALATION_LOW_RES_DETAIL = os.getenv("ESCALATION_LOW_RES_DETAIL", "high")  # low|high|auto
+ESCALATION_MIN_CONFIDENCE = os.getenv("ESCALATION_MIN_CONFIDENCE", "medium")  # Escalate sections below this
+
+# Per-job budget (Pass 2 is skipped and the job flagged for review when it would be exceeded)
+EXTRACTION_MAX_TOKENS_PER_JOB = int(os.getenv("EXTRACTION_MAX_TOKENS_PER_JOB", "0"))  # 0 = unlimited
+EXTRACTION_MAX_COST_PER_JOB = float(os.getenv("EXTRACTION_MAX_COST_PER_JOB", "0"))  # USD, 0 = unlimited
+
+# Model pricing for cost accounting (USD per 1M tokens: input, output)
+OPENAI_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+}
+BATCH_PRICE_DISCOUNT = 0.5  # Batch API requests are billed at half price
+
+# Batch extraction (offline jobs via the Batch API; point at mock_batch_server.py for local testing)
+OPENAI_BATCH_BASE_URL = os.getenv("OPENAI_BATCH_BASE_URL")  # None = api.openai.com
+BATCH_POLL_INTERVAL_SECONDS = int(os.getenv("BATCH_POLL_INTERVAL_SECONDS", "30"))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+BATCH_MAX_WAIT_HOURS = float(os.getenv("BATCH_MAX_WAIT_HOURS", "25"))  # Then cancel and return jobs to their status
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))  # API limit per batch file
+BATCH_MAX_FILE_MB = int(os.getenv("BATCH_MAX_FILE_MB", "190"))  # API limit is 200 MB per file
+
+# Extraction result cache (SQLite, keyed by model + prompts + context + image hashes)
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "plan_extraction_cache.sqlite3")
+)
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+EXTRACTION_CACHE_MAX_MB = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "256"))
+
+# Vision image preparation (resize overviews to model resolution, add high-detail tiles)
+VISION_RESIZE = os.getenv("VISION_RESIZE", "true").lower() == "true"
+VISION_OVERVIEW_MAX_SIDE = int(os.getenv("VISION_OVERVIEW_MAX_SIDE", "2048"))  # gpt-4o high detail fits 2048x2048
+VISION_OVERVIEW_SHORT_SIDE = int(os.getenv("VISION_OVERVIEW_SHORT_SIDE", "768"))  # ...then shortest side 768
+VISION_OVERVIEW_DETAIL = os.getenv("VISION_OVERVIEW_DETAIL", "high")  # low|high|auto
+VISION_TILE_DETAIL = os.getenv("VISION_TILE_DETAIL", "high")
+VISION_TILE_SIZE = int(os.getenv("VISION_TILE_SIZE", "1024"))  # Tile edge in rendered page pixels
+VISION_MAX_TILES_PER_PAGE = int(os.getenv("VISION_MAX_TILES_PER_PAGE", "4"))  # 0 disables tiling
+VISION_TILE_MIN_DENSITY = float(os.getenv("VISION_TILE_MIN_DENSITY", "0.08"))  # Min ink coverage for a tile
+VISION_TILE_GROUPS = os.getenv("VISION_TILE_GROUPS", "schedule,floor_plan,other").split(",")
+
+# Page image pyramid (preview and thumbnail written with each rendered page; uploaded and
+# listed in the page_image artifact's meta["levels"] so clients fetch only what they show)
+PAGE_PYRAMID = os.getenv("PAGE_PYRAMID", "true").lower() == "true"
+PAGE_PREVIEW_MAX_SIDE = int(os.getenv("PAGE_PREVIEW_MAX_SIDE", "1600"))  # Screen preview (px)
+PAGE_THUMBNAIL_MAX_SIDE = int(os.getenv("PAGE_THUMBNAIL_MAX_SIDE", "256"))  # List thumbnail (px)
+PAGE_PYRAMID_FORMAT = os.getenv("PAGE_PYRAMID_FORMAT", "JPEG").upper()  # JPEG | PNG | WEBP (full stays PNG)
+PAGE_PYRAMID_QUALITY = int(os.getenv("PAGE_PYRAMID_QUALITY", "85"))  # JPEG/WEBP quality
+
+# Text-layer prompting (send layout text instead of images for vector PDF pages in these groups)
+EXTRACTION_TEXT_LAYER = os.getenv("EXTRACTION_TEXT_LAYER", "false").lower() == "true"
+EXTRACTION_TEXT_LAYER_GROUPS = os.getenv("EXTRACTION_TEXT_LAYER_GROUPS", "schedule,legend").split(",")
+TEXT_LAYER_MIN_WORDS = int(os.getenv("TEXT_LAYER_MIN_WORDS", "20"))  # Fewer words = scanned page, use image
+TEXT_LAYER_MAX_CHARS = int(os.getenv("TEXT_LAYER_MAX_CHARS", "24000"))  # Longer pages fall back to images
+
+# Artifact uploads (page images etc.)
+ARTIFACT_UPLOAD_CONCURRENCY = int(os.getenv("ARTIFACT_UPLOAD_CONCURRENCY", "8"))  # Parallel storage uploads
+
+# Storage backend: supabase | local (files under LOCAL_STORAGE_DIR/<bucket>/, for offline I/O benchmarks)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", os.path.join(tempfile.gettempdir(), "plan_storage"))
+LOCAL_STORAGE_LATENCY = os.getenv("LOCAL_STORAGE_LATENCY", "fixed:0")  # Per request, same specs as SYNTHETIC_LATENCY
+LOCAL_STORAGE_BANDWIDTH_MBIT = float(os.getenv("LOCAL_STORAGE_BANDWIDTH_MBIT", "0"))  # Shared link, 0 = unlimited
+
+# Direct Postgres for job/metadata queries (empty = PostgREST through the Supabase client;
+# storage always goes through Supabase). Needs psycopg + psycopg-pool.
+DATABASE_URL = os.getenv("DATABASE_URL", "")  # e.g. postgresql://postgres:<password>@db.<ref>.supabase.co:5432/postgres
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "1"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "4"))
+DATABASE_PREPARE = os.getenv("DATABASE_PREPARE", "true").lower() == "true"  # false behind a transaction-mode pooler
+
 # Processing Limits
 MAX_PAGES = int(os.getenv("MAX_PAGES", "50"))  # Max pages to process
 MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
@@ -45,6 +180,21 @@ MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
 POLL_INTERVAL_SECONDS = int(os.getenv("POLL_INTERVAL_SECONDS", "5"))
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
 
+# Prometheus metrics endpoint (stage timings, job/page/byte/token counters; 0 = disabled)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "0.0.0.0")
+
+# Per-job memory profiling: peak RSS per stage, stored in the analysis evidence ("memory")
+MEMORY_PROFILE = os.getenv("MEMORY_PROFILE", "false").lower() == "true"
+MEMORY_PROFILE_INTERVAL_MS = int(os.getenv("MEMORY_PROFILE_INTERVAL_MS", "50"))  # RSS sampling period
+MEMORY_PROFILE_TRACEMALLOC = os.getenv("MEMORY_PROFILE_TRACEMALLOC", "false").lower() == "true"  # Slow: top allocators
+MEMORY_PROFILE_TOP = int(os.getenv("MEMORY_PROFILE_TOP", "5"))  # Allocation sites kept per stage
+
+# Trace spans per job and stage, exported as OTLP JSON (tracing is off when both are empty)
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # JSON lines: one OTLP export request per trace
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")  # e.g. http://localhost:4318/v1/traces
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "plan-worker")
+
 # ============================================================================
 # EXTRACTION PROMPTS
 # ============================================================================
@@ -0,0 +1,722 @@
+"""
+Extraction Backends
+Pluggable chat completion backends for openai_extract:
+
+- openai:    the OpenAI API (default)
+- replay:    plays back recorded responses keyed by request hash
+             (EXTRACTION_REPLAY_MODE=record calls OpenAI on a miss and stores the response)
+- synthetic: valid synthetic extractions after a sampled latency, for offline
+             throughput and concurrency measurements
+
+Select with EXTRACTION_BACKEND.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from openai import (
+    OpenAI,
+    APIStatusError,
+    RateLimitError,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_TIMEOUT,
+)
+
+import config
+from config import (
+    EXTRACTION_BACKEND,
+    EXTRACTION_STREAM_PAYLOAD,
+    EXTRACTION_REPLAY_DIR,
+    EXTRACTION_REPLAY_MODE,
+    EXTRACTION_REPLAY_REALTIME,
+    SYNTHETIC_LATENCY,
+    SYNTHETIC_SEED,
+    SYNTHETIC_STRAY_EVIDENCE_RATE,
+)
+from latency import parse_latency_spec
+from rate_limit import estimate_prompt_tokens
+from request_payload import iter_json_bytes, json_digest_default, json_length, materialize
+
+logger = logging.getLogger(__name__)
+
+# Request parameters that do not change the response (excluded from replay keys)
+TRANSPORT_PARAMS = {"stream", "extra_body"}
+
+# Called with each piece of response text as it arrives; may raise to abort the call
+DeltaCallback = Callable[[str], None]
+
+
+class ReplayMissError(LookupError):
+    """Raised when the replay backend has no recorded response for a request"""
+
+
+class ExtractionBackend(ABC):
+    """
+    Backend interface (subclasses implement complete())
+
+    complete() / complete_async() send one chat completion request and return
+    {"text": str, "usage": dict|object|None, "finish_reason": str|None}.
+    Response text is passed to on_delta as it arrives, so callers can abort
+    malformed output early; exceptions raised by on_delta propagate.
+
+    async_session() yields the object used for complete_async() calls within
+    one event loop (e.g., a pass's concurrent chunks).
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def complete(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        ...
+
+    async def complete_async(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        return await asyncio.to_thread(self.complete, messages, params, on_delta)
+
+    @asynccontextmanager
+    async def async_session(self):
+        yield self
+
+
+# ============================================================================
+# OPENAI
+# ============================================================================
+
+RETRYABLE_STATUS_CODES = {408, 409, 500, 502, 503, 504}
+
+
+def _new_stream_result() -> Dict:
+    return {"parts": [], "usage": None, "finish_reason": None}
+
+
+def _read_chunk(result: Dict, chunk: Dict, on_delta: Optional[DeltaCallback]) -> None:
+    if chunk.get("usage"):
+        result["usage"] = chunk["usage"]
+
+    for choice in chunk.get("choices") or []:
+        if choice.get("finish_reason"):
+            result["finish_reason"] = choice["finish_reason"]
+        delta = (choice.get("delta") or {}).get("content")
+        if delta:
+            result["parts"].append(delta)
+            if on_delta:
+                on_delta(delta)
+
+
+def _finish_stream(result: Dict) -> Dict:
+    return {
+        "text": "".join(result.pop("parts")),
+        "usage": result["usage"],
+        "finish_reason": result["finish_reason"],
+    }
+
+
+def _finish_response(response: Dict, on_delta: Optional[DeltaCallback]) -> Dict:
+    choice = response["choices"][0]
+    text = choice["message"].get("content") or ""
+    if on_delta:
+        on_delta(text)
+    return {
+        "text": text,
+        "usage": response.get("usage"),
+        "finish_reason": choice.get("finish_reason"),
+    }
+
+
+def _read_sse_line(result: Dict, line: str, on_delta: Optional[DeltaCallback]) -> None:
+    """Add one server-sent event line of a streamed completion (keep-alives and [DONE] are skipped)"""
+    if not line.startswith("data:"):
+        return
+    data = line[len("data:"):].strip()
+    if data and data != "[DONE]":
+        _read_chunk(result, json.loads(data), on_delta)
+
+
+def _status_error(response: httpx.Response) -> APIStatusError:
+    try:
+        body = response.json()
+        message = (body.get("error") or {}).get("message") or response.text
+    except ValueError:
+        body, message = None, response.text
+    error_class = RateLimitError if response.status_code == 429 else APIStatusError
+    return error_class(f"Error code: {response.status_code} - {message}", response=response, body=body)
+
+
+def _retry_delay(attempt: int) -> float:
+    return min(8.0, 0.5 * 2 ** attempt)
+
+
+def _retry_delay_or_raise(
+    attempt: int,
+    max_retries: int,
+    response: Optional[httpx.Response] = None,
+    error: Optional[httpx.TransportError] = None
+) -> float:
+    """
+    Seconds to wait before retrying a failed attempt
+
+    Args:
+        attempt: Attempt number (0 = first)
+        max_retries: Retries allowed after the first attempt
+        response: The error response (status >= 400, body read), if any
+        error: The transport error, if any
+
+    Raises:
+        The transport error or the response's APIStatusError when the failure
+        is not retryable or no retries are left. 429s raise RateLimitError
+        right away: openai_extract waits for their retry-after.
+    """
+    if response is not None and response.status_code not in RETRYABLE_STATUS_CODES:
+        raise _status_error(response)
+    if attempt >= max_retries:
+        raise error if error is not None else _status_error(response)
+    return _retry_delay(attempt)
+
+
+class _OpenAIAsyncSession:
+    """Async calls through one HTTP client (bound to the running event loop)"""
+
+    def __init__(self, backend: "OpenAIBackend", http: httpx.AsyncClient):
+        self.backend = backend
+        self.http = http
+
+    async def complete_async(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        url, headers, body = self.backend.request_parts(messages, params)
+
+        async def content():
+            # File reads are small fixed-size chunks; fine to do on the event loop
+            for chunk in iter_json_bytes(body):
+                yield chunk
+
+        for attempt in range(self.backend.max_retries + 1):
+            try:
+                async with self.http.stream("POST", url, content=content(), headers=headers) as response:
+                    if response.status_code < 400:
+                        return await self._read_response(response, params, on_delta)
+                    await response.aread()
+                    delay = _retry_delay_or_raise(attempt, self.backend.max_retries, response=response)
+            except httpx.TransportError as e:
+                delay = _retry_delay_or_raise(attempt, self.backend.max_retries, error=e)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _read_response(response: httpx.Response, params: Dict, on_delta: Optional[DeltaCallback]) -> Dict:
+        if not params.get("stream"):
+            return _finish_response(json.loads(await response.aread()), on_delta)
+
+        # Raising from on_delta closes the response, stopping generation on malformed output
+        result = _new_stream_result()
+        async for line in response.aiter_lines():
+            _read_sse_line(result, line, on_delta)
+        return _finish_stream(result)
+
+
+class OpenAIBackend(ExtractionBackend):
+    """
+    Chat completions through the OpenAI API
+
+    Request bodies are streamed (images base64-encoded from disk as they are
+    sent, see request_payload) over a pooled HTTP client. With
+    EXTRACTION_STREAM_PAYLOAD=false, messages are materialized and sent
+    through the OpenAI SDK instead.
+    """
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, max_retries: int = DEFAULT_MAX_RETRIES):
+        self._api_key = api_key
+        self.max_retries = max_retries
+        self._client: Optional[OpenAI] = None
+        self._http: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+
+    @property
+    def api_key(self) -> str:
+        # Read on first request, so a backend can be built without credentials
+        return self._api_key or config.OPENAI_API_KEY
+
+    @property
+    def client(self) -> OpenAI:
+        # Created on first use, so importing the pipeline needs no network or key
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    @property
+    def http(self) -> httpx.Client:
+        if self._http is None:
+            with self._lock:
+                if self._http is None:
+                    self._http = httpx.Client(timeout=DEFAULT_TIMEOUT)
+        return self._http
+
+    def request_parts(self, messages: List[Dict], params: Dict):
+        """
+        URL, headers and body (with ImagePayload values) for a chat completion
+
+        Uses the SDK client's base URL (OPENAI_BASE_URL) and auth headers. The
+        body's length is known without encoding the images, so it is sent with
+        Content-Length rather than chunked.
+        """
+        body = {"messages": messages, **params}
+        body.update(body.pop("extra_body", None) or {})
+        headers = {
+            key: value for key, value in self.client.default_headers.items()
+            if isinstance(value, str)
+        }
+        headers["Content-Length"] = str(json_length(body))
+        return str(self.client.base_url.join("chat/completions")), headers, body
+
+    def complete(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        if not EXTRACTION_STREAM_PAYLOAD:
+            return self._complete_sdk(materialize(messages), params, on_delta)
+
+        url, headers, body = self.request_parts(messages, params)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                # The body generator is rebuilt on every attempt
+                with self.http.stream("POST", url, content=iter_json_bytes(body), headers=headers) as response:
+                    if response.status_code < 400:
+                        return self._read_response(response, params, on_delta)
+                    response.read()
+                    delay = _retry_delay_or_raise(attempt, self.max_retries, response=response)
+            except httpx.TransportError as e:
+                delay = _retry_delay_or_raise(attempt, self.max_retries, error=e)
+            time.sleep(delay)
+
+    @staticmethod
+    def _read_response(response: httpx.Response, params: Dict, on_delta: Optional[DeltaCallback]) -> Dict:
+        if not params.get("stream"):
+            return _finish_response(json.loads(response.read()), on_delta)
+
+        # Raising from on_delta closes the response, stopping generation on malformed output
+        result = _new_stream_result()
+        for line in response.iter_lines():
+            _read_sse_line(result, line, on_delta)
+        return _finish_stream(result)
+
+    def _complete_sdk(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        if not params.get("stream"):
+            response = self.client.chat.completions.create(messages=messages, **params)
+            return _finish_response(response.model_dump(), on_delta)
+
+        stream = self.client.chat.completions.create(messages=messages, **params)
+        result = _new_stream_result()
+        try:
+            for chunk in stream:
+                _read_chunk(result, chunk.model_dump(), on_delta)
+        finally:
+            # Closing early stops generation (and billing) on malformed output
+            stream.response.close()
+        return _finish_stream(result)
+
+    @asynccontextmanager
+    async def async_session(self):
+        if not EXTRACTION_STREAM_PAYLOAD:
+            # SDK path: sync complete() in worker threads (ExtractionBackend.complete_async)
+            yield self
+            return
+        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as http:
+            yield _OpenAIAsyncSession(self, http)
+
+
+# ============================================================================
+# RECORD / REPLAY
+# ============================================================================
+
+def request_key(messages: List[Dict], params: Dict) -> str:
+    """
+    Hash a request (messages + response-affecting parameters)
+
+    Args:
+        messages: Chat messages
+        params: Completion parameters
+
+    Returns:
+        SHA-256 hex digest
+    """
+    payload = {
+        "messages": messages,
+        "params": {k: v for k, v in params.items() if k not in TRANSPORT_PARAMS},
+    }
+    # Images are identified by content digest, so hashing never encodes them
+    text = json.dumps(payload, sort_keys=True, default=json_digest_default)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _usage_dict(usage) -> Optional[Dict]:
+    if usage is None:
+        return None
+    keys = ["prompt_tokens", "completion_tokens", "total_tokens"]
+    if isinstance(usage, dict):
+        return {key: usage.get(key, 0) for key in keys}
+    return {key: getattr(usage, key, 0) for key in keys}
+
+
+class ReplayBackend(ExtractionBackend):
+    """
+    Plays back stored responses (one JSON file per request hash)
+
+    With a recorder backend, misses are sent to it and the response is stored;
+    otherwise a miss raises ReplayMissError.
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        directory: str,
+        recorder: Optional[ExtractionBackend] = None,
+        realtime: bool = False
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.recorder = recorder
+        self.realtime = realtime  # Sleep for the recorded latency on playback
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _store(self, key: str, result: Dict, elapsed: float, params: Dict):
+        record = {
+            "model": params.get("model"),
+            "text": result["text"],
+            "usage": _usage_dict(result["usage"]),
+            "finish_reason": result["finish_reason"],
+            "elapsed_s": round(elapsed, 3),
+            "recorded_at": int(time.time()),
+        }
+        # Write then rename, so concurrent workers never read a partial file
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(record, f)
+        tmp_path.replace(path)
+
+    def _play(self, record: Dict, on_delta: Optional[DeltaCallback]) -> Dict:
+        if on_delta and record["text"]:
+            on_delta(record["text"])
+        return {
+            "text": record["text"],
+            "usage": record.get("usage"),
+            "finish_reason": record.get("finish_reason"),
+        }
+
+    def _miss(self, key: str):
+        if self.recorder is None:
+            raise ReplayMissError(f"No recorded response for request {key[:12]} in {self.directory}")
+
+    def complete(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        key = request_key(messages, params)
+        record = self._load(key)
+
+        if record is not None:
+            if self.realtime:
+                time.sleep(record.get("elapsed_s", 0))
+            return self._play(record, on_delta)
+
+        self._miss(key)
+        started = time.perf_counter()
+        result = self.recorder.complete(messages, params, on_delta)
+        self._store(key, result, time.perf_counter() - started, params)
+        logger.info(f"Recorded response {key[:12]}")
+        return result
+
+    async def complete_async(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        key = request_key(messages, params)
+        record = await asyncio.to_thread(self._load, key)
+
+        if record is not None:
+            if self.realtime:
+                await asyncio.sleep(record.get("elapsed_s", 0))
+            return self._play(record, on_delta)
+
+        # Recording is not latency sensitive: use the recorder's sync path in a thread
+        self._miss(key)
+        return await asyncio.to_thread(self.complete, messages, params, on_delta)
+
+
+# ============================================================================
+# SYNTHETIC
+# ============================================================================
+
+# Content parts naming the pages a Pass 1 request sends ("Page 3:", "Page 3 overview:", ...)
+SENT_PAGE_PATTERN = re.compile(r"^Page (\d+)\b")
+# Evidence pages in a Pass 2 request's embedded extraction, and the ones its checks flagged
+CITED_PAGE_PATTERN = re.compile(r'"page_no": (\d+)')
+UNANALYZED_PAGE_PATTERN = re.compile(r"cites page (\d+), which was not analyzed")
+
+
+def request_pages(messages: List[Dict]) -> Tuple[List[int], bool]:
+    """
+    Page numbers a chat request covers
+
+    Returns:
+        (pages, sent): the pages sent as images / text layers (Pass 1, sent=True);
+        otherwise the analyzed pages cited in the embedded extraction, without
+        pages the consistency checks flagged (Pass 2, sent=False)
+    """
+    sent, cited, flagged = set(), set(), set()
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            if message.get("role") != "system":
+                cited.update(int(page) for page in CITED_PAGE_PATTERN.findall(content))
+                flagged.update(int(page) for page in UNANALYZED_PAGE_PATTERN.findall(content))
+            continue
+        for part in content or []:
+            match = SENT_PAGE_PATTERN.match(part.get("text", "")) if part.get("type") == "text" else None
+            if match:
+                sent.add(int(match.group(1)))
+
+    if sent:
+        return sorted(sent), True
+    return sorted(cited - flagged), False
+
+
+def synthetic_extraction(seed: str, pages: Optional[List[int]] = None, stray_evidence_rate: float = 0.0) -> Dict:
+    """
+    Build a deterministic, schema-valid and internally consistent extraction
+
+    Args:
+        seed: Any string (same seed -> same result)
+        pages: Page numbers evidence may cite (default: [0])
+        stray_evidence_rate: Probability of also citing a page outside `pages`
+            (fails validate.check_evidence_pages, so Pass 2 runs)
+
+    Returns:
+        Extraction JSON dict
+    """
+    rng = random.Random(hashlib.sha256(seed.encode("utf-8")).hexdigest())
+    pages = sorted(pages or [0])
+
+    doors_by_type = {key: rng.randint(0, 8) for key in ["entry", "interior", "sliding", "bifold", "other"]}
+    windows_by_type = {key: rng.randint(0, 10) for key in ["fixed", "casement", "sliding", "other"]}
+    bathroom_count = rng.randint(1, 4)
+
+    def evidence(source: str) -> List[Dict]:
+        return [
+            {"page_no": page_no, "artifact_id": "", "source": source, "note": "synthetic", "region": None}
+            for page_no in sorted(rng.sample(pages, min(len(pages), rng.randint(1, 2))))
+        ]
+
+    doors_evidence = evidence("schedule")
+    if rng.random() < stray_evidence_rate:
+        doors_evidence.append(
+            {"page_no": pages[-1] + 1, "artifact_id": "", "source": "schedule", "note": "synthetic", "region": None}
+        )
+
+    return {
+        "meta": {
+            "floors_detected": rng.randint(1, 3),
+            "plan_type": "residential",
+            "units": "imperial",
+            "notes": "synthetic extraction",
+        },
+        "doors": {
+            "total": sum(doors_by_type.values()),
+            "by_type": doors_by_type,
+            "confidence": "high",
+            "evidence": doors_evidence,
+        },
+        "windows": {
+            "total": sum(windows_by_type.values()),
+            "by_type": windows_by_type,
+            "confidence": "high",
+            "evidence": evidence("schedule"),
+        },
+        "kitchen": {
+            "cabinets_count_est": rng.randint(4, 20),
+            "linear_ft_est": float(rng.randint(8, 40)),
+            "confidence": "medium",
+            "evidence": evidence("plan_symbols"),
+        },
+        "bathrooms": {
+            "bathroom_count": bathroom_count,
+            "toilets": bathroom_count,
+            "sinks": bathroom_count,
+            "showers": bathroom_count,
+            "bathtubs": rng.randint(0, bathroom_count),
+            "confidence": "medium",
+            "evidence": evidence("plan_symbols"),
+        },
+        "other_fixtures": {
+            "wardrobes": rng.randint(0, 6),
+            "closets": rng.randint(0, 6),
+            "shelving_units": rng.randint(0, 4),
+            "confidence": "low",
+            "evidence": [],
+        },
+        "review": {
+            "needs_review": False,
+            "flags": [],
+            "assumptions": [],
+        },
+    }
+
+
+class SyntheticBackend(ExtractionBackend):
+    """Returns synthetic extractions (seeded by request hash) after a sampled latency"""
+
+    name = "synthetic"
+
+    def __init__(
+        self,
+        latency: str = SYNTHETIC_LATENCY,
+        seed: int = SYNTHETIC_SEED,
+        stray_evidence_rate: float = SYNTHETIC_STRAY_EVIDENCE_RATE
+    ):
+        self.sample_latency = parse_latency_spec(latency)
+        self.stray_evidence_rate = stray_evidence_rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _respond(self, messages: List[Dict], params: Dict, on_delta: Optional[DeltaCallback]) -> Dict:
+        # Evidence cites the request's pages; Pass 1 sometimes cites a page it was not sent
+        pages, sent = request_pages(messages)
+        text = json.dumps(synthetic_extraction(
+            request_key(messages, params), pages, self.stray_evidence_rate if sent else 0.0
+        ))
+        if on_delta:
+            on_delta(text)
+
+        prompt_tokens = estimate_prompt_tokens(messages)
+        completion_tokens = len(text) // 4
+        return {
+            "text": text,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+            "finish_reason": "stop",
+        }
+
+    def _latency(self) -> float:
+        with self._lock:
+            return self.sample_latency(self.rng)
+
+    def complete(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        time.sleep(self._latency())
+        return self._respond(messages, params, on_delta)
+
+    async def complete_async(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        on_delta: Optional[DeltaCallback] = None
+    ) -> Dict:
+        await asyncio.sleep(self._latency())
+        return self._respond(messages, params, on_delta)
+
+
+# ============================================================================
+# SELECTION
+# ============================================================================
+
+_backend: Optional[ExtractionBackend] = None
+_backend_pid: Optional[int] = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name: str = EXTRACTION_BACKEND) -> ExtractionBackend:
+    """
+    Create a backend by name (openai|replay|synthetic)
+
+    Raises:
+        ValueError: On an unknown backend name
+    """
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "replay":
+        recorder = OpenAIBackend() if EXTRACTION_REPLAY_MODE == "record" else None
+        return ReplayBackend(EXTRACTION_REPLAY_DIR, recorder, realtime=EXTRACTION_REPLAY_REALTIME)
+    if name == "synthetic":
+        return SyntheticBackend()
+    raise ValueError(f"Unknown extraction backend: {name!r}")
+
+
+def get_backend() -> ExtractionBackend:
+    """
+    Get the process-wide extraction backend (created on first use)
+
+    A forked child creates its own rather than reusing the parent's HTTP pool.
+    """
+    global _backend, _backend_pid
+    pid = os.getpid()
+    if _backend is None or _backend_pid != pid:
+        with _backend_lock:
+            if _backend is None or _backend_pid != pid:
+                _backend = create_backend()
+                _backend_pid = pid
+                logger.info(f"Using extraction backend: {_backend.name}")
+    return _backend
+
+
+def set_backend(backend: Optional[ExtractionBackend]):
+    """Replace the process-wide backend (None resets to the configured one)"""
+    global _backend, _backend_pid
+    with _backend_lock:
+        _backend = backend
+        _backend_pid = os.getpid()
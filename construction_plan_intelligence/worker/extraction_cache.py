@@ -0,0 +1,224 @@
+"""
+Extraction Cache Module
+Persistent, size-bounded LRU cache of 2-pass extraction results (SQLite)
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config import (
+    OPENAI_MODEL,
+    EXTRACTION_PASS1_PROMPT,
+    EXTRACTION_PASS2_PROMPT,
+    EXTRACTION_CACHE_ENABLED,
+    EXTRACTION_CACHE_PATH,
+    EXTRACTION_CACHE_MAX_ENTRIES,
+    EXTRACTION_CACHE_MAX_MB,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached payload format changes
+CACHE_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    key TEXT PRIMARY KEY,
+    pass1_result TEXT NOT NULL,
+    final_result TEXT NOT NULL,
+    usage TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used ON extraction_cache(last_used_at);
+"""
+
+
+# ============================================================================
+# KEYS
+# ============================================================================
+
+def hash_text(text: str) -> str:
+    """SHA-256 hex digest of a string"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file's contents (read in chunks)"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_cache_key(
+    context_msg: str,
+    image_paths: List[str],
+    mode: str = "single",
+    model: str = OPENAI_MODEL
+) -> str:
+    """
+    Build the cache key for an extraction request
+
+    Args:
+        context_msg: User context message sent with the images
+        image_paths: Ordered list of image paths (hashed by content)
+        mode: Extraction mode (e.g., "single" or the async chunk layout)
+        model: Model name
+
+    Returns:
+        Hex cache key
+    """
+    key_data = {
+        "version": CACHE_VERSION,
+        "model": model,
+        "pass1_prompt": hash_text(EXTRACTION_PASS1_PROMPT),
+        "pass2_prompt": hash_text(EXTRACTION_PASS2_PROMPT),
+        "context": context_msg,
+        "mode": mode,
+        "images": [hash_file(path) for path in image_paths],
+    }
+    return hash_text(json.dumps(key_data, sort_keys=True))
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class ExtractionCache:
+    """On-disk LRU cache bounded by entry count and total payload size"""
+
+    def __init__(
+        self,
+        path: str = EXTRACTION_CACHE_PATH,
+        max_entries: int = EXTRACTION_CACHE_MAX_ENTRIES,
+        max_mb: int = EXTRACTION_CACHE_MAX_MB
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_mb * 1024 * 1024
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A short-lived connection per call keeps this safe across worker processes
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached extraction
+
+        Args:
+            key: Cache key from build_cache_key()
+
+        Returns:
+            Dict with pass1_result, final_result and usage, or None on miss
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT pass1_result, final_result, usage FROM extraction_cache WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE extraction_cache SET last_used_at = ? WHERE key = ?",
+                (time.time(), key)
+            )
+
+        return {
+            "pass1_result": json.loads(row[0]),
+            "final_result": json.loads(row[1]),
+            "usage": json.loads(row[2]),
+        }
+
+    def put(self, key: str, pass1_result: Dict, final_result: Dict, usage: Dict):
+        """
+        Store an extraction result and evict least recently used entries over the limits
+
+        Args:
+            key: Cache key from build_cache_key()
+            pass1_result: Pass 1 JSON
+            final_result: Pass 2 (audited) JSON
+            usage: Usage metrics of the original run
+        """
+        pass1_text = json.dumps(pass1_result)
+        final_text = json.dumps(final_result)
+        usage_text = json.dumps(usage)
+        size_bytes = len(pass1_text) + len(final_text) + len(usage_text)
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache "
+                "(key, pass1_result, final_result, usage, size_bytes, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, pass1_text, final_text, usage_text, size_bytes, now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM extraction_cache"
+        ).fetchone()
+
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        evicted = 0
+        rows = conn.execute(
+            "SELECT key, size_bytes FROM extraction_cache ORDER BY last_used_at ASC"
+        ).fetchall()
+        for key, size_bytes in rows:
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+            count -= 1
+            total_bytes -= size_bytes
+            evicted += 1
+
+        logger.info(f"Extraction cache evicted {evicted} entries")
+
+
+_cache: Optional[ExtractionCache] = None
+
+
+def get_cache() -> Optional[ExtractionCache]:
+    """
+    Get the process-wide extraction cache
+
+    Returns:
+        ExtractionCache, or None if caching is disabled or unavailable
+    """
+    global _cache
+
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+
+    if _cache is None:
+        try:
+            _cache = ExtractionCache()
+        except Exception as e:
+            logger.warning(f"Extraction cache unavailable: {e}")
+            return None
+
+    return _cache
@@ -0,0 +1,40 @@
+"""
+Latency Module
+Latency distribution specs for the synthetic backends (extraction and storage)
+
+Kept free of heavy imports, so storage_backends and the benchmarks can use it
+without loading the OpenAI client.
+"""
+
+import math
+import random
+from typing import Callable
+
+
+def parse_latency_spec(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution spec into a sampler (seconds)
+
+    Specs:
+        fixed:<s>                 e.g. fixed:1.5
+        uniform:<min>,<max>       e.g. uniform:1,4
+        normal:<mean>,<stddev>    e.g. normal:3,0.8 (clamped at 0)
+        lognormal:<median>,<sigma>  e.g. lognormal:3,0.5 (long tail, like real API latency)
+
+    Raises:
+        ValueError: On an unknown distribution or bad arguments
+    """
+    kind, _, args = spec.strip().partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(values[0]) if values[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, values[1])
+
+    raise ValueError(f"Invalid latency spec: {spec!r}")
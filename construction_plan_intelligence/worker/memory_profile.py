@@ -0,0 +1,275 @@
+"""
+Memory Profile Module
+Per-job memory profiling: peak RSS per pipeline stage, sampled from a
+background thread, and optionally the top tracemalloc allocation sites
+
+Enabled with MEMORY_PROFILE. The job's summary is stored in its analysis
+evidence ("memory") next to the page count and DPI, so container sizes and
+concurrency limits can be set from data.
+
+RSS covers native buffers (PyMuPDF pixmaps, PIL images); tracemalloc only sees
+Python allocations (bytes, base64 strings, JSON) and slows the job down, so it
+has its own switch. RSS is process-wide: jobs running concurrently in one
+process show up in each other's stage peaks.
+"""
+
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from config import (
+    MEMORY_PROFILE,
+    MEMORY_PROFILE_INTERVAL_MS,
+    MEMORY_PROFILE_TRACEMALLOC,
+    MEMORY_PROFILE_TOP,
+)
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Take a new tracemalloc snapshot once traced memory grows this much past the last one
+SNAPSHOT_GROWTH = 1.1
+
+# Allocation sites holding less than this are not reported
+MIN_ALLOCATION_BYTES = 64 * 1024
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def read_rss() -> int:
+    """
+    Resident set size of this process (bytes)
+
+    Current RSS from /proc on Linux; elsewhere the peak so far (ru_maxrss),
+    which can only over-report a stage's peak.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KB on Linux
+
+
+def _mb(num_bytes: float) -> float:
+    return round(num_bytes / MB, 1)
+
+
+class JobMemoryProfile:
+    """
+    Memory profile of one job
+
+    start() begins sampling RSS every interval; stage(name) attributes samples
+    to a pipeline stage (stages may repeat; their peaks are combined); stop()
+    ends sampling and returns the summary. All methods are no-ops when disabled.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = MEMORY_PROFILE,
+        interval_ms: int = MEMORY_PROFILE_INTERVAL_MS,
+        trace: bool = MEMORY_PROFILE_TRACEMALLOC,
+        top: int = MEMORY_PROFILE_TOP
+    ):
+        self.enabled = enabled
+        self.interval_s = max(interval_ms, 1) / 1000
+        self.trace = trace
+        self.top = top
+        self.stages: Dict[str, Dict] = {}
+        self.context: Dict = {}
+        self._open: List[Dict] = []  # Stages being profiled (innermost last)
+        self._start_rss = 0
+        self._peak_rss = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._owns_tracemalloc = False
+
+    def note(self, **values):
+        """Record job context stored with the profile (pages, DPI, sheet size, ...)"""
+        if self.enabled:
+            self.context.update(values)
+
+    def start(self):
+        """Start sampling (and tracemalloc, if enabled and not already tracing)"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._start_rss = self._peak_rss = read_rss()
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-profile", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Optional[Dict]:
+        """
+        Stop sampling
+
+        Returns:
+            summary(), or None when disabled
+        """
+        if not self.enabled:
+            return None
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self._sample()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+        return self.summary()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def _sample(self):
+        rss = read_rss()
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        with self._lock:
+            self._peak_rss = max(self._peak_rss, rss)
+            open_stages = list(self._open)
+            for stage in open_stages:
+                stage["peak_rss"] = max(stage["peak_rss"], rss)
+
+        # Keep a snapshot near each stage's traced peak (snapshots are costly: only on growth)
+        for stage in open_stages:
+            if "snapshot_start" in stage and traced > stage["snapshot_traced"] * SNAPSHOT_GROWTH:
+                stage["snapshot_peak"] = _snapshot()
+                stage["snapshot_traced"] = traced
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Attribute memory used by the enclosed block to stage `name`"""
+        if not self.enabled or self._thread is None:
+            yield
+            return
+
+        rss = read_rss()
+        current = {"name": name, "start_rss": rss, "peak_rss": rss}
+        if tracemalloc.is_tracing():
+            current["snapshot_start"] = _snapshot()
+            current["snapshot_traced"] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        with self._lock:
+            self._open.append(current)
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._sample()
+            with self._lock:
+                self._open.remove(current)
+            self._finish(current, time.perf_counter() - started)
+
+    def _finish(self, current: Dict, seconds: float):
+        end_rss = read_rss()
+        with self._lock:
+            stage = self.stages.setdefault(current["name"], {
+                "calls": 0,
+                "seconds": 0.0,
+                "start_rss": current["start_rss"],
+                "peak_rss": 0,
+                "growth": 0,
+            })
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["end_rss"] = end_rss
+            peak_rss = max(current["peak_rss"], end_rss)
+            stage["peak_rss"] = max(stage["peak_rss"], peak_rss)
+            stage["growth"] = max(stage["growth"], peak_rss - current["start_rss"])
+
+        if "snapshot_start" in current:
+            traced_peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+            stage["traced_peak"] = max(stage.get("traced_peak", 0), traced_peak)
+            peak = current.get("snapshot_peak") or _snapshot()
+            top = _top_allocations(peak, current["snapshot_start"], self.top)
+            if top and (not stage.get("top_allocations") or top[0]["size_mb"] > stage["top_allocations"][0]["size_mb"]):
+                stage["top_allocations"] = top
+
+    def summary(self) -> Optional[Dict]:
+        """
+        Peak memory so far, overall and per stage
+
+        Returns:
+            None when disabled (or never started), else:
+            {
+                "peak_rss_mb", "start_rss_mb", "interval_ms", "tracemalloc",
+                "stages": {name: {"calls", "seconds", "start_rss_mb", "end_rss_mb",
+                                  "peak_rss_mb", "growth_mb",
+                                  # With MEMORY_PROFILE_TRACEMALLOC:
+                                  "traced_peak_mb", "top_allocations": [{"location", "size_mb", "count"}]}},
+                "context": {...}
+            }
+        """
+        if not self.enabled or not self._start_rss:
+            return None
+
+        with self._lock:
+            stages = {}
+            for name, stage in self.stages.items():
+                stages[name] = {
+                    "calls": stage["calls"],
+                    "seconds": round(stage["seconds"], 3),
+                    "start_rss_mb": _mb(stage["start_rss"]),
+                    "end_rss_mb": _mb(stage["end_rss"]),
+                    "peak_rss_mb": _mb(stage["peak_rss"]),
+                    "growth_mb": _mb(stage["growth"]),
+                }
+                if "traced_peak" in stage:
+                    stages[name]["traced_peak_mb"] = _mb(stage["traced_peak"])
+                if "top_allocations" in stage:
+                    stages[name]["top_allocations"] = stage["top_allocations"]
+
+            return {
+                "peak_rss_mb": _mb(self._peak_rss),
+                "start_rss_mb": _mb(self._start_rss),
+                "interval_ms": round(self.interval_s * 1000),
+                "tracemalloc": tracemalloc.is_tracing(),
+                "stages": stages,
+                "context": dict(self.context),
+            }
+
+
+# ============================================================================
+# TRACEMALLOC
+# ============================================================================
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot, baseline: tracemalloc.Snapshot, top: int) -> List[Dict]:
+    """Source lines holding the most memory allocated since baseline"""
+    allocations = []
+    for stat in snapshot.compare_to(baseline, "lineno"):
+        if stat.size_diff < MIN_ALLOCATION_BYTES:
+            continue
+        frame = stat.traceback[0]
+        allocations.append({
+            "location": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+            "size_mb": round(stat.size_diff / MB, 2),
+            "count": stat.count_diff,
+        })
+        if len(allocations) >= top:
+            break
+    return allocations
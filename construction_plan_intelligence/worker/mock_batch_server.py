@@ -0,0 +1,230 @@
+"""
+Mock Batch Server
+Local stand-in for the OpenAI Files + Batch endpoints, for testing batch_extract.py
+without network access or API spend
+
+Usage:
+    python mock_batch_server.py --port 8089 --delay 5
+    OPENAI_BATCH_BASE_URL=http://localhost:8089/v1 python batch_extract.py --status queued
+
+Every chat completion request in a batch is answered with a synthetic,
+internally consistent extraction derived from its custom_id.
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from extraction_backends import request_pages, synthetic_extraction
+
+logger = logging.getLogger(__name__)
+
+
+class MockBatchState:
+    """In-memory files and batches"""
+
+    def __init__(self, delay_seconds: float):
+        self.delay_seconds = delay_seconds
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def add_file(self, content: bytes, purpose: str, filename: str) -> Dict:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def create_batch(self, body: Dict) -> Dict:
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        lines = [
+            line for line in self.files[body["input_file_id"]].decode("utf-8").splitlines()
+            if line.strip()
+        ]
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window"),
+            "status": "in_progress",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "metadata": body.get("metadata"),
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+
+        timer = threading.Timer(self.delay_seconds, self._complete_batch, args=(batch_id, lines))
+        timer.daemon = True
+        timer.start()
+        return batch
+
+    def cancel_batch(self, batch_id: str) -> Optional[Dict]:
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch is not None and batch["status"] == "in_progress":
+                batch["status"] = "cancelled"
+            return dict(batch) if batch is not None else None
+
+    def _complete_batch(self, batch_id: str, lines):
+        output_lines = []
+        for line in lines:
+            request = json.loads(line)
+            custom_id = request["custom_id"]
+            pages, _ = request_pages(request["body"].get("messages") or [])
+            content = json.dumps(synthetic_extraction(custom_id, pages))
+            output_lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": custom_id,
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": {
+                        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                        "object": "chat.completion",
+                        "model": request["body"].get("model"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {
+                            "prompt_tokens": len(line) // 4,
+                            "completion_tokens": len(content) // 4,
+                            "total_tokens": len(line) // 4 + len(content) // 4,
+                        },
+                    },
+                },
+                "error": None,
+            }))
+
+        output = self.add_file("\n".join(output_lines).encode("utf-8"), "batch_output", "output.jsonl")
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] != "in_progress":
+                return
+            batch["status"] = "completed"
+            batch["output_file_id"] = output["id"]
+            batch["request_counts"]["completed"] = len(lines)
+        logger.info(f"Mock batch {batch_id} completed ({len(lines)} requests)")
+
+
+class MockBatchHandler(BaseHTTPRequestHandler):
+    state: MockBatchState = None
+
+    def _send_json(self, payload: Dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        if self.path.rstrip("/") == "/v1/files":
+            raw = self._read_body()
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + raw
+            )
+            fields = {}
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                fields[name] = (part.get_filename(), part.get_payload(decode=True))
+
+            filename, content = fields.get("file", ("input.jsonl", b""))
+            purpose = (fields.get("purpose", (None, b"batch"))[1] or b"batch").decode("utf-8")
+            self._send_json(self.state.add_file(content, purpose, filename or "input.jsonl"))
+
+        elif self.path.rstrip("/") == "/v1/batches":
+            body = json.loads(self._read_body() or b"{}")
+            if body.get("input_file_id") not in self.state.files:
+                self._send_json({"error": {"message": "input file not found"}}, 404)
+                return
+            self._send_json(self.state.create_batch(body))
+
+        elif self.path.startswith("/v1/batches/") and self.path.rstrip("/").endswith("/cancel"):
+            self._read_body()
+            batch = self.state.cancel_batch(self.path.strip("/").split("/")[2])
+            if batch is None:
+                self._send_json({"error": {"message": "batch not found"}}, 404)
+            else:
+                self._send_json(batch)
+
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+
+        if len(parts) == 3 and parts[:2] == ["v1", "batches"]:
+            batch = self.state.batches.get(parts[2])
+            if batch is None:
+                self._send_json({"error": {"message": "batch not found"}}, 404)
+            else:
+                with self.state.lock:
+                    self._send_json(dict(batch))
+
+        elif len(parts) == 4 and parts[:2] == ["v1", "files"] and parts[3] == "content":
+            content = self.state.files.get(parts[2])
+            if content is None:
+                self._send_json({"error": {"message": "file not found"}}, 404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+def serve(port: int = 8089, delay_seconds: float = 5.0) -> ThreadingHTTPServer:
+    """
+    Create the mock batch server (call serve_forever() to run it)
+
+    Args:
+        port: Port to listen on (127.0.0.1)
+        delay_seconds: Time before each batch completes
+
+    Returns:
+        HTTP server instance
+    """
+    MockBatchHandler.state = MockBatchState(delay_seconds)
+    return ThreadingHTTPServer(("127.0.0.1", port), MockBatchHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI batch endpoints")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=5.0, help="Seconds until a batch completes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = serve(args.port, args.delay)
+    logger.info(f"Mock batch server listening on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
@@ -5,70 +5,995 @@ OpenAI Extraction Module
 
 import logging
 import json
-import base64
-from typing import List, Dict, Optional
-from openai import OpenAI
+import asyncio
+import math
+import re
+import time
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+from openai import RateLimitError
+from PIL import Image
 
-from config import OPENAI_API_KEY, OPENAI_MODEL, EXTRACTION_PASS1_PROMPT, EXTRACTION_PASS2_PROMPT
+import extraction_backends
+import extraction_cache
+import rate_limit
+import tracing
+import validate
+from request_payload import ImagePayload
+from validate import COUNT_SECTIONS
+
+from config import (
+    OPENAI_MODEL,
+    EXTRACTION_PASS1_PROMPT,
+    EXTRACTION_PASS2_PROMPT,
+    EXTRACTION_ASYNC,
+    EXTRACTION_CHUNK_MAX_PAGES,
+    EXTRACTION_MAX_CONCURRENCY,
+    EXTRACTION_LOCAL_AUDIT,
+    EXTRACTION_STRUCTURED_OUTPUT,
+    EXTRACTION_STREAM,
+    EXTRACTION_MAX_ATTEMPTS,
+    EXTRACTION_ESCALATION,
+    ESCALATION_CHEAP_MODEL,
+    ESCALATION_LOW_RES_MAX_SIDE,
+    ESCALATION_LOW_RES_DETAIL,
+    ESCALATION_MIN_CONFIDENCE,
+    OPENAI_RATE_LIMIT_RETRIES,
+    EXTRACTION_MAX_TOKENS_PER_JOB,
+    EXTRACTION_MAX_COST_PER_JOB,
+    OPENAI_PRICING,
+    BATCH_PRICE_DISCOUNT,
+    VISION_RESIZE,
+    VISION_OVERVIEW_MAX_SIDE,
+    VISION_OVERVIEW_SHORT_SIDE,
+    VISION_OVERVIEW_DETAIL,
+    VISION_TILE_DETAIL,
+    VISION_TILE_SIZE,
+    VISION_MAX_TILES_PER_PAGE,
+    VISION_TILE_MIN_DENSITY,
+    VISION_TILE_GROUPS,
+)
 
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Merge priority for page groups (most reliable source first)
+GROUP_PRIORITY = ["schedule", "legend", "floor_plan", "other"]
+
+CONFIDENCE_RANK = {"low": 0, "medium": 1, "high": 2}
+
+GROUP_DESCRIPTIONS = {
+    "schedule": "door/window/fixture schedule pages",
+    "legend": "legend/symbol key pages",
+    "floor_plan": "floor plan pages",
+    "other": "construction plan pages",
+}
+
+# Vision settings that change what the model sees (part of the cache key)
+VISION_SETTINGS = {
+    "resize": VISION_RESIZE,
+    "overview": [VISION_OVERVIEW_MAX_SIDE, VISION_OVERVIEW_SHORT_SIDE, VISION_OVERVIEW_DETAIL],
+    "tiles": [VISION_TILE_SIZE, VISION_MAX_TILES_PER_PAGE, VISION_TILE_MIN_DENSITY, VISION_TILE_DETAIL],
+    "tile_groups": VISION_TILE_GROUPS,
+}
+
+# Escalation settings (part of the cache key when escalation is enabled)
+ESCALATION_SETTINGS = {
+    "cheap_model": ESCALATION_CHEAP_MODEL,
+    "low_res": [ESCALATION_LOW_RES_MAX_SIDE, ESCALATION_LOW_RES_DETAIL],
+    "min_confidence": ESCALATION_MIN_CONFIDENCE,
+}
+
+TILE_ID_PATTERN = re.compile(r"\bp(\d+)-t(\d+)\b")
+
+TILE_INSTRUCTIONS = (
+    " Each page is labelled with its page number; use it for evidence page_no."
+    " High-detail tiles are labelled with a tile id (e.g. p3-t2) - when evidence comes"
+    " from a tile, include the tile id in the evidence note."
+)
+
+
+# ============================================================================
+# VISION IMAGE PREPARATION
+# ============================================================================
+
+def spool_path(image_path: str, suffix: str) -> str:
+    """Path for a derived PNG next to the source image (e.g., page_001.overview.png)"""
+    source = Path(image_path)
+    return str(source.with_name(f"{source.stem}.{suffix}.png"))
+
+
+def image_payload_for_file(image_path: str) -> ImagePayload:
+    """
+    Reference an image file for a request without reading it into memory
+    (non-PNG inputs are converted to a PNG copy first)
+    """
+    try:
+        return ImagePayload.from_file(image_path)
+    except ValueError:
+        with Image.open(image_path) as img:
+            return ImagePayload.from_image(img.convert("RGB"), spool_path(image_path, "converted"))
 
 
-def encode_image_to_base64(image_path: str) -> str:
+def resize_for_vision(
+    img: Image.Image,
+    max_side: int = VISION_OVERVIEW_MAX_SIDE,
+    short_side: int = VISION_OVERVIEW_SHORT_SIDE
+) -> Image.Image:
     """
-    Encode image file to base64 string
+    Downscale an image to the resolution the model actually processes
+    (fit within max_side x max_side, then shortest side at most short_side)
 
     Args:
-        image_path: Path to image file
+        img: PIL image
+        max_side: Maximum length of the longest side
+        short_side: Maximum length of the shortest side
 
     Returns:
-        Base64 encoded string
+        Resized image (or the original if already small enough)
     """
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+    width, height = img.size
+    scale = min(1.0, max_side / max(width, height), short_side / min(width, height))
 
+    if scale >= 1.0:
+        return img
 
-def extract_quantities_pass1(
-    image_paths: List[str],
-    page_info: Optional[Dict] = None
-) -> Dict:
+    new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return img.resize(new_size, Image.LANCZOS)
+
+
+def find_detail_regions(
+    img: Image.Image,
+    tile_size: int = VISION_TILE_SIZE,
+    max_tiles: int = VISION_MAX_TILES_PER_PAGE,
+    min_density: float = VISION_TILE_MIN_DENSITY
+) -> List[Tuple[int, int, int, int]]:
     """
-    Pass 1: Extract quantities from construction plan images
+    Find the densest tile-sized regions of a page (schedule tables, busy plan areas)
+
+    Ink density is the fraction of dark coverage per grid cell, computed on a
+    box-downsampled grayscale copy so the full-resolution page is scanned once.
 
     Args:
-        image_paths: List of paths to rendered page images
-        page_info: Optional dict with page categorization info
+        img: Full-resolution page image
+        tile_size: Tile edge in pixels
+        max_tiles: Maximum number of regions to return
+        min_density: Minimum ink density (0-1) for a region to qualify
 
     Returns:
-        Extracted quantities as JSON dict
+        List of (x0, y0, x1, y1) boxes in page pixels, in reading order
     """
-    logger.info(f"Pass 1: Extracting quantities from {len(image_paths)} images")
+    if max_tiles <= 0:
+        return []
 
-    # Prepare image content for OpenAI
+    width, height = img.size
+    cols = max(1, math.ceil(width / tile_size))
+    rows = max(1, math.ceil(height / tile_size))
+
+    # A page that already fits in one tile gains nothing from tiling
+    if cols * rows == 1:
+        return []
+
+    grid = img.convert("L").resize((cols, rows), Image.BOX)
+    cells = []
+    for row in range(rows):
+        for col in range(cols):
+            density = 1.0 - grid.getpixel((col, row)) / 255.0
+            if density >= min_density:
+                cells.append((density, row, col))
+
+    densest = sorted(cells, key=lambda cell: (-cell[0], cell[1], cell[2]))[:max_tiles]
+
+    regions = []
+    for _, row, col in sorted(densest, key=lambda cell: (cell[1], cell[2])):
+        x0, y0 = col * tile_size, row * tile_size
+        regions.append((x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height)))
+
+    return regions
+
+
+def build_image_content(
+    pages: List[Tuple[int, str]],
+    page_groups_map: Optional[Dict[int, str]] = None,
+    tiles_out: Optional[List[Dict]] = None,
+    low_res: bool = False,
+    page_texts: Optional[Dict[int, str]] = None
+) -> List[Dict]:
+    """
+    Build OpenAI content parts for a list of page images
+
+    Image parts reference PNG files (ImagePayload) rather than embedding data
+    URLs; they are base64-encoded while the request body is streamed.
+
+    Each page is sent as a labelled overview resized to the model's native
+    resolution, followed by high-detail tiles of its densest regions when the
+    page's group is in VISION_TILE_GROUPS. In low-resolution mode (the cheap
+    first pass of escalation) only a small overview is sent, without tiles.
+    Pages with a text layer in page_texts are sent as layout text instead.
+
+    Args:
+        pages: List of (page_number, image_path)
+        page_groups_map: Optional dict mapping page_number -> group name
+        tiles_out: Optional list extended in place with the tiles sent
+            ({"tile_id", "page_no", "region"}), for mapping evidence back
+        low_res: Send ESCALATION_LOW_RES_MAX_SIDE overviews only
+        page_texts: Optional dict mapping page_number -> layout text
+            (pdf_to_images.extract_layout_text)
+
+    Returns:
+        List of text/image_url content parts
+    """
+    page_groups_map = page_groups_map or {}
+    page_texts = page_texts or {}
     image_content = []
-    for idx, image_path in enumerate(image_paths):
-        base64_image = encode_image_to_base64(image_path)
-        image_content.append({
-            "type": "image_url",
-            "image_url": {
-                "url": f"data:image/png;base64,{base64_image}"
-            }
-        })
-        logger.info(f"Encoded image {idx + 1}/{len(image_paths)}")
 
-    # Build context message
+    for idx, (page_no, image_path) in enumerate(pages):
+        if page_no in page_texts:
+            image_content.append({
+                "type": "text",
+                "text": f"Page {page_no} text layer (rows top to bottom, ' | ' separates columns):\n"
+                        f"{page_texts[page_no]}"
+            })
+            logger.info(f"Page {idx + 1}/{len(pages)}: sent text layer ({len(page_texts[page_no])} chars)")
+            continue
+
+        if not VISION_RESIZE and not low_res:
+            image_content.append({"type": "text", "text": f"Page {page_no}:"})
+            image_content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": image_payload_for_file(image_path),
+                    "detail": VISION_OVERVIEW_DETAIL
+                }
+            })
+            logger.info(f"Encoded image {idx + 1}/{len(pages)}")
+            continue
+
+        with Image.open(image_path) as img:
+            img = img.convert("RGB")
+
+            if low_res:
+                overview = resize_for_vision(img, max_side=ESCALATION_LOW_RES_MAX_SIDE)
+            else:
+                overview = resize_for_vision(img)
+            image_content.append({"type": "text", "text": f"Page {page_no} overview:"})
+            image_content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": ImagePayload.from_image(
+                        overview, spool_path(image_path, "lowres" if low_res else "overview")
+                    ),
+                    "detail": ESCALATION_LOW_RES_DETAIL if low_res else VISION_OVERVIEW_DETAIL
+                }
+            })
+
+            regions = []
+            if not low_res and page_groups_map.get(page_no, "other") in VISION_TILE_GROUPS:
+                regions = find_detail_regions(img)
+
+            for tile_no, region in enumerate(regions, start=1):
+                tile_id = f"p{page_no}-t{tile_no}"
+                tile = resize_for_vision(img.crop(region))
+                image_content.append({
+                    "type": "text",
+                    "text": f"Tile {tile_id}: page {page_no}, region x0={region[0]} y0={region[1]} "
+                            f"x1={region[2]} y1={region[3]} (page pixels):"
+                })
+                image_content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": ImagePayload.from_image(tile, spool_path(image_path, tile_id)),
+                        "detail": VISION_TILE_DETAIL
+                    }
+                })
+                if tiles_out is not None:
+                    tiles_out.append({"tile_id": tile_id, "page_no": page_no, "region": list(region)})
+
+        logger.info(f"Encoded image {idx + 1}/{len(pages)} (overview + {len(regions)} tiles)")
+
+    return image_content
+
+
+def map_tile_evidence(result: Dict, tiles: List[Dict]) -> Dict:
+    """
+    Attach tile regions to evidence entries that cite a tile id (e.g., "p3-t2")
+
+    Args:
+        result: Extraction JSON dict (modified in place)
+        tiles: Tiles sent with the request (from build_image_content)
+
+    Returns:
+        The same result dict
+    """
+    if not tiles:
+        return result
+
+    tiles_by_id = {tile["tile_id"]: tile for tile in tiles}
+
+    for section in COUNT_SECTIONS:
+        section_data = result.get(section)
+        if not isinstance(section_data, dict):
+            continue
+
+        for evidence in section_data.get("evidence") or []:
+            if not isinstance(evidence, dict):
+                continue
+            match = TILE_ID_PATTERN.search(str(evidence.get("note", "")))
+            tile = tiles_by_id.get(match.group(0)) if match else None
+            if tile:
+                evidence["page_no"] = tile["page_no"]
+                evidence["region"] = tile["region"]
+
+    return result
+
+
+def build_context_message(page_info: Optional[Dict] = None, focus_sections: Optional[List[str]] = None) -> str:
+    """
+    Build the user context message that accompanies the page images
+
+    Args:
+        page_info: Optional dict with page categorization info
+        focus_sections: Optional sections to concentrate on (escalation re-runs)
+
+    Returns:
+        Context message text
+    """
     context_msg = "Analyze these construction plan pages and extract quantities."
     if page_info:
         if page_info.get("has_schedules"):
             context_msg += " IMPORTANT: Door/window schedules are present - use them for accurate counts."
         if page_info.get("has_legend"):
             context_msg += " A legend/symbol key is provided - use it to interpret symbols."
+    if focus_sections:
+        context_msg += (
+            f" Focus on these sections: {', '.join(focus_sections)}."
+            " Other sections may be returned with zero counts and low confidence."
+        )
+
+    return context_msg + TILE_INSTRUCTIONS
+
+
+def parse_json_response(result_text: str) -> Dict:
+    """
+    Parse a JSON object from a model response
+
+    Args:
+        result_text: Raw response text
+
+    Returns:
+        Parsed JSON dict
+
+    Raises:
+        json.JSONDecodeError: If the text is not valid JSON
+    """
+    result_text = result_text.strip()
+
+    # Without structured outputs GPT might wrap JSON in markdown code blocks
+    if not EXTRACTION_STRUCTURED_OUTPUT:
+        if result_text[:7].lower() == "```json":
+            result_text = result_text[7:]  # Remove ```json (any case)
+        if result_text.startswith("```"):
+            result_text = result_text[3:]  # Remove ```
+        if result_text.endswith("```"):
+            result_text = result_text[:-3]  # Remove trailing ```
+        result_text = result_text.strip()
+
+    return json.loads(result_text)
+
+
+def record_usage(stats: Optional[Dict], usage) -> None:
+    """
+    Accumulate OpenAI token usage into a stats dict
+
+    Args:
+        stats: Dict to update in place (ignored if None)
+        usage: `response.usage` object (or dict) from the OpenAI client
+    """
+    if stats is None or usage is None:
+        return
+
+    for key in ["prompt_tokens", "completion_tokens", "total_tokens"]:
+        value = usage.get(key, 0) if isinstance(usage, dict) else getattr(usage, key, 0)
+        stats[key] = stats.get(key, 0) + (value or 0)
+
+
+# ============================================================================
+# USAGE ACCOUNTING
+# ============================================================================
+
+def measure_messages(messages: List[Dict]) -> Tuple[int, int]:
+    """
+    Count images and approximate request payload size of chat messages
+
+    Args:
+        messages: Chat messages
+
+    Returns:
+        (image_count, payload_bytes) - bytes of text and image data URLs
+    """
+    image_count = 0
+    payload_bytes = 0
+
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            payload_bytes += len(content.encode("utf-8"))
+            continue
+        for part in content or []:
+            if part.get("type") == "image_url":
+                image_count += 1
+                url = part["image_url"]["url"]
+                payload_bytes += url.url_length if isinstance(url, ImagePayload) else len(url)
+            elif part.get("type") == "text":
+                payload_bytes += len(part["text"].encode("utf-8"))
+
+    return image_count, payload_bytes
+
+
+def record_request(stats: Optional[Dict], messages: List[Dict], usage, elapsed: float) -> Dict:
+    """
+    Accumulate one API call (tokens, images, payload size, latency) into a stats dict
+
+    Args:
+        stats: Dict to update in place (ignored if None)
+        messages: Chat messages sent
+        usage: `response.usage` object (or dict), may be None
+        elapsed: Request wall time in seconds
+
+    Returns:
+        Stats for this call alone
+    """
+    image_count, payload_bytes = measure_messages(messages)
+    call_stats: Dict = {
+        "calls": 1,
+        "image_count": image_count,
+        "payload_bytes": payload_bytes,
+        "request_time_s": elapsed,
+    }
+    record_usage(call_stats, usage)
+
+    if stats is not None:
+        for key, value in call_stats.items():
+            stats[key] = stats.get(key, 0) + value
+
+    return call_stats
+
+
+def trace_call(span, call_stats: Dict, result: Dict) -> None:
+    """Add one API call's usage (record_request output) to its trace span"""
+    span.set(
+        prompt_tokens=call_stats.get("prompt_tokens"),
+        completion_tokens=call_stats.get("completion_tokens"),
+        images=call_stats["image_count"],
+        payload_bytes=call_stats["payload_bytes"],
+        finish_reason=result.get("finish_reason"),
+    )
+
+
+def record_failures(stats: Optional[Dict], count: int = 1) -> None:
+    """Count calls whose result was replaced by a fallback (failed chunk, Pass 2 error)"""
+    if stats is not None:
+        stats["failed_calls"] = stats.get("failed_calls", 0) + count
+
+
+def estimate_cost(stats: Dict, model: str = OPENAI_MODEL, batch: bool = False) -> Optional[float]:
+    """
+    Estimate USD cost of token usage
+
+    Args:
+        stats: Dict with prompt_tokens / completion_tokens
+        model: Model name (looked up in OPENAI_PRICING, dated snapshots included)
+        batch: Apply the Batch API discount
+
+    Returns:
+        Cost in USD, or None if the model has no known pricing
+    """
+    pricing = OPENAI_PRICING.get(model)
+    if pricing is None:
+        # Dated snapshots (e.g., gpt-4o-2024-08-06) use the base model's price
+        matches = [name for name in OPENAI_PRICING if model.startswith(f"{name}-")]
+        if not matches:
+            return None
+        pricing = OPENAI_PRICING[max(matches, key=len)]
+
+    input_price, output_price = pricing
+    cost = (
+        stats.get("prompt_tokens", 0) * input_price
+        + stats.get("completion_tokens", 0) * output_price
+    ) / 1_000_000
+
+    if batch:
+        cost *= BATCH_PRICE_DISCOUNT
+    return round(cost, 6)
+
+
+def summarize_pass(
+    stats: Dict,
+    wall_time: Optional[float] = None,
+    skipped: Optional[str] = None,
+    model: str = OPENAI_MODEL,
+    batch: bool = False
+) -> Dict:
+    """
+    Build the stored metrics record for one extraction pass
+
+    Args:
+        stats: Accumulated call stats (see record_request)
+        wall_time: Pass wall time in seconds (concurrent chunks overlap, so this
+            can be less than the summed request time)
+        skipped: Reason the pass did not run (local_audit|budget|cache|confident)
+        model: Model name
+        batch: Whether the pass ran through the Batch API
+
+    Returns:
+        Metrics dict
+    """
+    return {
+        "model": model,
+        "calls": stats.get("calls", 0),
+        "prompt_tokens": stats.get("prompt_tokens", 0),
+        "completion_tokens": stats.get("completion_tokens", 0),
+        "total_tokens": stats.get("total_tokens", 0),
+        "image_count": stats.get("image_count", 0),
+        "payload_bytes": stats.get("payload_bytes", 0),
+        "wall_time_s": round(wall_time if wall_time is not None else stats.get("request_time_s", 0), 3),
+        "cost_usd": estimate_cost(stats, model, batch),
+        "skipped": skipped,
+        "batch": batch,
+    }
+
+
+def summarize_job(passes: Dict[str, Dict], cache_hit: bool = False, budget_exceeded: bool = False) -> Dict:
+    """
+    Combine per-pass metrics into the job metrics stored with the analysis
+
+    Args:
+        passes: Dict mapping pass name -> summarize_pass() output
+        cache_hit: Whether the result came from the extraction cache
+        budget_exceeded: Whether the per-job budget stopped a pass
+
+    Returns:
+        Metrics dict: {"passes": ..., "totals": ..., "cache_hit": ..., "budget_exceeded": ...}
+    """
+    totals: Dict = {}
+    for key in ["calls", "prompt_tokens", "completion_tokens", "total_tokens",
+                "image_count", "payload_bytes", "wall_time_s"]:
+        totals[key] = sum(p.get(key, 0) for p in passes.values())
+    totals["wall_time_s"] = round(totals["wall_time_s"], 3)
+
+    costs = [p.get("cost_usd") for p in passes.values()]
+    totals["cost_usd"] = None if None in costs else round(sum(costs), 6)
+
+    return {
+        "passes": passes,
+        "totals": totals,
+        "cache_hit": cache_hit,
+        "budget_exceeded": budget_exceeded,
+    }
+
+
+def pass2_exceeds_budget(
+    pass1_stats: Dict,
+    pass1_result: Dict,
+    spent_cost: Optional[float] = None
+) -> bool:
+    """
+    Check whether running Pass 2 could exceed the per-job token or cost budget
+
+    Pass 2 is estimated as the Pass 1 JSON plus prompt (~4 chars per token)
+    in, and its max_tokens out.
+
+    Args:
+        pass1_stats: Call stats of everything run so far
+        pass1_result: Pass 1 JSON (sent to the audit)
+        spent_cost: Cost so far in USD, when it was not all spent on OPENAI_MODEL
+            (default: pass1_stats priced at OPENAI_MODEL)
+
+    Returns:
+        True if Pass 2 should be skipped
+    """
+    if EXTRACTION_MAX_TOKENS_PER_JOB <= 0 and EXTRACTION_MAX_COST_PER_JOB <= 0:
+        return False
+
+    pass2_estimate = {
+        "prompt_tokens": (len(EXTRACTION_PASS2_PROMPT) + len(json.dumps(pass1_result, indent=2))) // 4,
+        "completion_tokens": completion_params(stream=False)["max_tokens"],
+    }
+    projected = {
+        key: pass1_stats.get(key, 0) + pass2_estimate[key]
+        for key in ["prompt_tokens", "completion_tokens"]
+    }
+
+    if EXTRACTION_MAX_TOKENS_PER_JOB > 0 and sum(projected.values()) > EXTRACTION_MAX_TOKENS_PER_JOB:
+        return True
+
+    if EXTRACTION_MAX_COST_PER_JOB > 0:
+        if spent_cost is None:
+            projected_cost = estimate_cost(projected)
+        else:
+            pass2_cost = estimate_cost(pass2_estimate)
+            projected_cost = None if pass2_cost is None else spent_cost + pass2_cost
+        if projected_cost is not None and projected_cost > EXTRACTION_MAX_COST_PER_JOB:
+            return True
+
+    return False
+
+
+# ============================================================================
+# STRUCTURED OUTPUT + STREAMING
+# ============================================================================
+
+class MalformedOutputError(ValueError):
+    """Raised as soon as a streamed response can no longer be valid JSON"""
+
+
+class IncrementalJsonChecker:
+    """
+    Structural JSON checker fed one streamed delta at a time
+
+    Tracks string/escape state and the bracket stack, so a response that does
+    not start with an object, closes the wrong bracket, contains non-JSON
+    characters, or keeps going after the top-level object is rejected
+    immediately instead of after the full completion.
+    """
+
+    VALUE_CHARS = set("0123456789+-.eEtrufalsn")
+    STRUCTURE_CHARS = set(",:")
+    WHITESPACE = set(" \t\r\n")
+    CLOSERS = {"}": "{", "]": "["}
+
+    def __init__(self, allow_fences: bool = not EXTRACTION_STRUCTURED_OUTPUT):
+        self.allow_fences = allow_fences
+        self.stack: List[str] = []
+        self.started = False
+        self.finished = False
+        self.in_string = False
+        self.escape = False
+        self.prefix = ""  # Leading text before the first "{" (fence tolerance)
+        self.position = 0
+
+    def feed(self, text: str) -> None:
+        """
+        Check the next chunk of streamed text
+
+        Raises:
+            MalformedOutputError: If the text can no longer form a valid JSON object
+        """
+        for char in text:
+            self.position += 1
+            self._feed_char(char)
+
+    def _fail(self, reason: str):
+        raise MalformedOutputError(f"Malformed JSON at character {self.position}: {reason}")
+
+    def _feed_char(self, char: str) -> None:
+        if self.finished:
+            if char in self.WHITESPACE or (self.allow_fences and char == "`"):
+                return
+            self._fail(f"unexpected {char!r} after the JSON object")
+
+        if not self.started:
+            if char == "{":
+                self.started = True
+                self.stack.append("{")
+            elif char in self.WHITESPACE:
+                return
+            elif self.allow_fences and "```json".startswith((self.prefix + char).lower()):
+                self.prefix += char
+            else:
+                self._fail(f"response does not start with a JSON object ({char!r})")
+            return
+
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif char == "\\":
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+            elif char == "\n":
+                self._fail("unescaped newline in string")
+            return
+
+        if char == '"':
+            self.in_string = True
+        elif char in "{[":
+            self.stack.append(char)
+        elif char in self.CLOSERS:
+            if not self.stack or self.stack[-1] != self.CLOSERS[char]:
+                self._fail(f"mismatched {char!r}")
+            self.stack.pop()
+            if not self.stack:
+                self.finished = True
+        elif not (char in self.WHITESPACE or char in self.STRUCTURE_CHARS or char in self.VALUE_CHARS):
+            self._fail(f"unexpected {char!r}")
+
+    def check_complete(self) -> None:
+        """
+        Raises:
+            MalformedOutputError: If the stream ended before the JSON object was closed
+        """
+        if not self.finished:
+            self._fail("response ended before the JSON object was closed")
+
+
+def completion_params(
+    max_tokens: int = 4000,
+    stream: bool = EXTRACTION_STREAM,
+    model: str = OPENAI_MODEL
+) -> Dict:
+    """
+    Common chat completion parameters for extraction calls
+
+    Args:
+        max_tokens: Completion token limit
+        stream: Whether to request a streamed response
+        model: Model name
+
+    Returns:
+        Keyword arguments for chat.completions.create (without messages)
+    """
+    params = {
+        "model": model,
+        "max_tokens": max_tokens,  # Increased for larger JSON responses
+        "temperature": 0.1,  # Low temperature for consistency
+    }
+
+    if EXTRACTION_STRUCTURED_OUTPUT:
+        params["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "plan_extraction",
+                "strict": True,
+                "schema": validate.extraction_json_schema(),
+            },
+        }
+
+    if stream:
+        params["stream"] = True
+        # Ask for a final usage chunk (not a named parameter in the pinned SDK)
+        params["extra_body"] = {"stream_options": {"include_usage": True}}
+
+    return params
+
+
+def _completion_text(result: Dict, checker: IncrementalJsonChecker) -> str:
+    """Check a finished backend result and return its text"""
+    if result.get("finish_reason") == "length":
+        raise MalformedOutputError("Response truncated at max_tokens")
+    if not result["text"].strip():
+        raise MalformedOutputError("Empty response from extraction backend")
+    checker.check_complete()
+    return result["text"]
+
+
+def _usage_total(usage) -> Optional[int]:
+    if usage is None:
+        return None
+    return usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+
+
+def _complete_within_limits(
+    backend: extraction_backends.ExtractionBackend,
+    messages: List[Dict],
+    params: Dict,
+    label: str,
+    on_delta
+) -> Dict:
+    """
+    Send one request through the backend, waiting for shared rate limit capacity
+    first. When the API returns 429, wait for its retry-after (pausing all
+    workers when a limiter is configured) and retry.
+    """
+    limiter = rate_limit.get_limiter(params["model"])
+    estimated = rate_limit.estimate_request_tokens(messages, params)
+
+    for retry in range(OPENAI_RATE_LIMIT_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire(estimated, label)
+        try:
+            result = backend.complete(messages, params, on_delta=on_delta)
+        except RateLimitError as e:
+            if retry >= OPENAI_RATE_LIMIT_RETRIES:
+                raise
+            delay = rate_limit.retry_after_seconds(e, retry + 1)
+            if limiter is not None:
+                limiter.pause(delay)  # acquire() waits it out
+            else:
+                logger.warning(f"{label}: rate limited, retrying in {delay:.1f}s")
+                time.sleep(delay)
+            continue
+
+        if limiter is not None:
+            limiter.reconcile(estimated, _usage_total(result["usage"]))
+        return result
+
+
+async def _complete_within_limits_async(
+    session,
+    messages: List[Dict],
+    params: Dict,
+    label: str,
+    on_delta
+) -> Dict:
+    """Async variant of _complete_within_limits() (limiter file locks are taken off the event loop)"""
+    limiter = rate_limit.get_limiter(params["model"])
+    estimated = rate_limit.estimate_request_tokens(messages, params)
+
+    for retry in range(OPENAI_RATE_LIMIT_RETRIES + 1):
+        if limiter is not None:
+            await limiter.acquire_async(estimated, label)
+        try:
+            result = await session.complete_async(messages, params, on_delta=on_delta)
+        except RateLimitError as e:
+            if retry >= OPENAI_RATE_LIMIT_RETRIES:
+                raise
+            delay = rate_limit.retry_after_seconds(e, retry + 1)
+            if limiter is not None:
+                await asyncio.to_thread(limiter.pause, delay)
+            else:
+                logger.warning(f"{label}: rate limited, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            continue
+
+        if limiter is not None:
+            await asyncio.to_thread(limiter.reconcile, estimated, _usage_total(result["usage"]))
+        return result
+
+
+def create_json_completion(
+    messages: List[Dict],
+    label: str,
+    stats: Optional[Dict] = None,
+    max_attempts: int = EXTRACTION_MAX_ATTEMPTS,
+    backend: Optional[extraction_backends.ExtractionBackend] = None,
+    model: str = OPENAI_MODEL
+) -> Dict:
+    """
+    Send a chat completion through the extraction backend and parse a JSON
+    object from the response, retrying immediately when the output is malformed
+
+    Args:
+        messages: Chat messages
+        label: Call label for logs (e.g., "Pass 1")
+        stats: Optional dict updated in place with call stats (see record_request)
+        max_attempts: Attempts before giving up on malformed output
+        backend: Optional backend (default: extraction_backends.get_backend())
+        model: Model name
+
+    Returns:
+        Parsed JSON dict
+
+    Raises:
+        ValueError: If every attempt returned malformed JSON
+    """
+    backend = backend or extraction_backends.get_backend()
+    last_error: Optional[Exception] = None
+
+    for attempt in range(1, max(1, max_attempts) + 1):
+        result_text = ""
+        checker = IncrementalJsonChecker()
+        try:
+            with tracing.span(
+                "model_call", kind="client", label=label, model=model, backend=backend.name, attempt=attempt
+            ) as span:
+                started = time.perf_counter()
+                result = _complete_within_limits(
+                    backend, messages, completion_params(model=model), label, checker.feed
+                )
+
+                call_stats = record_request(stats, messages, result["usage"], time.perf_counter() - started)
+                trace_call(span, call_stats, result)
+                logger.info(
+                    f"{label} completed in {call_stats['request_time_s']:.1f}s. "
+                    f"Tokens used: {call_stats.get('total_tokens', 0)}"
+                )
+
+                result_text = result["text"]
+                return parse_json_response(_completion_text(result, checker))
+
+        except (MalformedOutputError, json.JSONDecodeError) as e:
+            last_error = e
+            logger.warning(f"{label}: malformed JSON on attempt {attempt}/{max_attempts}: {e}")
+            if result_text:
+                logger.warning(f"Response text (first 500 chars): {result_text[:500]}")
+
+    raise ValueError(f"Invalid JSON from {label}: {last_error}")
+
 
-    # Create messages
-    messages = [
+async def create_json_completion_async(
+    session,
+    messages: List[Dict],
+    label: str,
+    stats: Optional[Dict] = None,
+    max_attempts: int = EXTRACTION_MAX_ATTEMPTS,
+    model: str = OPENAI_MODEL
+) -> Dict:
+    """
+    Async variant of create_json_completion()
+
+    Args:
+        session: Async backend session (from ExtractionBackend.async_session())
+        messages: Chat messages
+        label: Call label for logs
+        stats: Optional dict updated in place with call stats
+        max_attempts: Attempts before giving up on malformed output
+        model: Model name
+
+    Returns:
+        Parsed JSON dict
+
+    Raises:
+        ValueError: If every attempt returned malformed JSON
+    """
+    last_error: Optional[Exception] = None
+
+    for attempt in range(1, max(1, max_attempts) + 1):
+        checker = IncrementalJsonChecker()
+        try:
+            with tracing.span("model_call", kind="client", label=label, model=model, attempt=attempt) as span:
+                started = time.perf_counter()
+                result = await _complete_within_limits_async(
+                    session, messages, completion_params(model=model), label, checker.feed
+                )
+
+                call_stats = record_request(stats, messages, result["usage"], time.perf_counter() - started)
+                trace_call(span, call_stats, result)
+                logger.info(
+                    f"{label} completed in {call_stats['request_time_s']:.1f}s. "
+                    f"Tokens used: {call_stats.get('total_tokens', 0)}"
+                )
+
+                return parse_json_response(_completion_text(result, checker))
+
+        except (MalformedOutputError, json.JSONDecodeError) as e:
+            last_error = e
+            logger.warning(f"{label}: malformed JSON on attempt {attempt}/{max_attempts}: {e}")
+
+    raise ValueError(f"Invalid JSON from {label}: {last_error}")
+
+
+def build_pass1_messages(
+    image_paths: List[str],
+    page_info: Optional[Dict] = None,
+    page_numbers: Optional[List[int]] = None,
+    page_groups_map: Optional[Dict[int, str]] = None,
+    tiles_out: Optional[List[Dict]] = None,
+    low_res: bool = False,
+    focus_sections: Optional[List[str]] = None,
+    page_texts: Optional[Dict[int, str]] = None,
+    context_note: Optional[str] = None
+) -> List[Dict]:
+    """
+    Build the Pass 1 chat messages (system prompt, context, page images)
+
+    Args:
+        image_paths: List of paths to rendered page images
+        page_info: Optional dict with page categorization info
+        page_numbers: Optional page number of each image (defaults to 0..n-1)
+        page_groups_map: Optional dict mapping page_number -> group name (controls tiling)
+        tiles_out: Optional list extended in place with the tiles sent
+        low_res: Send low-resolution overviews only (see build_image_content)
+        focus_sections: Optional sections to concentrate on
+        page_texts: Optional dict mapping page_number -> layout text (sent instead of images)
+        context_note: Optional text appended to the context message (e.g., a chunk's pages)
+
+    Returns:
+        Chat messages
+    """
+    # Prepare image content for OpenAI
+    if page_numbers is None:
+        page_numbers = list(range(len(image_paths)))
+    image_content = build_image_content(
+        list(zip(page_numbers, image_paths)), page_groups_map, tiles_out=tiles_out,
+        low_res=low_res, page_texts=page_texts
+    )
+
+    # Build context message
+    context_msg = build_context_message(page_info, focus_sections)
+    if context_note:
+        context_msg += context_note
+
+    return [
         {
             "role": "system",
             "content": EXTRACTION_PASS1_PROMPT
@@ -82,52 +1007,520 @@ def extract_quantities_pass1(
         }
     ]
 
+
+def build_pass2_messages(pass1_result: Dict, violations: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Build the Pass 2 (audit) chat messages
+
+    Args:
+        pass1_result: JSON output from Pass 1
+        violations: Optional local consistency violations for the model to fix
+
+    Returns:
+        Chat messages
+    """
+    # Convert pass1 result to string for the audit prompt
+    pass1_json_str = json.dumps(pass1_result, indent=2)
+
+    user_content = f"Review this extraction for errors:\n\n{pass1_json_str}"
+    if violations:
+        issues = "\n".join(f"- [{v['section']}] {v['message']}" for v in violations)
+        user_content += f"\n\nAutomated consistency checks found these issues:\n{issues}"
+
+    return [
+        {
+            "role": "system",
+            "content": EXTRACTION_PASS2_PROMPT
+        },
+        {
+            "role": "user",
+            "content": user_content
+        }
+    ]
+
+
+def extract_quantities_pass1(
+    image_paths: List[str],
+    page_info: Optional[Dict] = None,
+    stats: Optional[Dict] = None,
+    page_numbers: Optional[List[int]] = None,
+    page_groups_map: Optional[Dict[int, str]] = None,
+    model: str = OPENAI_MODEL,
+    low_res: bool = False,
+    focus_sections: Optional[List[str]] = None,
+    label: str = "Pass 1",
+    page_texts: Optional[Dict[int, str]] = None
+) -> Dict:
+    """
+    Pass 1: Extract quantities from construction plan images
+
+    Args:
+        image_paths: List of paths to rendered page images
+        page_info: Optional dict with page categorization info
+        stats: Optional dict updated in place with call stats
+        page_numbers: Optional page number of each image (defaults to 0..n-1)
+        page_groups_map: Optional dict mapping page_number -> group name (controls tiling)
+        model: Model name
+        low_res: Send low-resolution overviews only (see build_image_content)
+        focus_sections: Optional sections to concentrate on
+        label: Call label for logs
+        page_texts: Optional dict mapping page_number -> layout text (sent instead of images)
+
+    Returns:
+        Extracted quantities as JSON dict
+    """
+    logger.info(f"{label}: Extracting quantities from {len(image_paths)} images with {model}")
+
+    tiles: List[Dict] = []
+    messages = build_pass1_messages(
+        image_paths, page_info, page_numbers, page_groups_map, tiles_out=tiles,
+        low_res=low_res, focus_sections=focus_sections, page_texts=page_texts
+    )
+
     # Call OpenAI
     try:
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=messages,
-            max_tokens=4000,  # Increased for larger JSON responses
-            temperature=0.1,  # Low temperature for consistency
+        result_json = create_json_completion(messages, label, stats, model=model)
+        return map_tile_evidence(result_json, tiles)
+
+    except Exception as e:
+        logger.error(f"OpenAI API error in {label}: {e}")
+        raise
+
+
+# ============================================================================
+# ASYNC CHUNKED EXTRACTION
+# ============================================================================
+
+def chunk_page_groups(
+    page_groups: Dict[str, List[Tuple[int, str]]],
+    max_pages: int = EXTRACTION_CHUNK_MAX_PAGES
+) -> List[Tuple[str, List[Tuple[int, str]]]]:
+    """
+    Split page groups into request-sized chunks
+
+    Args:
+        page_groups: Dict mapping group name -> list of (page_number, image_path)
+        max_pages: Maximum pages per request
+
+    Returns:
+        List of (group_name, pages) chunks in group priority order
+    """
+    max_pages = max(1, max_pages)
+    chunks = []
+
+    for group in sorted(page_groups, key=_group_sort_key):
+        pages = page_groups[group]
+        for start in range(0, len(pages), max_pages):
+            chunks.append((group, pages[start:start + max_pages]))
+
+    return chunks
+
+
+async def _extract_chunk_async(
+    session,
+    semaphore: asyncio.Semaphore,
+    group: str,
+    pages: List[Tuple[int, str]],
+    page_info: Optional[Dict] = None,
+    stats: Optional[Dict] = None,
+    model: str = OPENAI_MODEL,
+    low_res: bool = False,
+    focus_sections: Optional[List[str]] = None,
+    label: str = "Pass 1",
+    page_texts: Optional[Dict[int, str]] = None
+) -> Dict:
+    """
+    Run Pass 1 on a single chunk of pages
+
+    Args:
+        session: Shared async backend session
+        semaphore: Concurrency limiter
+        group: Page group name (schedule|legend|floor_plan|other)
+        pages: List of (page_number, image_path) in this chunk
+        page_info: Optional dict with page categorization info
+        stats: Optional dict updated in place with call stats
+        model: Model name
+        low_res: Send low-resolution overviews only
+        focus_sections: Optional sections to concentrate on
+        label: Call label for logs
+        page_texts: Optional dict mapping page_number -> layout text
+
+    Returns:
+        Partial extraction JSON dict
+    """
+    page_numbers = [page_no for page_no, _ in pages]
+    context_note = (
+        f" These are {GROUP_DESCRIPTIONS.get(group, group)}"
+        f" (page numbers {', '.join(str(p) for p in page_numbers)}, in order)."
+        " Only count items visible on these pages."
+    )
+
+    async with semaphore:
+        # Encode inside the semaphore so only in-flight chunks hold image payloads;
+        # resizing/tiling is CPU-bound, so keep it off the event loop
+        tiles: List[Dict] = []
+        messages = await asyncio.to_thread(
+            build_pass1_messages,
+            [image_path for _, image_path in pages],
+            page_info,
+            page_numbers,
+            {page_no: group for page_no in page_numbers},
+            tiles_out=tiles,
+            low_res=low_res,
+            focus_sections=focus_sections,
+            page_texts=page_texts,
+            context_note=context_note
         )
 
-        result_text = response.choices[0].message.content
-        logger.info(f"Pass 1 completed. Tokens used: {response.usage.total_tokens}")
+        result_json = await create_json_completion_async(
+            session, messages, f"{label} chunk ({group}, pages {page_numbers})", stats, model=model
+        )
 
-        # Check if response is empty
-        if not result_text or result_text.strip() == "":
-            logger.error("OpenAI returned empty response!")
-            logger.error(f"Response object: {response}")
-            raise ValueError("Empty response from OpenAI")
+    return map_tile_evidence(result_json, tiles)
 
-        # Parse JSON from response
-        # GPT might wrap JSON in markdown code blocks, so clean it
-        result_text = result_text.strip()
-        if result_text.startswith("```json"):
-            result_text = result_text[7:]  # Remove ```json
-        if result_text.startswith("```"):
-            result_text = result_text[3:]  # Remove ```
-        if result_text.endswith("```"):
-            result_text = result_text[:-3]  # Remove trailing ```
-        result_text = result_text.strip()
 
-        result_json = json.loads(result_text)
-        return result_json
+async def extract_quantities_pass1_async(
+    page_groups: Dict[str, List[Tuple[int, str]]],
+    page_info: Optional[Dict] = None,
+    stats: Optional[Dict] = None,
+    model: str = OPENAI_MODEL,
+    low_res: bool = False,
+    focus_sections: Optional[List[str]] = None,
+    label: str = "Pass 1",
+    page_texts: Optional[Dict[int, str]] = None
+) -> Dict:
+    """
+    Pass 1 (async): Extract quantities with one concurrent request per page chunk
+
+    Args:
+        page_groups: Dict mapping group name -> list of (page_number, image_path)
+        page_info: Optional dict with page categorization info
+        stats: Optional dict updated in place with call stats (summed over chunks)
+        model: Model name
+        low_res: Send low-resolution overviews only
+        focus_sections: Optional sections to concentrate on
+        label: Call label for logs
+        page_texts: Optional dict mapping page_number -> layout text
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse JSON from Pass 1: {e}")
-        logger.error(f"Response text (first 1000 chars): {result_text[:1000]}")
-        logger.error(f"Response text (last 500 chars): {result_text[-500:]}")
-        raise ValueError(f"Invalid JSON from extraction Pass 1: {e}")
+    Returns:
+        Merged extraction JSON dict (same shape as extract_quantities_pass1)
+    """
+    chunks = chunk_page_groups(page_groups)
+    logger.info(
+        f"{label} (async): Extracting {sum(len(p) for _, p in chunks)} pages "
+        f"in {len(chunks)} chunks with {model} (concurrency {EXTRACTION_MAX_CONCURRENCY})"
+    )
 
-    except Exception as e:
-        logger.error(f"OpenAI API error in Pass 1: {e}")
-        raise
+    semaphore = asyncio.Semaphore(max(1, EXTRACTION_MAX_CONCURRENCY))
+
+    async with extraction_backends.get_backend().async_session() as session:
+        results = await asyncio.gather(
+            *[
+                _extract_chunk_async(
+                    session, semaphore, group, pages, page_info, stats,
+                    model=model, low_res=low_res, focus_sections=focus_sections, label=label,
+                    page_texts=page_texts
+                )
+                for group, pages in chunks
+            ],
+            return_exceptions=True
+        )
+
+    partials = []
+    failed_chunks = []
+    for (group, pages), result in zip(chunks, results):
+        if isinstance(result, Exception):
+            logger.error(f"{label} chunk ({group}) failed: {result}")
+            failed_chunks.append((group, [page_no for page_no, _ in pages]))
+        else:
+            partials.append((group, result))
+
+    if not partials:
+        raise ValueError(f"All {len(chunks)} extraction chunks failed")
+
+    merged = merge_partial_results(partials)
+
+    if failed_chunks:
+        record_failures(stats, len(failed_chunks))
+        merged["review"]["needs_review"] = True
+        for group, page_numbers in failed_chunks:
+            merged["review"]["flags"].append(
+                f"Extraction failed for {group} pages {page_numbers}"
+            )
+
+    return merged
+
+
+def merge_partial_results(partials: List[Tuple[str, Dict]]) -> Dict:
+    """
+    Deterministically merge partial extraction results into one result
+
+    Chunks from the same group cover disjoint pages, so their counts are summed.
+    Across groups, each section is taken from the most confident group
+    (ties broken by group priority: schedule > legend > floor_plan > other).
+
+    Args:
+        partials: List of (group_name, partial_json) in any order
+
+    Returns:
+        Merged extraction JSON dict
+    """
+    ordered = sorted(partials, key=lambda item: _group_sort_key(item[0]))
+
+    # 1. Combine chunks within each group
+    by_group: Dict[str, List[Dict]] = {}
+    for group, partial in ordered:
+        by_group.setdefault(group, []).append(partial)
+
+    group_results = {group: _sum_group_chunks(chunks) for group, chunks in by_group.items()}
+
+    merged: Dict = {}
+
+    # 2. Pick each count section from the best group
+    for section in COUNT_SECTIONS:
+        candidates = [
+            (group, result[section])
+            for group, result in group_results.items()
+            if isinstance(result.get(section), dict)
+        ]
+        if not candidates:
+            continue
+
+        best_group, best_section = min(
+            candidates,
+            key=lambda item: (
+                -CONFIDENCE_RANK.get(item[1].get("confidence"), 0),
+                _group_sort_key(item[0])
+            )
+        )
+        merged[section] = best_section
+        logger.info(f"Merged {section} from {best_group} pages")
+
+    # 3. Meta: first known value by priority, max floors, joined notes
+    metas = [p.get("meta") for _, p in ordered if isinstance(p.get("meta"), dict)]
+    if metas:
+        merged["meta"] = {
+            "floors_detected": max(
+                (m.get("floors_detected") for m in metas if isinstance(m.get("floors_detected"), int)),
+                default=1
+            ),
+            "plan_type": _first_known(metas, "plan_type"),
+            "units": _first_known(metas, "units"),
+            "notes": " | ".join(_unique(m.get("notes") for m in metas if m.get("notes"))),
+        }
+
+    # 4. Review: union of flags/assumptions
+    reviews = [p.get("review") for _, p in ordered if isinstance(p.get("review"), dict)]
+    merged["review"] = {
+        "needs_review": any(r.get("needs_review", False) for r in reviews),
+        "flags": _unique(f for r in reviews for f in r.get("flags", [])),
+        "assumptions": _unique(a for r in reviews for a in r.get("assumptions", [])),
+    }
+
+    return merged
+
+
+def _sum_group_chunks(chunks: List[Dict]) -> Dict:
+    """
+    Sum counts of chunks covering disjoint pages of the same group
+
+    Keys are the union across chunks; a missing or null value (e.g., a
+    by_type of None) counts as empty rather than replacing the other chunks'.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+
+    result: Dict = {}
+    for section in COUNT_SECTIONS:
+        sections = [c[section] for c in chunks if isinstance(c.get(section), dict)]
+        if not sections:
+            continue
+
+        combined: Dict = {}
+        for key in _unique(key for s in sections for key in s):
+            values = [s.get(key) for s in sections]
+            if key == "confidence":
+                combined[key] = min(
+                    (v for v in values if v is not None), key=lambda v: CONFIDENCE_RANK.get(v, 0)
+                )
+            elif key == "evidence":
+                combined[key] = [e for v in values if isinstance(v, list) for e in v]
+            elif any(isinstance(v, dict) for v in values):
+                combined[key] = _sum_values([v for v in values if isinstance(v, dict)])
+            else:
+                combined[key] = _sum_or_first(values)
+        result[section] = combined
+
+    return result
+
+
+def _sum_values(dicts: List[Dict]) -> Dict:
+    """Sum dicts key by key (e.g., by_type breakdowns of several chunks)"""
+    return {
+        key: _sum_or_first([d.get(key) for d in dicts])
+        for key in _unique(key for d in dicts for key in d)
+    }
+
+
+def _sum_or_first(values: List):
+    """Sum of the numeric values, or the first non-null value when none is numeric"""
+    numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    if numbers:
+        return sum(numbers)
+    return next((v for v in values if v is not None), None)
+
+
+def _group_sort_key(group: str) -> int:
+    return GROUP_PRIORITY.index(group) if group in GROUP_PRIORITY else len(GROUP_PRIORITY)
+
+
+def _first_known(items: List[Dict], key: str) -> str:
+    for item in items:
+        value = item.get(key)
+        if value and value != "unknown":
+            return value
+    return "unknown"
+
+
+def _unique(values) -> List:
+    seen = []
+    for value in values:
+        if value not in seen:
+            seen.append(value)
+    return seen
+
+
+# ============================================================================
+# CONFIDENCE-DRIVEN ESCALATION
+# ============================================================================
+
+def sections_to_escalate(
+    result: Dict,
+    violations: List[Dict],
+    min_confidence: str = ESCALATION_MIN_CONFIDENCE
+) -> List[str]:
+    """
+    Pick the sections of a cheap first-pass result that need the main model
+
+    A section is escalated when it is missing, its confidence is below
+    min_confidence, or a local consistency rule failed for it. Violations not
+    tied to a count section (e.g., a malformed result) escalate everything.
+
+    Args:
+        result: Cheap Pass 1 JSON
+        violations: validate.check_consistency() output for result
+        min_confidence: Lowest confidence accepted without escalation
+
+    Returns:
+        Section names in COUNT_SECTIONS order (empty if nothing to escalate)
+    """
+    threshold = CONFIDENCE_RANK.get(min_confidence, CONFIDENCE_RANK["medium"])
+    escalate = set()
+
+    for section in COUNT_SECTIONS:
+        section_data = result.get(section)
+        if not isinstance(section_data, dict):
+            escalate.add(section)
+        elif CONFIDENCE_RANK.get(section_data.get("confidence"), 0) < threshold:
+            escalate.add(section)
+
+    for violation in violations:
+        if violation["section"] in COUNT_SECTIONS:
+            escalate.add(violation["section"])
+        else:
+            escalate.update(COUNT_SECTIONS)
+
+    return [section for section in COUNT_SECTIONS if section in escalate]
+
+
+def merge_escalated_sections(cheap_result: Dict, escalated_result: Dict, sections: List[str]) -> Dict:
+    """
+    Replace escalated sections of the cheap result with the main model's output
+
+    Meta comes from the full-resolution run when present; review flags and
+    assumptions are unioned (a section the cheap pass flagged stays flagged
+    until the audit clears it).
+
+    Args:
+        cheap_result: Cheap Pass 1 JSON
+        escalated_result: Full-resolution re-extraction JSON
+        sections: Sections to take from escalated_result
+
+    Returns:
+        Merged extraction JSON dict
+    """
+    merged = dict(cheap_result)
+
+    for section in sections:
+        if isinstance(escalated_result.get(section), dict):
+            merged[section] = escalated_result[section]
+
+    if isinstance(escalated_result.get("meta"), dict):
+        merged["meta"] = escalated_result["meta"]
+
+    reviews = [
+        r for r in [cheap_result.get("review"), escalated_result.get("review")]
+        if isinstance(r, dict)
+    ]
+    merged["review"] = {
+        "needs_review": any(r.get("needs_review", False) for r in reviews),
+        "flags": _unique(f for r in reviews for f in r.get("flags", [])),
+        "assumptions": _unique(a for r in reviews for a in r.get("assumptions", [])),
+    }
+
+    return merged
+
+
+def run_pass1(
+    image_paths: List[str],
+    page_info: Optional[Dict],
+    page_groups: Optional[Dict[str, List[Tuple[int, str]]]],
+    page_numbers: List[int],
+    page_groups_map: Dict[int, str],
+    stats: Optional[Dict] = None,
+    model: str = OPENAI_MODEL,
+    low_res: bool = False,
+    focus_sections: Optional[List[str]] = None,
+    label: str = "Pass 1",
+    page_texts: Optional[Dict[int, str]] = None
+) -> Dict:
+    """
+    Run Pass 1 chunked and concurrent (EXTRACTION_ASYNC with page groups) or
+    as a single request
+
+    Returns:
+        Extraction JSON dict
+    """
+    options = {
+        "stats": stats,
+        "model": model,
+        "low_res": low_res,
+        "focus_sections": focus_sections,
+        "label": label,
+        "page_texts": page_texts,
+    }
+
+    if EXTRACTION_ASYNC and page_groups:
+        return asyncio.run(extract_quantities_pass1_async(page_groups, page_info, **options))
+
+    return extract_quantities_pass1(
+        image_paths,
+        page_info,
+        page_numbers=page_numbers,
+        page_groups_map=page_groups_map,
+        **options
+    )
+
+
+def _sum_costs(*costs: Optional[float]) -> Optional[float]:
+    return None if None in costs else round(sum(costs), 6)
 
 
 def audit_extraction_pass2(
     pass1_result: Dict,
-    original_images: Optional[List[str]] = None
+    original_images: Optional[List[str]] = None,
+    stats: Optional[Dict] = None,
+    violations: Optional[List[Dict]] = None
 ) -> Dict:
     """
     Pass 2: Audit the extraction for consistency
@@ -135,84 +1528,239 @@ def audit_extraction_pass2(
     Args:
         pass1_result: JSON output from Pass 1
         original_images: Optional - re-send images for reference
+        stats: Optional dict updated in place with call stats
+        violations: Optional local consistency violations for the model to fix
 
     Returns:
         Audited and corrected JSON dict
     """
     logger.info("Pass 2: Auditing extraction for consistency")
 
-    # Convert pass1 result to string for the audit prompt
-    pass1_json_str = json.dumps(pass1_result, indent=2)
-
-    # Build messages
-    messages = [
-        {
-            "role": "system",
-            "content": EXTRACTION_PASS2_PROMPT
-        },
-        {
-            "role": "user",
-            "content": f"Review this extraction for errors:\n\n{pass1_json_str}"
-        }
-    ]
+    messages = build_pass2_messages(pass1_result, violations)
 
     # Call OpenAI
     try:
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=messages,
-            max_tokens=4000,  # Increased for larger JSON responses
-            temperature=0.1,
-        )
-
-        result_text = response.choices[0].message.content
-        logger.info(f"Pass 2 completed. Tokens used: {response.usage.total_tokens}")
-
-        # Parse JSON from response
-        result_text = result_text.strip()
-        if result_text.startswith("```json"):
-            result_text = result_text[7:]
-        if result_text.startswith("```"):
-            result_text = result_text[3:]
-        if result_text.endswith("```"):
-            result_text = result_text[:-3]
-        result_text = result_text.strip()
-
-        result_json = json.loads(result_text)
-        return result_json
+        return create_json_completion(messages, "Pass 2", stats)
 
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         logger.warning(f"Failed to parse JSON from Pass 2, returning Pass 1 result: {e}")
         # If audit fails, return original Pass 1 result
+        record_failures(stats)
         return pass1_result
 
     except Exception as e:
         logger.error(f"OpenAI API error in Pass 2: {e}")
         # If audit fails, return original Pass 1 result
+        record_failures(stats)
         return pass1_result
 
 
 def extract_with_2pass(
     image_paths: List[str],
-    page_info: Optional[Dict] = None
+    page_info: Optional[Dict] = None,
+    page_groups: Optional[Dict[str, List[Tuple[int, str]]]] = None,
+    page_numbers: Optional[List[int]] = None,
+    metrics: Optional[Dict] = None,
+    page_texts: Optional[Dict[int, str]] = None
 ) -> Dict:
     """
     Complete 2-pass extraction: extract → audit
+    Results are cached on disk, keyed by model, prompts, context and image contents;
+    degraded results (failed chunks / escalation / Pass 2, budget skip) are not cached.
+
+    With EXTRACTION_ESCALATION, Pass 1 runs ESCALATION_CHEAP_MODEL on low-resolution
+    pages, and only sections that are low-confidence or fail local consistency
+    checks are re-extracted by OPENAI_MODEL at full resolution and merged in.
 
     Args:
         image_paths: List of paths to rendered page images
         page_info: Optional dict with page categorization
+        page_groups: Optional dict mapping group name -> list of (page_number, image_path);
+            used for concurrent chunked extraction when EXTRACTION_ASYNC is enabled
+        page_numbers: Optional page number of each image in image_paths
+        metrics: Optional dict updated in place with per-pass token, image,
+            payload, latency and cost metrics (see summarize_job); filled with
+            Pass 1's metrics when Pass 1 raises
+        page_texts: Optional dict mapping page_number -> layout text; these pages
+            are sent as text instead of images (vector PDF schedules/legends)
 
     Returns:
         Final validated JSON extraction result
     """
     logger.info("Starting 2-pass extraction")
+    if metrics is None:
+        metrics = {}
+
+    use_async = bool(EXTRACTION_ASYNC and page_groups)
+    if page_numbers is None:
+        page_numbers = list(range(len(image_paths)))
+    page_groups_map = {
+        page_no: group
+        for group, pages in (page_groups or {}).items()
+        for page_no, _ in pages
+    }
+
+    # Check the cache first (identical images + prompts + context)
+    cache = extraction_cache.get_cache()
+    cache_key = None
+    if cache is not None:
+        try:
+            if use_async:
+                chunks = chunk_page_groups(page_groups)
+                mode = json.dumps([[group, [p for p, _ in pages]] for group, pages in chunks])
+                cache_images = [path for _, pages in chunks for _, path in pages]
+            else:
+                mode = json.dumps([[page_no, page_groups_map.get(page_no)] for page_no in page_numbers])
+                cache_images = image_paths
+            mode += json.dumps(
+                {
+                    "backend": extraction_backends.get_backend().name,
+                    "vision": VISION_SETTINGS,
+                    "local_audit": EXTRACTION_LOCAL_AUDIT,
+                    "structured": EXTRACTION_STRUCTURED_OUTPUT,
+                    "escalation": ESCALATION_SETTINGS if EXTRACTION_ESCALATION else None,
+                    "page_texts": extraction_cache.hash_text(json.dumps(page_texts or {}, sort_keys=True)),
+                },
+                sort_keys=True
+            )
+
+            cache_key = extraction_cache.build_cache_key(
+                build_context_message(page_info), cache_images, mode=mode
+            )
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Extraction cache hit ({cache_key[:12]}), skipping OpenAI calls")
+                passes = {"pass1": summarize_pass({}, skipped="cache")}
+                if EXTRACTION_ESCALATION:
+                    passes["escalation"] = summarize_pass({}, skipped="cache")
+                passes["pass2"] = summarize_pass({}, skipped="cache")
+                metrics.update(summarize_job(passes, cache_hit=True))
+                metrics["cached_usage"] = cached["usage"]  # What the original run spent
+                return cached["final_result"]
+        except Exception as e:
+            logger.warning(f"Extraction cache lookup failed: {e}")
+            cache_key = None
+
+    pass1_stats: Dict = {}
+    escalation_stats: Dict = {}
+    pass2_stats: Dict = {}
+    pass2_skipped: Optional[str] = None
+    budget_exceeded = False
+    analyzed_pages = sorted(set(page_numbers) | set(page_groups_map))
+
+    # Pass 1: Extract (cheap model on low-resolution pages when escalating)
+    pass1_model = ESCALATION_CHEAP_MODEL if EXTRACTION_ESCALATION else OPENAI_MODEL
+    started = time.perf_counter()
+    try:
+        pass1_result = run_pass1(
+            image_paths, page_info, page_groups, page_numbers, page_groups_map,
+            stats=pass1_stats, model=pass1_model, low_res=EXTRACTION_ESCALATION, page_texts=page_texts
+        )
+    except Exception:
+        # The failed job still reports what Pass 1 spent
+        metrics.update(summarize_job({
+            "pass1": summarize_pass(pass1_stats, time.perf_counter() - started, model=pass1_model)
+        }))
+        raise
+    pass1_time = time.perf_counter() - started
+
+    # Escalation: re-extract uncertain sections with the main model at full resolution
+    escalated_sections: List[str] = []
+    escalation_skipped: Optional[str] = None
+    started = time.perf_counter()
+    if EXTRACTION_ESCALATION:
+        escalated_sections = sections_to_escalate(
+            pass1_result, validate.check_consistency(pass1_result, analyzed_pages)
+        )
+        if not escalated_sections:
+            logger.info(f"Escalation: Skipped ({pass1_model} confident in every section)")
+            escalation_skipped = "confident"
+        else:
+            logger.info(f"Escalation: Re-extracting {escalated_sections} with {OPENAI_MODEL}")
+            try:
+                escalated_result = run_pass1(
+                    image_paths, page_info, page_groups, page_numbers, page_groups_map,
+                    stats=escalation_stats, focus_sections=escalated_sections, label="Escalation",
+                    page_texts=page_texts
+                )
+                pass1_result = merge_escalated_sections(pass1_result, escalated_result, escalated_sections)
+            except Exception as e:
+                logger.error(f"Escalation failed, keeping {pass1_model} results: {e}")
+                record_failures(escalation_stats)
+                review = pass1_result.setdefault("review", {})
+                review["needs_review"] = True
+                review.setdefault("flags", []).append(
+                    f"Escalation failed: {', '.join(escalated_sections)} from low-resolution pass only"
+                )
+    escalation_time = time.perf_counter() - started
+
+    # Pass 2: Audit (skipped when local consistency checks pass or the job budget is spent)
+    violations = None
+    if EXTRACTION_LOCAL_AUDIT:
+        violations = validate.check_consistency(pass1_result, analyzed_pages)
+        if not violations:
+            pass2_skipped = "local_audit"
+
+    spent_stats = {
+        key: pass1_stats.get(key, 0) + escalation_stats.get(key, 0)
+        for key in ["prompt_tokens", "completion_tokens"]
+    }
+    spent_cost = None
+    if EXTRACTION_ESCALATION:
+        spent_cost = _sum_costs(
+            estimate_cost(pass1_stats, pass1_model), estimate_cost(escalation_stats)
+        )
+    if pass2_skipped is None and pass2_exceeds_budget(spent_stats, pass1_result, spent_cost):
+        pass2_skipped = "budget"
+        budget_exceeded = True
+
+    started = time.perf_counter()
+    if pass2_skipped == "local_audit":
+        logger.info("Pass 2: Skipped (local consistency checks passed)")
+        final_result = pass1_result
+    elif pass2_skipped == "budget":
+        logger.warning("Pass 2: Skipped (per-job token/cost budget would be exceeded)")
+        final_result = pass1_result
+        review = final_result.setdefault("review", {})
+        review["needs_review"] = True
+        review.setdefault("flags", []).append("Audit skipped: per-job extraction budget exceeded")
+    else:
+        final_result = audit_extraction_pass2(
+            pass1_result, stats=pass2_stats, violations=violations
+        )
+    pass2_time = time.perf_counter() - started
+
+    passes = {"pass1": summarize_pass(pass1_stats, pass1_time, model=pass1_model)}
+    if EXTRACTION_ESCALATION:
+        passes["escalation"] = summarize_pass(escalation_stats, escalation_time, skipped=escalation_skipped)
+    passes["pass2"] = summarize_pass(pass2_stats, pass2_time, skipped=pass2_skipped)
 
-    # Pass 1: Extract
-    pass1_result = extract_quantities_pass1(image_paths, page_info)
+    metrics.update(summarize_job(passes, budget_exceeded=budget_exceeded))
+    if EXTRACTION_ESCALATION:
+        metrics["escalated_sections"] = escalated_sections
+    totals = metrics["totals"]
+    logger.info(
+        f"Extraction usage: {totals['total_tokens']} tokens, {totals['image_count']} images, "
+        f"{totals['payload_bytes'] / 1024 / 1024:.1f} MB sent, {totals['wall_time_s']:.1f}s, "
+        f"cost ${totals['cost_usd'] if totals['cost_usd'] is not None else 'n/a'}"
+    )
 
-    # Pass 2: Audit
-    final_result = audit_extraction_pass2(pass1_result)
+    # Never cache a degraded result: a retry of the job should call the model again
+    degraded = budget_exceeded or any(
+        stats.get("failed_calls") for stats in [pass1_stats, escalation_stats, pass2_stats]
+    )
+    if degraded:
+        logger.info("Extraction degraded (failed calls or budget skip), not caching the result")
+    elif cache is not None and cache_key is not None:
+        try:
+            cache.put(
+                cache_key,
+                pass1_result,
+                final_result,
+                usage=metrics
+            )
+        except Exception as e:
+            logger.warning(f"Extraction cache store failed: {e}")
 
     logger.info("2-pass extraction completed")
 
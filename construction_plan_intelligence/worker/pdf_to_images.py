@@ -5,20 +5,73 @@ Renders PDF pages as high-quality images for analysis
 
 import fitz  # PyMuPDF
 from PIL import Image
-import io
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import logging
-
-from config import PDF_DPI, PDF_FORMAT, MAX_PAGES
+import time
+
+import stage_metrics
+import tracing
+from config import (
+    PDF_DPI,
+    PDF_FORMAT,
+    MAX_PAGES,
+    PAGE_THUMBNAIL_MAX_SIDE,
+    PAGE_PREVIEW_MAX_SIDE,
+    PAGE_PYRAMID_FORMAT,
+    PAGE_PYRAMID_QUALITY,
+    TEXT_LAYER_MIN_WORDS,
+    TEXT_LAYER_MAX_CHARS,
+)
 
 logger = logging.getLogger(__name__)
 
+# Smaller pyramid levels, largest first (each is downscaled from the previous one)
+PYRAMID_LEVELS = [
+    ("preview", PAGE_PREVIEW_MAX_SIDE),
+    ("thumbnail", PAGE_THUMBNAIL_MAX_SIDE),
+]
+
+PYRAMID_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+
+def write_pyramid(img: Image.Image, output_dir: Path, stem: str) -> Dict[str, Dict]:
+    """
+    Write the preview and thumbnail levels of a full-resolution page image
+
+    Args:
+        img: Full-resolution page image
+        output_dir: Directory to write the levels to
+        stem: File name stem (e.g., page_000 -> page_000.preview.jpg)
+
+    Returns:
+        Dict: level -> {"local_file_path", "width", "height", "format"}
+    """
+    extension = PYRAMID_EXTENSIONS.get(PAGE_PYRAMID_FORMAT, PAGE_PYRAMID_FORMAT.lower())
+    save_options = {} if PAGE_PYRAMID_FORMAT == "PNG" else {"quality": PAGE_PYRAMID_QUALITY}
+
+    levels = {}
+    source = img
+    for level, max_side in PYRAMID_LEVELS:
+        scaled = source.copy()
+        scaled.thumbnail((max_side, max_side), Image.LANCZOS)  # Keeps aspect, never upscales
+        level_path = output_dir / f"{stem}.{level}.{extension}"
+        scaled.save(level_path, PAGE_PYRAMID_FORMAT, **save_options)
+        levels[level] = {
+            "local_file_path": str(level_path),
+            "width": scaled.width,
+            "height": scaled.height,
+            "format": extension,
+        }
+        source = scaled
+    return levels
+
 
 def render_pdf_pages(
     pdf_path: str,
     output_dir: str,
-    dpi: int = PDF_DPI
+    dpi: int = PDF_DPI,
+    pyramid_out: Optional[Dict[int, Dict[str, Dict]]] = None
 ) -> List[Tuple[int, str]]:
     """
     Render PDF pages as images
@@ -27,6 +80,9 @@ def render_pdf_pages(
         pdf_path: Path to PDF file
         output_dir: Directory to save rendered images
         dpi: Resolution in DPI (default: 300)
+        pyramid_out: If given, also write a preview and thumbnail of each page
+            (from the same pixmap) and collect page_number -> level -> info,
+            including the "full" level (see write_pyramid)
 
     Returns:
         List of tuples: (page_number, image_path)
@@ -55,22 +111,37 @@ def render_pdf_pages(
     mat = fitz.Matrix(zoom, zoom)
 
     for page_num in range(total_pages):
+        started = time.perf_counter()
         try:
-            page = doc[page_num]
+            with tracing.span("render_page", page_no=page_num, dpi=dpi) as span:
+                page = doc[page_num]
 
-            # Render page to pixmap
-            pix = page.get_pixmap(matrix=mat)
+                # Render page to pixmap
+                pix = page.get_pixmap(matrix=mat)
 
-            # Convert to PIL Image
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
+                # Wrap the pixmap's RGB samples (no intermediate PNG encode/decode)
+                img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
 
-            # Save image
-            output_filename = f"page_{page_num:03d}.png"
-            output_filepath = output_path / output_filename
-            img.save(output_filepath, PDF_FORMAT)
+                # Save image
+                output_filename = f"page_{page_num:03d}.png"
+                output_filepath = output_path / output_filename
+                img.save(output_filepath, PDF_FORMAT)
+
+                if pyramid_out is not None:
+                    levels = write_pyramid(img, output_path, output_filepath.stem)
+                    levels["full"] = {
+                        "local_file_path": str(output_filepath),
+                        "width": img.width,
+                        "height": img.height,
+                        "format": PDF_FORMAT.lower(),
+                    }
+                    pyramid_out[page_num] = levels
+
+                if span.trace_id:
+                    span.set(width=img.width, height=img.height, bytes=output_filepath.stat().st_size)
 
             rendered_pages.append((page_num, str(output_filepath)))
+            stage_metrics.observe_stage("render_page", time.perf_counter() - started)
             logger.info(f"Rendered page {page_num + 1}/{total_pages}")
 
         except Exception as e:
@@ -116,6 +187,98 @@ def extract_text_from_pdf(pdf_path: str) -> dict:
     return page_texts
 
 
+def layout_rows(words: List[tuple]) -> List[str]:
+    """
+    Group positioned words into text rows, preserving table columns
+
+    Words whose vertical centers are within half a line height share a row.
+    Within a row, a horizontal gap wider than the line height starts a new
+    column, written as " | ".
+
+    Args:
+        words: PyMuPDF words (x0, y0, x1, y1, text, block_no, line_no, word_no)
+
+    Returns:
+        Row strings, top to bottom
+    """
+    rows: List[List[tuple]] = []
+    row_center = row_height = 0.0
+
+    for word in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        x0, y0, x1, y1, text = word[:5]
+        center, height = (y0 + y1) / 2, max(y1 - y0, 1.0)
+        if rows and abs(center - row_center) <= max(row_height, height) / 2:
+            rows[-1].append(word)
+        else:
+            rows.append([word])
+            row_center, row_height = center, height
+
+    lines = []
+    for row in rows:
+        row.sort(key=lambda w: w[0])
+        line_height = max(w[3] - w[1] for w in row)
+        line = row[0][4]
+        for previous, word in zip(row, row[1:]):
+            line += " | " if word[0] - previous[2] > line_height else " "
+            line += word[4]
+        lines.append(line)
+
+    return lines
+
+
+def extract_layout_text(
+    pdf_path: str,
+    page_numbers: Optional[List[int]] = None,
+    min_words: int = TEXT_LAYER_MIN_WORDS,
+    max_chars: int = TEXT_LAYER_MAX_CHARS
+) -> Dict[int, str]:
+    """
+    Extract compact layout-preserving text (positioned words grouped into rows)
+    from the text layer of vector (CAD-exported) PDF pages
+
+    Pages without a usable text layer (scans, or fewer than min_words words)
+    and pages whose text exceeds max_chars are left out, so callers fall back
+    to images for them.
+
+    Args:
+        pdf_path: Path to PDF file
+        page_numbers: Pages to extract (default: all, up to MAX_PAGES)
+        min_words: Minimum words for a page to count as having a text layer
+        max_chars: Maximum text length per page
+
+    Returns:
+        Dictionary mapping page_number -> layout text
+    """
+    doc = fitz.open(pdf_path)
+    total_pages = min(len(doc), MAX_PAGES)
+    if page_numbers is None:
+        page_numbers = list(range(total_pages))
+
+    page_texts = {}
+
+    for page_num in page_numbers:
+        if not 0 <= page_num < total_pages:
+            continue
+        try:
+            words = doc[page_num].get_text("words")
+            if len(words) < min_words:
+                continue
+
+            text = "\n".join(layout_rows(words))
+            if len(text) > max_chars:
+                logger.info(f"Page {page_num} text layer too long ({len(text)} chars), using image")
+                continue
+            page_texts[page_num] = text
+
+        except Exception as e:
+            logger.error(f"Failed to extract layout text from page {page_num}: {e}")
+
+    doc.close()
+    logger.info(f"Extracted layout text from {len(page_texts)}/{len(page_numbers)} pages")
+
+    return page_texts
+
+
 def get_pdf_metadata(pdf_path: str) -> dict:
     """
     Extract metadata from PDF
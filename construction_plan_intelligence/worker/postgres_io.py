@@ -0,0 +1,347 @@
+"""
+Postgres I/O Module
+Direct pooled Postgres access for job and metadata operations (optional)
+
+With DATABASE_URL set, supabase_io sends its table operations here instead of
+one PostgREST request each: connections come from a per-process pool,
+statements are prepared server-side, and transaction() groups the writes of a
+job stage into one transaction. Storage still goes through the Supabase client.
+
+Functions raise on database errors; supabase_io keeps its log-and-return
+behaviour around them.
+"""
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional
+from uuid import UUID
+
+try:
+    from psycopg.rows import dict_row
+    from psycopg.types.json import Jsonb
+    from psycopg_pool import ConnectionPool
+except ImportError:  # Only needed with DATABASE_URL
+    ConnectionPool = None
+
+from config import (
+    DATABASE_URL,
+    DATABASE_POOL_MIN_SIZE,
+    DATABASE_POOL_MAX_SIZE,
+    DATABASE_PREPARE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# STATEMENTS
+# ============================================================================
+
+UPDATE_JOB_STATUS_SQL = """
+    UPDATE plan_jobs SET status = %s, error = COALESCE(%s, error) WHERE id = %s
+"""
+
+# Oldest queued job; SKIP LOCKED lets concurrent workers claim different jobs
+CLAIM_NEXT_JOB_SQL = """
+    UPDATE plan_jobs SET status = 'processing'
+    WHERE id = (
+        SELECT id FROM plan_jobs
+        WHERE status = 'queued'
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+"""
+
+# Listed jobs, each only if its status is unchanged since it was listed
+CLAIM_JOBS_SQL = """
+    UPDATE plan_jobs SET status = 'processing'
+    FROM unnest(%s::uuid[], %s::text[]) AS listed(id, status)
+    WHERE plan_jobs.id = listed.id AND plan_jobs.status = listed.status
+    RETURNING plan_jobs.id
+"""
+
+LIST_JOBS_SQL = """
+    SELECT * FROM plan_jobs
+    WHERE (%(status)s::text IS NULL OR status = %(status)s)
+      AND (%(job_ids)s::uuid[] IS NULL OR id = ANY(%(job_ids)s::uuid[]))
+    ORDER BY created_at
+    LIMIT %(limit)s
+"""
+
+JOB_EXISTS_SQL = "SELECT 1 FROM plan_jobs WHERE id = %s"
+
+COUNT_JOBS_SQL = "SELECT count(*) AS count FROM plan_jobs WHERE status = %s"
+
+FIND_ARTIFACTS_SQL = """
+    SELECT id, kind, page_no, artifact_path FROM plan_job_artifacts
+    WHERE job_id = %s AND artifact_path = ANY(%s)
+"""
+
+INSERT_ARTIFACT_SQL = """
+    INSERT INTO plan_job_artifacts (job_id, kind, page_no, artifact_path, meta)
+    VALUES (%s, %s, %s, %s, %s)
+    RETURNING id
+"""
+
+# One analysis per job (uq_plan_analyses_job): re-analysis replaces it
+UPSERT_ANALYSIS_SQL = """
+    INSERT INTO plan_analyses (job_id, model, quantities, confidence, evidence, needs_review)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (job_id) DO UPDATE SET
+        model = EXCLUDED.model,
+        quantities = EXCLUDED.quantities,
+        confidence = EXCLUDED.confidence,
+        evidence = EXCLUDED.evidence,
+        needs_review = EXCLUDED.needs_review
+    RETURNING id
+"""
+
+JOB_METRIC_COLUMNS = [
+    "job_id", "user_id", "pass", "model", "calls", "prompt_tokens", "completion_tokens",
+    "total_tokens", "image_count", "payload_bytes", "wall_time_s", "cost_usd", "skipped", "batch",
+    "peak_rss_mb", "memory",
+]
+
+UPSERT_JOB_METRICS_SQL = f"""
+    INSERT INTO plan_job_metrics ({", ".join(JOB_METRIC_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(JOB_METRIC_COLUMNS))})
+    ON CONFLICT (job_id, pass) DO UPDATE SET
+        {", ".join(f"{column} = EXCLUDED.{column}" for column in JOB_METRIC_COLUMNS[3:])}
+"""
+
+
+# ============================================================================
+# CONNECTIONS
+# ============================================================================
+
+_pool: Optional["ConnectionPool"] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+# Connection of the transaction open on this thread (see transaction())
+_local = threading.local()
+
+
+def enabled() -> bool:
+    """True when DATABASE_URL is set (table operations bypass PostgREST)"""
+    return bool(DATABASE_URL)
+
+
+def get_pool() -> "ConnectionPool":
+    """
+    Get the connection pool, opened on first use and cached per process
+
+    Raises:
+        RuntimeError: If psycopg / psycopg-pool are not installed
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                if ConnectionPool is None:
+                    raise RuntimeError("DATABASE_URL is set but psycopg / psycopg-pool are not installed")
+                _pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DATABASE_POOL_MIN_SIZE,
+                    max_size=max(DATABASE_POOL_MIN_SIZE, DATABASE_POOL_MAX_SIZE),
+                    # prepare_threshold=0: prepare every statement on first use
+                    kwargs={"prepare_threshold": 0 if DATABASE_PREPARE else None},
+                    name="plan-worker",
+                    open=True,
+                )
+                _pool_pid = pid
+                logger.info(
+                    f"Opened Postgres pool ({DATABASE_POOL_MIN_SIZE}-{DATABASE_POOL_MAX_SIZE} connections, "
+                    f"prepared statements {'on' if DATABASE_PREPARE else 'off'})"
+                )
+    return _pool
+
+
+def close_pool():
+    """Close this process's pool (the next operation opens a new one)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+@contextmanager
+def transaction() -> Iterator:
+    """
+    Run the enclosed operations in one transaction on one pooled connection
+
+    Commits on exit and rolls back on an exception. Operations inside run in
+    savepoints, so one failed write (e.g. best-effort metrics) is rolled back
+    alone. Nested calls join the open transaction.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        yield conn
+        return
+
+    with get_pool().connection() as conn, conn.transaction():
+        _local.conn = conn
+        try:
+            yield conn
+        finally:
+            _local.conn = None
+
+
+@contextmanager
+def _cursor():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        with transaction() as conn, conn.cursor(row_factory=dict_row) as cur:
+            yield cur
+    else:
+        with conn.transaction(), conn.cursor(row_factory=dict_row) as cur:
+            yield cur
+
+
+def _jsonable(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _record(row: Optional[Dict]) -> Optional[Dict]:
+    # Same value types as PostgREST JSON (string UUIDs and timestamps)
+    if row is None:
+        return None
+    return {key: _jsonable(value) for key, value in row.items()}
+
+
+# ============================================================================
+# JOB OPERATIONS
+# ============================================================================
+
+def update_job_status(job_id: str, status: str, error: Optional[str] = None):
+    """Set a job's status (and error, if given)"""
+    with _cursor() as cur:
+        cur.execute(UPDATE_JOB_STATUS_SQL, (status, error or None, job_id))
+
+
+def claim_next_job() -> Optional[Dict]:
+    """
+    Atomically take the oldest queued job and mark it processing
+
+    Returns:
+        Job dict or None if no jobs are queued (or all are being claimed)
+    """
+    with _cursor() as cur:
+        cur.execute(CLAIM_NEXT_JOB_SQL)
+        return _record(cur.fetchone())
+
+
+def claim_jobs(jobs: List[Dict]) -> List[str]:
+    """
+    Mark listed jobs processing where their status has not changed since they were listed
+
+    Returns:
+        IDs of the claimed jobs
+    """
+    with _cursor() as cur:
+        cur.execute(CLAIM_JOBS_SQL, ([job["id"] for job in jobs], [job["status"] for job in jobs]))
+        return [str(row["id"]) for row in cur.fetchall()]
+
+
+def list_jobs(
+    status: Optional[str] = None,
+    job_ids: Optional[List[str]] = None,
+    limit: int = 100
+) -> List[Dict]:
+    """List jobs oldest first (see supabase_io.list_jobs)"""
+    with _cursor() as cur:
+        cur.execute(LIST_JOBS_SQL, {"status": status, "job_ids": job_ids or None, "limit": limit})
+        return [_record(row) for row in cur.fetchall()]
+
+
+def count_jobs(status: str) -> int:
+    with _cursor() as cur:
+        cur.execute(COUNT_JOBS_SQL, (status,))
+        return cur.fetchone()["count"]
+
+
+def job_exists(job_id: str) -> bool:
+    with _cursor() as cur:
+        cur.execute(JOB_EXISTS_SQL, (job_id,))
+        return cur.fetchone() is not None
+
+
+# ============================================================================
+# ARTIFACT / ANALYSIS OPERATIONS
+# ============================================================================
+
+def find_artifacts(job_id: str, artifact_paths: List[str]) -> List[Dict]:
+    """Artifact records of a job stored at any of the given paths"""
+    with _cursor() as cur:
+        cur.execute(FIND_ARTIFACTS_SQL, (job_id, artifact_paths))
+        return [_record(row) for row in cur.fetchall()]
+
+
+def insert_artifacts(rows: List[Dict]) -> List[str]:
+    """
+    Insert artifact records (one pipelined round trip)
+
+    Args:
+        rows: {"job_id", "kind", "artifact_path", "meta", "page_no" (optional)}
+
+    Returns:
+        IDs of the new records, in input order
+    """
+    if not rows:
+        return []
+
+    params = [
+        (row["job_id"], row["kind"], row.get("page_no"), row["artifact_path"], Jsonb(row.get("meta") or {}))
+        for row in rows
+    ]
+    with _cursor() as cur:
+        cur.executemany(INSERT_ARTIFACT_SQL, params, returning=True)
+        ids = []
+        while True:
+            ids.append(str(cur.fetchone()["id"]))
+            if not cur.nextset():
+                break
+        return ids
+
+
+def save_analysis(
+    job_id: str,
+    model: str,
+    quantities: Dict,
+    confidence: Dict,
+    evidence: Dict,
+    needs_review: bool
+) -> str:
+    """Insert or replace the job's analysis; returns its ID"""
+    with _cursor() as cur:
+        cur.execute(UPSERT_ANALYSIS_SQL, (
+            job_id, model, Jsonb(quantities), Jsonb(confidence), Jsonb(evidence), needs_review
+        ))
+        return str(cur.fetchone()["id"])
+
+
+def save_job_metrics(rows: List[Dict]):
+    """Insert or replace plan_job_metrics rows (keyed by job_id + pass)"""
+    params = [
+        tuple(
+            Jsonb(row["memory"]) if column == "memory" and row.get("memory") is not None else row.get(column)
+            for column in JOB_METRIC_COLUMNS
+        )
+        for row in rows
+    ]
+    with _cursor() as cur:
+        cur.executemany(UPSERT_JOB_METRICS_SQL, params)
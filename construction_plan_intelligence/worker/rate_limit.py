@@ -0,0 +1,368 @@
+"""
+Rate Limit Module
+Client-side token-bucket limiter for model requests/minute and tokens/minute,
+shared by all worker processes on a host through a locked state file per model
+
+Callers estimate a request's token cost up front, wait until both buckets can
+cover it, and reconcile with actual usage afterwards. Waiting requests are
+served in arrival order, so small calls cannot starve a large one. A 429
+pauses every process until the server's retry-after has passed.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import math
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: limit within this process only
+    fcntl = None
+
+from config import (
+    OPENAI_MODEL,
+    OPENAI_MODEL_RATE_LIMITS,
+    OPENAI_RPM_LIMIT,
+    OPENAI_TPM_LIMIT,
+    RATE_LIMIT_STATE_DIR,
+)
+from request_payload import ImagePayload
+
+logger = logging.getLogger(__name__)
+
+# Longest single sleep while waiting for capacity (re-checked after each)
+MAX_SLEEP_SECONDS = 5.0
+
+# A queued request not re-checked for this long is dropped (its process died)
+QUEUE_TIMEOUT_SECONDS = 3 * MAX_SLEEP_SECONDS
+
+# Shortest sleep of a request queued behind another
+QUEUE_POLL_SECONDS = 0.05
+
+# gpt-4o vision pricing: base tokens + tokens per 512px tile (high detail)
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+
+
+# ============================================================================
+# TOKEN ESTIMATION
+# ============================================================================
+
+def png_size_from_data_url(url: str) -> Optional[tuple]:
+    """
+    Read width/height from a base64 PNG data URL without decoding the image
+
+    Returns:
+        (width, height) or None if the URL is not a PNG data URL
+    """
+    _, _, data = url.partition("base64,")
+    try:
+        header = base64.b64decode(data[:32])  # 24 bytes: signature + IHDR
+    except (ValueError, TypeError):
+        return None
+    if len(header) < 24 or header[:8] != b"\x89PNG\r\n\x1a\n":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """
+    Estimate prompt tokens for one image (OpenAI vision sizing rules)
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        detail: low|high|auto (auto is treated as high)
+
+    Returns:
+        Token count
+    """
+    if detail == "low":
+        return IMAGE_BASE_TOKENS
+
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * tiles
+
+
+def estimate_prompt_tokens(messages: List[Dict]) -> int:
+    """
+    Estimate prompt tokens of chat messages (~4 characters per text token)
+
+    Args:
+        messages: Chat messages
+
+    Returns:
+        Token count
+    """
+    tokens = 0
+    for message in messages:
+        tokens += 4  # Per-message overhead
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += len(part["text"]) // 4
+            elif part.get("type") == "image_url":
+                image_url = part["image_url"]
+                url = image_url["url"]
+                if isinstance(url, ImagePayload):
+                    size = (url.width, url.height)
+                else:
+                    size = png_size_from_data_url(url)
+                if size is None:
+                    size = (2048, 2048)  # Unknown format: assume the largest
+                tokens += estimate_image_tokens(*size, detail=image_url.get("detail", "auto"))
+    return tokens
+
+
+def estimate_request_tokens(messages: List[Dict], params: Dict) -> int:
+    """
+    Estimate the tokens a request counts against TPM
+    (prompt estimate + max_tokens, which OpenAI reserves up front)
+    """
+    return estimate_prompt_tokens(messages) + int(params.get("max_tokens") or 0)
+
+
+# ============================================================================
+# SHARED TOKEN BUCKET
+# ============================================================================
+
+class RateLimiter:
+    """
+    Requests/minute + tokens/minute token buckets in a locked JSON state file
+
+    Both buckets start full and refill continuously at limit/60 per second.
+    A limit of 0 disables that bucket. Requests that have to wait join a FIFO
+    queue in the state file; only its first request may take capacity.
+    """
+
+    def __init__(self, state_path: str, rpm: int, tpm: int):
+        self.state_path = state_path
+        self.lock_path = f"{state_path}.lock"
+        self.rpm = rpm
+        self.tpm = tpm
+        self._thread_lock = threading.Lock()
+        os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+
+    @contextmanager
+    def _locked_state(self):
+        # Thread lock first (flock is per open file, not per thread), then the file lock
+        with self._thread_lock:
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    state = self._read_state()
+                    yield state
+                    self._write_state(state)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_state(self) -> Dict:
+        now = time.time()
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {"requests": self.rpm, "tokens": self.tpm, "updated": now, "paused_until": 0}
+
+        # Refill for the time since the last update (capped at bucket size)
+        elapsed = max(0.0, now - state["updated"])
+        state["requests"] = min(self.rpm, state["requests"] + elapsed * self.rpm / 60)
+        state["tokens"] = min(self.tpm, state["tokens"] + elapsed * self.tpm / 60)
+        state["updated"] = now
+        return state
+
+    def _write_state(self, state: Dict):
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _capacity_wait(self, state: Dict, tokens: int) -> float:
+        """Seconds until both buckets can cover a request (0 = now)"""
+        now = state["updated"]
+        if state["paused_until"] > now:
+            return state["paused_until"] - now
+
+        # A request bigger than the whole bucket waits for a full bucket, then
+        # goes into token debt that the requests after it wait out
+        needed = min(tokens, self.tpm)
+
+        wait = 0.0
+        if self.rpm and state["requests"] < 1:
+            wait = max(wait, (1 - state["requests"]) * 60 / self.rpm)
+        if self.tpm and state["tokens"] < needed:
+            wait = max(wait, (needed - state["tokens"]) * 60 / self.tpm)
+        return wait
+
+    def _try_acquire(self, tokens: int, ticket: str) -> float:
+        """
+        Take capacity for one request if available and no earlier request is waiting
+
+        Args:
+            tokens: Estimated tokens for the request
+            ticket: ID of this request's place in the queue (same on every retry)
+
+        Returns:
+            0 if acquired, otherwise seconds to wait before trying again
+        """
+        with self._locked_state() as state:
+            now = state["updated"]
+            queue = [
+                entry for entry in state.get("queue", [])
+                if entry["ticket"] == ticket or entry["expires"] > now
+            ]
+            state["queue"] = queue
+            position = next((i for i, entry in enumerate(queue) if entry["ticket"] == ticket), None)
+
+            if queue and position != 0:
+                # Behind an earlier request: wait at least until it expects capacity
+                wait = max(QUEUE_POLL_SECONDS, queue[0].get("ready_at", now) - now)
+            else:
+                wait = self._capacity_wait(state, tokens)
+
+            if wait > 0:
+                if position is None:
+                    queue.append({"ticket": ticket})
+                    position = len(queue) - 1
+                entry = queue[position]
+                entry["expires"] = now + QUEUE_TIMEOUT_SECONDS
+                if position == 0:
+                    entry["ready_at"] = now + wait
+                return wait
+
+            if position == 0:
+                queue.pop(0)
+            if self.rpm:
+                state["requests"] -= 1
+            if self.tpm:
+                state["tokens"] -= tokens
+            return 0.0
+
+    def acquire(self, tokens: int, label: str = "request") -> float:
+        """
+        Block until the request fits within both limits
+
+        Args:
+            tokens: Estimated tokens for the request
+            label: Call label for logs
+
+        Returns:
+            Seconds spent waiting
+        """
+        started = time.perf_counter()
+        ticket = uuid.uuid4().hex
+        while True:
+            wait = self._try_acquire(tokens, ticket)
+            if wait <= 0:
+                break
+            time.sleep(min(wait, MAX_SLEEP_SECONDS))
+
+        waited = time.perf_counter() - started
+        if waited >= 1:
+            logger.info(f"{label}: waited {waited:.1f}s for rate limit capacity ({tokens} tokens)")
+        return waited
+
+    async def acquire_async(self, tokens: int, label: str = "request") -> float:
+        """Async variant of acquire() (locks the state file and sleeps off the event loop)"""
+        started = time.perf_counter()
+        ticket = uuid.uuid4().hex
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, tokens, ticket)
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, MAX_SLEEP_SECONDS))
+
+        waited = time.perf_counter() - started
+        if waited >= 1:
+            logger.info(f"{label}: waited {waited:.1f}s for rate limit capacity ({tokens} tokens)")
+        return waited
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """
+        Return over-estimated tokens to the bucket (or charge the shortfall)
+
+        Args:
+            estimated_tokens: Tokens taken by acquire()
+            actual_tokens: Tokens reported by the API (None = keep the estimate)
+        """
+        if not self.tpm or actual_tokens is None:
+            return
+        with self._locked_state() as state:
+            state["tokens"] = min(self.tpm, state["tokens"] + estimated_tokens - actual_tokens)
+
+    def pause(self, seconds: float):
+        """Stop all processes from sending for `seconds` (after a 429)"""
+        with self._locked_state() as state:
+            state["paused_until"] = max(state["paused_until"], state["updated"] + seconds)
+            # The server says we're over: assume both buckets are empty
+            state["requests"] = min(state["requests"], 0)
+            state["tokens"] = min(state["tokens"], 0)
+        logger.warning(f"Rate limited by the API, pausing requests for {seconds:.1f}s")
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def model_limits(model: str) -> tuple:
+    """(requests/minute, tokens/minute) for a model: OPENAI_MODEL_RATE_LIMITS, else the global limits"""
+    return OPENAI_MODEL_RATE_LIMITS.get(model, (OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT))
+
+
+def get_limiter(model: str = OPENAI_MODEL) -> Optional[RateLimiter]:
+    """
+    Get the shared limiter for a model
+
+    Each model has its own state file and budget (see model_limits), as OpenAI
+    limits each model separately.
+
+    Returns:
+        RateLimiter, or None when the model's RPM and TPM limits are both 0
+    """
+    rpm_limit, tpm_limit = model_limits(model)
+    if rpm_limit <= 0 and tpm_limit <= 0:
+        return None
+
+    with _limiters_lock:
+        if model not in _limiters:
+            safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", model)  # Fine-tuned names contain ':'
+            state_path = os.path.join(RATE_LIMIT_STATE_DIR, f"openai_{safe_name}.json")
+            _limiters[model] = RateLimiter(state_path, rpm_limit, tpm_limit)
+        return _limiters[model]
+
+
+def retry_after_seconds(error: Exception, attempt: int) -> float:
+    """
+    Seconds to pause after a 429: the server's retry-after header if present,
+    else exponential backoff (1, 2, 4, ... capped at 60)
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ["retry-after-ms", "retry-after"]:
+        value = headers.get(header)
+        if value:
+            try:
+                seconds = float(value)
+                return seconds / 1000 if header == "retry-after-ms" else seconds
+            except ValueError:
+                pass
+    return min(60.0, 2.0 ** (attempt - 1))
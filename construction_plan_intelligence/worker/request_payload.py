@@ -0,0 +1,169 @@
+"""
+Request Payload Module
+Builds chat completion request bodies without holding every page image in memory
+
+Images in messages are ImagePayload placeholders backed by PNG files on disk.
+The request body is serialized as a byte stream: JSON text around the images,
+and each image base64-encoded from its file in fixed-size chunks. Peak memory is
+one chunk per image (plus the page being resized), not the whole request.
+"""
+
+import base64
+import hashlib
+import json
+import re
+import struct
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from PIL import Image
+
+DATA_URL_PREFIX = b"data:image/png;base64,"
+
+# Raw bytes per base64 chunk (multiple of 3, so chunks concatenate cleanly)
+READ_CHUNK_BYTES = 3 * 64 * 1024
+
+
+class ImagePayload:
+    """
+    A PNG file referenced from chat messages in place of a data URL
+
+    Attributes:
+        path: PNG file path
+        width, height: Image size in pixels
+        nbytes: PNG file size
+        sha256: Hex digest of the PNG bytes (stable request identity)
+    """
+
+    def __init__(self, path: str, width: int, height: int, nbytes: int, sha256: str):
+        self.path = str(path)
+        self.width = width
+        self.height = height
+        self.nbytes = nbytes
+        self.sha256 = sha256
+
+    @classmethod
+    def from_file(cls, path: str) -> "ImagePayload":
+        """Reference an existing PNG file (read once, in chunks, for its digest)"""
+        digest = hashlib.sha256()
+        nbytes = 0
+        header = b""
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_BYTES), b""):
+                if not header:
+                    header = chunk[:24]
+                digest.update(chunk)
+                nbytes += len(chunk)
+
+        if header[:8] != b"\x89PNG\r\n\x1a\n":
+            raise ValueError(f"Not a PNG file: {path}")
+        width, height = struct.unpack(">II", header[16:24])
+        return cls(path, width, height, nbytes, digest.hexdigest())
+
+    @classmethod
+    def from_image(cls, img: Image.Image, path: str) -> "ImagePayload":
+        """Save an in-memory image as PNG and reference the file"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        img.save(path, "PNG", optimize=False)
+        return cls.from_file(path)
+
+    @property
+    def url_length(self) -> int:
+        """Length of the equivalent data URL"""
+        return len(DATA_URL_PREFIX) + 4 * ((self.nbytes + 2) // 3)
+
+    def iter_data_url(self) -> Iterator[bytes]:
+        """Yield the data URL in chunks, base64-encoding the file as it is read"""
+        yield DATA_URL_PREFIX
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_BYTES), b""):
+                yield base64.b64encode(chunk)
+
+    def data_url(self) -> str:
+        """Full data URL string (materializes the whole image; prefer iter_data_url)"""
+        return b"".join(self.iter_data_url()).decode("ascii")
+
+    def __repr__(self) -> str:
+        return f"ImagePayload({self.path!r}, {self.width}x{self.height}, {self.nbytes} bytes)"
+
+
+def _encode_with_markers(obj: Any):
+    """
+    JSON-encode obj with each ImagePayload replaced by a unique marker string
+
+    Returns:
+        (json_text, marker_pattern, {marker: ImagePayload})
+    """
+    token = uuid.uuid4().hex
+    images: Dict[str, ImagePayload] = {}
+
+    def default(value):
+        if isinstance(value, ImagePayload):
+            marker = f"@image-{token}-{len(images)}@"
+            images[marker] = value
+            return marker
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    text = json.dumps(obj, default=default)
+    pattern = re.compile(f'"(@image-{token}-\\d+@)"')
+    return text, pattern, images
+
+
+def iter_json_bytes(obj: Any) -> Iterator[bytes]:
+    """
+    Serialize obj as JSON bytes, streaming ImagePayload values as data URLs
+
+    Args:
+        obj: JSON-serializable object that may contain ImagePayload values
+
+    Yields:
+        Chunks of the UTF-8 JSON document
+    """
+    text, pattern, images = _encode_with_markers(obj)
+
+    position = 0
+    for match in pattern.finditer(text):
+        yield text[position:match.start()].encode("utf-8")
+        yield b'"'
+        yield from images[match.group(1)].iter_data_url()
+        yield b'"'
+        position = match.end()
+    yield text[position:].encode("utf-8")
+
+
+def json_length(obj: Any) -> int:
+    """Byte length of iter_json_bytes(obj) without encoding any image"""
+    text, pattern, images = _encode_with_markers(obj)
+    return (
+        len(text.encode("utf-8"))
+        - sum(len(marker) for marker in images)
+        + sum(image.url_length for image in images.values())
+    )
+
+
+def json_digest_default(value):
+    """json.dumps default= hook that identifies images by content digest"""
+    if isinstance(value, ImagePayload):
+        return f"sha256:{value.sha256}"
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def materialize(messages: List[Dict]) -> List[Dict]:
+    """
+    Copy messages with every ImagePayload replaced by its data URL string
+    (for clients that need plain JSON; holds all images in memory)
+    """
+    result = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                url = part.get("image_url", {}).get("url") if part.get("type") == "image_url" else None
+                if isinstance(url, ImagePayload):
+                    part = {**part, "image_url": {**part["image_url"], "url": url.data_url()}}
+                parts.append(part)
+            message = {**message, "content": parts}
+        result.append(message)
+    return result
@@ -131,3 +131,37 @@ def should_process_all_pages(categorized_pages: Dict[str, List[int]]) -> bool:
         return True
 
     return False
+
+
+def group_pages_for_extraction(
+    categorized_pages: Dict[str, List[int]],
+    priority_pages: List[int]
+) -> Dict[str, List[int]]:
+    """
+    Split the pages to analyze into extraction groups (one request per group chunk)
+    Each page goes to its highest-priority category: schedule > legend > floor_plan.
+    Pages that matched no category (e.g., all-pages fallback) go to "other".
+
+    Args:
+        categorized_pages: Output from select_relevant_pages()
+        priority_pages: Pages selected for analysis, in priority order
+
+    Returns:
+        Dictionary mapping group name -> page numbers (in priority order)
+    """
+    groups = {"schedule": [], "legend": [], "floor_plan": [], "other": []}
+
+    for page in priority_pages:
+        for category in ["schedule", "legend", "floor_plan"]:
+            if page in categorized_pages.get(category, []):
+                groups[category].append(page)
+                break
+        else:
+            groups["other"].append(page)
+
+    # Drop empty groups
+    groups = {name: pages for name, pages in groups.items() if pages}
+
+    logger.info(f"Extraction groups: {groups}")
+
+    return groups
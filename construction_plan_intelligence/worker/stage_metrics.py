@@ -0,0 +1,157 @@
+"""
+Stage Metrics Module
+Prometheus metrics for the worker: per-stage latency histograms, job / page /
+byte / token counters, and queue depth and in-flight gauges
+
+Served over HTTP by start_metrics_server() when METRICS_PORT is set. Without
+prometheus_client installed every helper is a no-op.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:  # Optional: metrics are disabled
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Stages timed by stage_timer() (label values of plan_worker_stage_seconds)
+STAGES = [
+    "download",         # Input file from storage
+    "render_page",      # One PDF page to PNG (+ pyramid levels)
+    "text_extraction",  # Page text for selection
+    "selection",        # Page selection and grouping
+    "pass1",            # Extraction passes (from openai_extract per-pass metrics)
+    "escalation",
+    "pass2",
+    "validation",       # Schema validation + repair
+    "upload",           # Artifact uploads + records
+    "save",             # Analysis, metrics and final status
+]
+
+# Seconds: per-page renders (~0.1 s) up to multi-minute extraction passes
+STAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+if prometheus_client is not None:
+    STAGE_SECONDS = Histogram(
+        "plan_worker_stage_seconds", "Time spent per pipeline stage", ["stage"], buckets=STAGE_BUCKETS
+    )
+    JOBS = Counter("plan_worker_jobs_total", "Jobs finished, by final status", ["status"])
+    PAGES = Counter("plan_worker_pages_total", "Pages rendered / sent for analysis", ["kind"])
+    BYTES = Counter("plan_worker_bytes_total", "Bytes transferred to/from storage", ["direction"])
+    TOKENS = Counter("plan_worker_tokens_total", "Model tokens used", ["model", "pass", "type"])
+    QUEUE_DEPTH = Gauge("plan_worker_queue_depth", "Queued jobs (read on scrape)")
+    JOBS_IN_FLIGHT = Gauge("plan_worker_jobs_in_flight", "Jobs being processed by this worker")
+
+
+def enabled() -> bool:
+    return prometheus_client is not None
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record one stage duration"""
+    if prometheus_client is not None:
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time the enclosed block as `stage` (also recorded when it raises)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def count_job(status: str):
+    """Count a finished job (completed | needs_review | failed)"""
+    if prometheus_client is not None:
+        JOBS.labels(status).inc()
+
+
+def count_pages(kind: str, count: int):
+    """Count pages (rendered | analyzed)"""
+    if prometheus_client is not None and count:
+        PAGES.labels(kind).inc(count)
+
+
+def count_bytes(direction: str, num_bytes: int):
+    """Count storage bytes (download | upload)"""
+    if prometheus_client is not None and num_bytes:
+        BYTES.labels(direction).inc(num_bytes)
+
+
+def record_passes(job_metrics: Optional[Dict]):
+    """
+    Record extraction pass durations and tokens from a job's metrics
+
+    Args:
+        job_metrics: openai_extract.summarize_job() output; skipped passes
+            (cache hit, local audit, ...) record tokens only
+    """
+    if prometheus_client is None or not job_metrics:
+        return
+    for pass_name, pass_metrics in (job_metrics.get("passes") or {}).items():
+        if not pass_metrics.get("skipped"):
+            observe_stage(pass_name, pass_metrics.get("wall_time_s") or 0)
+        for token_type in ["prompt", "completion"]:
+            tokens = pass_metrics.get(f"{token_type}_tokens") or 0
+            if tokens:
+                TOKENS.labels(pass_metrics.get("model") or "unknown", pass_name, token_type).inc(tokens)
+
+
+@contextmanager
+def job_in_flight():
+    """Count the enclosed block as an in-flight job"""
+    if prometheus_client is None:
+        yield
+        return
+    with JOBS_IN_FLIGHT.track_inprogress():
+        yield
+
+
+def set_queue_depth_source(read_depth: Callable[[], Optional[int]]):
+    """
+    Read the queue depth gauge from `read_depth` on each scrape
+
+    Args:
+        read_depth: Returns the queued job count (None / errors report NaN)
+    """
+    if prometheus_client is None:
+        return
+
+    def read() -> float:
+        try:
+            depth = read_depth()
+        except Exception as e:
+            logger.warning(f"Failed to read queue depth: {e}")
+            depth = None
+        return float("nan") if depth is None else float(depth)
+
+    QUEUE_DEPTH.set_function(read)
+
+
+def start_metrics_server(port: int, addr: str = "0.0.0.0") -> bool:
+    """
+    Serve /metrics in Prometheus text format from a background thread
+
+    Returns:
+        True if the server was started
+    """
+    if prometheus_client is None:
+        logger.warning("METRICS_PORT is set but prometheus_client is not installed; metrics disabled")
+        return False
+    prometheus_client.start_http_server(port, addr=addr)
+    logger.info(f"Serving Prometheus metrics on {addr}:{port}/metrics")
+    return True
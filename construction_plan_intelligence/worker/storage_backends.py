@@ -0,0 +1,290 @@
+"""
+Storage Backends
+Pluggable object storage for supabase_io (downloads of plans, artifact uploads):
+
+- supabase: Supabase Storage through the shared client (default)
+- local:    a directory tree (LOCAL_STORAGE_DIR/<bucket>/<path>) with injected
+            per-request latency and a shared bandwidth limit, for offline
+            benchmarking of upload concurrency and download streaming
+
+Select with STORAGE_BACKEND.
+"""
+
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from config import (
+    STORAGE_BACKEND,
+    LOCAL_STORAGE_DIR,
+    LOCAL_STORAGE_LATENCY,
+    LOCAL_STORAGE_BANDWIDTH_MBIT,
+    SYNTHETIC_SEED,
+)
+from latency import parse_latency_spec
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectExistsError(FileExistsError):
+    """Raised by upload() when the path is already stored"""
+
+
+class StorageBackend(ABC):
+    """
+    Backend interface (paths are relative to a bucket)
+
+    size() / exists() read object metadata without transferring it. stream()
+    is a context manager yielding (size or None, iterator of chunks). upload()
+    stores a local file and raises ObjectExistsError if the path is taken
+    (objects are never replaced).
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def size(self, bucket: str, path: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def exists(self, bucket: str, path: str) -> bool:
+        ...
+
+    @abstractmethod
+    def stream(self, bucket: str, path: str, chunk_size: int):
+        ...
+
+    @abstractmethod
+    def upload(
+        self,
+        bucket: str,
+        path: str,
+        local_file_path: str,
+        content_type: str,
+        cache_control: Optional[str] = None
+    ):
+        ...
+
+
+# ============================================================================
+# SUPABASE
+# ============================================================================
+
+class SupabaseStorage(StorageBackend):
+    """Supabase Storage over the storage client's pooled keep-alive HTTP session"""
+
+    name = "supabase"
+
+    @property
+    def storage(self):
+        import supabase_io  # Shares the process-wide client (and its connection pool)
+        return supabase_io.get_client().storage
+
+    def _head(self, bucket: str, path: str):
+        return self.storage.session.head(f"object/{bucket}/{path}")
+
+    def size(self, bucket: str, path: str) -> Optional[int]:
+        response = self._head(bucket, path)
+        if response.status_code != 200:
+            return None
+        length = response.headers.get("content-length")
+        return int(length) if length and length.isdigit() else None
+
+    def exists(self, bucket: str, path: str) -> bool:
+        return self._head(bucket, path).status_code == 200
+
+    @contextmanager
+    def stream(self, bucket: str, path: str, chunk_size: int) -> Iterator[Tuple[Optional[int], Iterator[bytes]]]:
+        with self.storage.session.stream("GET", f"object/{bucket}/{path}") as response:
+            response.raise_for_status()
+            length = response.headers.get("content-length")
+            yield (int(length) if length and length.isdigit() else None), response.iter_bytes(chunk_size)
+
+    def upload(
+        self,
+        bucket: str,
+        path: str,
+        local_file_path: str,
+        content_type: str,
+        cache_control: Optional[str] = None
+    ):
+        file_options = {"upsert": "false", "content-type": content_type}
+        if cache_control:
+            file_options["cache-control"] = cache_control
+
+        with open(local_file_path, "rb") as f:
+            try:
+                self.storage.from_(bucket).upload(path, f, file_options)
+            except Exception as e:
+                message = str(e)
+                if "Duplicate" in message or "already exists" in message:
+                    raise ObjectExistsError(f"{bucket}/{path}") from e
+                raise
+
+
+# ============================================================================
+# LOCAL FILESYSTEM
+# ============================================================================
+
+class BandwidthThrottle:
+    """
+    One shared link: transfers from all threads queue for bytes/second capacity,
+    so adding concurrency stops helping once the link is saturated
+    """
+
+    def __init__(self, megabits_per_second: float):
+        self.bytes_per_second = megabits_per_second * 1_000_000 / 8
+        self._next_free = 0.0
+        self._lock = threading.Lock()
+
+    def consume(self, num_bytes: int):
+        """Block until num_bytes have passed through the link"""
+        if self.bytes_per_second <= 0 or num_bytes <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + num_bytes / self.bytes_per_second
+            wait = self._next_free - now
+        time.sleep(wait)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Objects as files under root/<bucket>/<path>
+
+    Every request (HEAD, GET, upload) first sleeps a sampled latency; bytes
+    transferred then pass through a shared bandwidth throttle.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        root: str = LOCAL_STORAGE_DIR,
+        latency: str = LOCAL_STORAGE_LATENCY,
+        bandwidth_mbit: float = LOCAL_STORAGE_BANDWIDTH_MBIT,
+        seed: int = SYNTHETIC_SEED
+    ):
+        self.root = Path(root)
+        self.sample_latency = parse_latency_spec(latency)
+        self.throttle = BandwidthThrottle(bandwidth_mbit)
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _path(self, bucket: str, path: str) -> Path:
+        full_path = (self.root / bucket / path).resolve()
+        if not full_path.is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid storage path: {bucket}/{path}")
+        return full_path
+
+    def _request(self):
+        with self._lock:
+            latency = self.sample_latency(self.rng)
+        time.sleep(latency)
+
+    def size(self, bucket: str, path: str) -> Optional[int]:
+        self._request()
+        try:
+            return self._path(bucket, path).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def exists(self, bucket: str, path: str) -> bool:
+        self._request()
+        return self._path(bucket, path).is_file()
+
+    @contextmanager
+    def stream(self, bucket: str, path: str, chunk_size: int) -> Iterator[Tuple[Optional[int], Iterator[bytes]]]:
+        self._request()
+        with open(self._path(bucket, path), "rb") as f:
+            def chunks():
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    self.throttle.consume(len(chunk))
+                    yield chunk
+            yield os.fstat(f.fileno()).st_size, chunks()
+
+    def upload(
+        self,
+        bucket: str,
+        path: str,
+        local_file_path: str,
+        content_type: str,
+        cache_control: Optional[str] = None
+    ):
+        self._request()
+        target = self._path(bucket, path)
+        if target.exists():
+            raise ObjectExistsError(f"{bucket}/{path}")
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+        try:
+            with open(local_file_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                    self.throttle.consume(len(chunk))
+                    dst.write(chunk)
+            # link() fails if the path was stored meanwhile: never overwrite
+            os.link(tmp_path, target)
+        except FileExistsError as e:
+            raise ObjectExistsError(f"{bucket}/{path}") from e
+        finally:
+            Path(tmp_path).unlink(missing_ok=True)
+
+    def put(self, bucket: str, path: str, local_file_path: str):
+        """Store a file without latency or throttling (seeding benchmark inputs)"""
+        target = self._path(bucket, path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(local_file_path, target)
+
+
+# ============================================================================
+# SELECTION
+# ============================================================================
+
+_storage: Optional[StorageBackend] = None
+_storage_pid: Optional[int] = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(name: str = STORAGE_BACKEND) -> StorageBackend:
+    """
+    Create a storage backend by name (supabase|local)
+
+    Raises:
+        ValueError: On an unknown backend name
+    """
+    if name == "supabase":
+        return SupabaseStorage()
+    if name == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown storage backend: {name!r}")
+
+
+def get_storage() -> StorageBackend:
+    """Get the process-wide storage backend (created on first use, per process)"""
+    global _storage, _storage_pid
+    pid = os.getpid()
+    if _storage is None or _storage_pid != pid:
+        with _storage_lock:
+            if _storage is None or _storage_pid != pid:
+                _storage = create_storage()
+                _storage_pid = pid
+                logger.info(f"Using storage backend: {_storage.name}")
+    return _storage
+
+
+def set_storage(storage: Optional[StorageBackend]):
+    """Replace the process-wide storage backend (None resets to the configured one)"""
+    global _storage, _storage_pid
+    with _storage_lock:
+        _storage = storage
+        _storage_pid = os.getpid()
@@ -3,17 +3,90 @@ Supabase I/O Module
 Handles database and storage operations
 """
 
+import hashlib
 import logging
-from typing import Optional, List, Dict
-from supabase import create_client, Client
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional, List, Dict, Tuple
 from pathlib import Path
 
-from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+import config
+import postgres_io
+import stage_metrics
+import tracing
+from storage_backends import ObjectExistsError, get_storage
+from config import (
+    ARTIFACT_UPLOAD_CONCURRENCY,
+    MAX_FILE_SIZE_MB,
+)
+
+if TYPE_CHECKING:
+    from supabase import Client  # Imported in get_client(): the package is slow to load
 
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase client with service role (bypass RLS)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+# Bytes per chunk when streaming downloads
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Oldest queued jobs a PostgREST worker tries to claim per poll
+CLAIM_CANDIDATES = 5
+
+
+class FileTooLargeError(ValueError):
+    """Raised when a stored file exceeds MAX_FILE_SIZE_MB"""
+
+
+# ============================================================================
+# CLIENT
+# ============================================================================
+
+_client: Optional["Client"] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> "Client":
+    """
+    Get the Supabase client (service role, bypasses RLS), created on first use
+
+    Cached per process: a forked child builds its own instead of sharing the
+    parent's pooled connections.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                from supabase import create_client
+                _client = create_client(config.SUPABASE_URL, config.SUPABASE_SERVICE_ROLE_KEY)
+                _client_pid = pid
+    return _client
+
+
+def __getattr__(name: str):
+    # Backwards compatible `supabase_io.supabase`
+    if name == "supabase":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@contextmanager
+def transaction():
+    """
+    Group the enclosed job/metadata writes into one database transaction
+
+    Only with direct Postgres (DATABASE_URL, see postgres_io); over PostgREST
+    each operation remains its own request.
+    """
+    if not postgres_io.enabled():
+        yield
+        return
+    with postgres_io.transaction():
+        yield
 
 
 # ============================================================================
@@ -39,11 +112,15 @@ def update_job_status(
     logger.info(f"Updating job {job_id} status to: {status}")
 
     try:
+        if postgres_io.enabled():
+            postgres_io.update_job_status(job_id, status, error)
+            return True
+
         update_data = {"status": status}
         if error:
             update_data["error"] = error
 
-        supabase.table("plan_jobs").update(update_data).eq("id", job_id).execute()
+        get_client().table("plan_jobs").update(update_data).eq("id", job_id).execute()
 
         return True
 
@@ -54,27 +131,41 @@ def update_job_status(
 
 def get_next_job() -> Optional[Dict]:
     """
-    Get the next queued job to process
+    Claim the next queued job and mark it processing
+
+    Over PostgREST the claim is a conditional update (status still queued), so
+    a job taken by another worker or a batch claim meanwhile is skipped.
 
     Returns:
         Job dict or None if no jobs available
     """
     try:
-        response = supabase.table("plan_jobs") \
-            .select("*") \
+        if postgres_io.enabled():
+            # Claim and mark processing in one statement (safe with many workers)
+            job = postgres_io.claim_next_job()
+            if job:
+                logger.info(f"Claimed queued job: {job['id']}")
+            return job
+
+        response = get_client().table("plan_jobs") \
+            .select("id") \
             .eq("status", "queued") \
             .order("created_at") \
-            .limit(1) \
+            .limit(CLAIM_CANDIDATES) \
             .execute()
 
-        if response.data and len(response.data) > 0:
-            job = response.data[0]
-            logger.info(f"Found queued job: {job['id']}")
-
-            # Immediately mark as processing to prevent duplicate processing
-            update_job_status(job['id'], 'processing')
-
-            return job
+        for candidate in response.data or []:
+            # Conditional update: only one worker (or batch claim) gets each job
+            claimed = get_client().table("plan_jobs") \
+                .update({"status": "processing"}) \
+                .eq("id", candidate["id"]) \
+                .eq("status", "queued") \
+                .execute()
+            if claimed.data:
+                job = claimed.data[0]
+                logger.info(f"Claimed queued job: {job['id']}")
+                return job
+            logger.debug(f"Job {candidate['id']} was claimed by another worker")
 
         return None
 
@@ -83,20 +174,207 @@ def get_next_job() -> Optional[Dict]:
         return None
 
 
+def claim_jobs(jobs: List[Dict]) -> List[Dict]:
+    """
+    Mark listed jobs processing, each only if its status is still the one it was
+    listed with (e.g., for batch extraction)
+
+    A worker may claim a queued job between list_jobs() and this call; such jobs,
+    and jobs listed as processing, are left out.
+
+    Args:
+        jobs: Job dicts (from list_jobs)
+
+    Returns:
+        The claimed jobs as passed in (job["status"] is their status before the
+        claim); empty on error
+    """
+    candidates = [job for job in jobs if job["status"] != "processing"]
+    if not candidates:
+        return []
+
+    try:
+        if postgres_io.enabled():
+            claimed_ids = set(postgres_io.claim_jobs(candidates))
+        else:
+            claimed_ids = set()
+            for status in sorted({job["status"] for job in candidates}):
+                response = get_client().table("plan_jobs") \
+                    .update({"status": "processing"}) \
+                    .in_("id", [job["id"] for job in candidates if job["status"] == status]) \
+                    .eq("status", status) \
+                    .execute()
+                claimed_ids.update(row["id"] for row in response.data or [])
+
+        return [job for job in candidates if job["id"] in claimed_ids]
+
+    except Exception as e:
+        logger.error(f"Failed to claim jobs: {e}")
+        return []
+
+
+def list_jobs(
+    status: Optional[str] = None,
+    job_ids: Optional[List[str]] = None,
+    limit: int = 100
+) -> List[Dict]:
+    """
+    List jobs (oldest first), e.g. for batch re-analysis
+
+    Args:
+        status: Optional status filter
+        job_ids: Optional explicit job IDs
+        limit: Maximum number of jobs
+
+    Returns:
+        List of job dicts (empty on error)
+    """
+    try:
+        if postgres_io.enabled():
+            return postgres_io.list_jobs(status=status, job_ids=job_ids, limit=limit)
+
+        query = get_client().table("plan_jobs").select("*")
+        if status:
+            query = query.eq("status", status)
+        if job_ids:
+            query = query.in_("id", job_ids)
+
+        response = query.order("created_at").limit(limit).execute()
+        return response.data or []
+
+    except Exception as e:
+        logger.error(f"Failed to list jobs: {e}")
+        return []
+
+
+def count_jobs(status: str = "queued") -> Optional[int]:
+    """
+    Count jobs with a status (e.g., queue depth for metrics)
+
+    Returns:
+        Job count, or None on error
+    """
+    try:
+        if postgres_io.enabled():
+            return postgres_io.count_jobs(status)
+
+        response = get_client().table("plan_jobs") \
+            .select("id", count="exact") \
+            .eq("status", status) \
+            .limit(1) \
+            .execute()
+        return response.count
+
+    except Exception as e:
+        logger.warning(f"Failed to count {status} jobs: {e}")
+        return None
+
+
 # ============================================================================
 # STORAGE OPERATIONS
 # ============================================================================
 
-def download_file(file_path: str, local_path: str) -> bool:
+def _check_size(file_path: str, size: Optional[int], max_bytes: int):
+    if size is not None and size > max_bytes:
+        raise FileTooLargeError(
+            f"File too large: {file_path} is {size / 1024 / 1024:.1f} MB "
+            f"(limit {max_bytes / 1024 / 1024:.0f} MB)"
+        )
+
+
+def get_object_size(file_path: str, bucket: str = "plans") -> Optional[int]:
     """
-    Download file from Supabase Storage
+    Read a stored object's size without downloading it
+
+    Returns:
+        Size in bytes, or None if the storage API did not report it
+    """
+    return get_storage().size(bucket, file_path)
+
+
+def object_exists(file_path: str, bucket: str = "plans") -> bool:
+    """Check whether an object is stored (HEAD request, nothing downloaded)"""
+    return get_storage().exists(bucket, file_path)
+
+
+def download_object(
+    file_path: str,
+    local_path: Optional[str] = None,
+    max_bytes: int = MAX_FILE_SIZE_MB * 1024 * 1024,
+    bucket: str = "plans"
+) -> Dict:
+    """
+    Stream an object from storage to disk (or memory), hashing it on the way
+
+    The size is checked before the download starts (HEAD, then the response's
+    Content-Length) and again while streaming, so an oversized object is never
+    fully read.
+
+    Args:
+        file_path: Path in bucket (e.g., "user_id/filename.pdf")
+        local_path: Local path to write; None keeps the bytes in memory
+        max_bytes: Maximum object size
+        bucket: Storage bucket
+
+    Returns:
+        {"size": bytes, "sha256": hex digest, "data": bytes (only if local_path is None)}
+
+    Raises:
+        FileTooLargeError: If the object is larger than max_bytes
+    """
+    _check_size(file_path, get_object_size(file_path, bucket), max_bytes)
+
+    digest = hashlib.sha256()
+    size = 0
+    chunks = [] if local_path is None else None
+    out = None
+
+    try:
+        with get_storage().stream(bucket, file_path, DOWNLOAD_CHUNK_BYTES) as (length, stream):
+            _check_size(file_path, length, max_bytes)
+
+            if local_path is not None:
+                Path(local_path).parent.mkdir(parents=True, exist_ok=True)
+                out = open(local_path, "wb")
+
+            for chunk in stream:
+                size += len(chunk)
+                _check_size(file_path, size, max_bytes)
+                digest.update(chunk)
+                if out is not None:
+                    out.write(chunk)
+                else:
+                    chunks.append(chunk)
+
+    except Exception:
+        if out is not None:
+            out.close()
+            Path(local_path).unlink(missing_ok=True)
+        raise
+
+    if out is not None:
+        out.close()
+    stage_metrics.count_bytes("download", size)
+
+    result = {"size": size, "sha256": digest.hexdigest()}
+    if chunks is not None:
+        result["data"] = b"".join(chunks)
+    return result
+
+
+def download_file(file_path: str, local_path: str) -> Optional[Dict]:
+    """
+    Download file from storage (streamed to disk, size-checked, hashed)
 
     Args:
         file_path: Path in storage (e.g., "plans/xxx.pdf")
         local_path: Local path to save file
 
     Returns:
-        True if successful
+        {"size": bytes, "sha256": hex digest} if successful, None otherwise
+
+    Raises:
+        FileTooLargeError: If the file exceeds MAX_FILE_SIZE_MB
     """
     logger.info(f"Downloading {file_path} to {local_path}")
 
@@ -106,21 +384,221 @@ def download_file(file_path: str, local_path: str) -> bool:
         bucket = "plans"
         path_in_bucket = file_path
 
-        # Download file
         logger.info(f"Downloading from bucket '{bucket}', path: '{path_in_bucket}'")
-        response = supabase.storage.from_(bucket).download(path_in_bucket)
+        result = download_object(path_in_bucket, local_path, bucket=bucket)
 
-        # Save to local file
-        Path(local_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(local_path, "wb") as f:
-            f.write(response)
+        logger.info(
+            f"Successfully downloaded {file_path} "
+            f"({result['size'] / 1024 / 1024:.1f} MB, sha256 {result['sha256'][:12]})"
+        )
+        return result
 
-        logger.info(f"Successfully downloaded {file_path}")
-        return True
+    except FileTooLargeError as e:
+        logger.error(str(e))
+        raise
 
     except Exception as e:
         logger.error(f"Failed to download file: {e}")
-        return False
+        return None
+
+
+def hash_file(local_file_path: str) -> Tuple[str, int]:
+    """
+    SHA-256 and size of a local file (read in chunks)
+
+    Returns:
+        (hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(local_file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_BYTES), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def artifact_storage_path(sha256: str, local_file_path: str) -> str:
+    """
+    Content-addressed storage path for an artifact blob, shared by every job
+    that produces identical bytes (e.g., artifacts/sha256/ab/abcd....png)
+    """
+    suffix = Path(local_file_path).suffix.lower()
+    return f"artifacts/sha256/{sha256[:2]}/{sha256}{suffix}"
+
+
+def _upload_to_storage(storage_path: str, local_file_path: str):
+    """
+    Upload a local file to the plans bucket, streaming it from disk
+
+    Goes through the configured storage backend (see storage_backends; the
+    Supabase one shares a pooled keep-alive session across upload threads).
+    Content-addressed blobs never change, so clients may cache them indefinitely.
+
+    Raises:
+        ObjectExistsError: If the path is already stored
+    """
+    content_type = mimetypes.guess_type(local_file_path)[0] or "application/octet-stream"
+    get_storage().upload("plans", storage_path, local_file_path, content_type, cache_control="31536000")
+
+
+def upload_artifacts(
+    job_id: str,
+    artifacts: List[Dict],
+    max_workers: int = ARTIFACT_UPLOAD_CONCURRENCY
+) -> List[Optional[str]]:
+    """
+    Upload many artifacts concurrently, then create all their records in one insert
+
+    Blobs are content-addressed (see artifact_storage_path): a blob already in
+    storage is not uploaded again, and records that already exist for the job
+    are reused, so retrying a job is idempotent.
+
+    Args:
+        job_id: UUID of the parent job
+        artifacts: List of artifact dicts:
+            {"kind": ..., "local_file_path": ..., "page_no": ... (optional), "meta": {...} (optional),
+             "levels": {level: {"local_file_path": ..., ...}} (optional)}
+            Levels (other resolutions, see pdf_to_images.write_pyramid) are
+            uploaded with the artifact and recorded in meta["levels"] as
+            {level: {"path": storage path, "sha256", "bytes", ...}}; a level
+            that fails to upload is left out.
+        max_workers: Maximum concurrent uploads
+
+    Returns:
+        Artifact ID for each input artifact (None where the upload or insert failed)
+    """
+    if not artifacts:
+        return []
+
+    # Every distinct local file once (an artifact's "full" level is the artifact itself)
+    local_paths = list(dict.fromkeys(
+        path
+        for artifact in artifacts
+        for path in [artifact["local_file_path"]] + [
+            level["local_file_path"] for level in (artifact.get("levels") or {}).values()
+        ]
+    ))
+
+    logger.info(
+        f"Uploading {len(artifacts)} artifacts ({len(local_paths)} files) for job {job_id} "
+        f"({max_workers} concurrent)"
+    )
+    started = time.perf_counter()
+    parent_span = tracing.current_span()  # Pool threads do not inherit the context
+
+    def upload(local_file_path: str) -> Optional[Dict]:
+        filename = Path(local_file_path).name
+        with tracing.span("upload_file", parent=parent_span, kind="client", file=filename) as span:
+            try:
+                sha256, size = hash_file(local_file_path)
+                storage_path = artifact_storage_path(sha256, local_file_path)
+                blob = {"path": storage_path, "sha256": sha256, "bytes": size, "uploaded": False}
+                span.set(path=storage_path, bytes=size)
+
+                if object_exists(storage_path):
+                    span.set(uploaded=False)
+                    return blob
+                try:
+                    _upload_to_storage(storage_path, local_file_path)
+                    blob["uploaded"] = True
+                except ObjectExistsError:
+                    pass  # Another job (or thread) stored the same bytes first
+                span.set(uploaded=blob["uploaded"])
+                return blob
+
+            except Exception as e:
+                logger.error(f"Failed to upload artifact {filename}: {e}")
+                span.record_error(e)
+                return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(local_paths)))) as pool:
+        uploads = dict(zip(local_paths, pool.map(upload, local_paths)))
+
+    blobs = [uploads[artifact["local_file_path"]] for artifact in artifacts]
+
+    artifact_ids: List[Optional[str]] = [None] * len(artifacts)
+
+    # Reuse records from an earlier attempt of this job
+    existing = {}
+    stored_paths = sorted({blob["path"] for blob in blobs if blob})
+    if stored_paths:
+        try:
+            if postgres_io.enabled():
+                records = postgres_io.find_artifacts(job_id, stored_paths)
+            else:
+                records = get_client().table("plan_job_artifacts") \
+                    .select("id, kind, page_no, artifact_path") \
+                    .eq("job_id", job_id) \
+                    .in_("artifact_path", stored_paths) \
+                    .execute().data
+            existing = {
+                (record["kind"], record["page_no"], record["artifact_path"]): record["id"]
+                for record in records or []
+            }
+        except Exception as e:
+            logger.warning(f"Failed to look up existing artifact records: {e}")
+
+    # One batched insert for every new record
+    rows = []
+    row_indexes = []
+    for index, (artifact, blob) in enumerate(zip(artifacts, blobs)):
+        if blob is None:
+            continue
+
+        key = (artifact["kind"], artifact.get("page_no"), blob["path"])
+        if key in existing:
+            artifact_ids[index] = existing[key]
+            continue
+
+        meta = {**(artifact.get("meta") or {}), "sha256": blob["sha256"], "bytes": blob["bytes"]}
+        if artifact.get("levels"):
+            meta["levels"] = {}
+            for level, info in artifact["levels"].items():
+                level_blob = uploads[info["local_file_path"]]
+                if level_blob is None:
+                    continue
+                meta["levels"][level] = {
+                    **{key: value for key, value in info.items() if key != "local_file_path"},
+                    "path": level_blob["path"],
+                    "sha256": level_blob["sha256"],
+                    "bytes": level_blob["bytes"],
+                }
+
+        artifact_data = {
+            "job_id": job_id,
+            "kind": artifact["kind"],
+            "artifact_path": blob["path"],
+            "meta": meta
+        }
+        if artifact.get("page_no") is not None:
+            artifact_data["page_no"] = artifact["page_no"]
+
+        rows.append(artifact_data)
+        row_indexes.append(index)
+
+    if rows:
+        try:
+            if postgres_io.enabled():
+                record_ids = postgres_io.insert_artifacts(rows)
+            else:
+                response = get_client().table("plan_job_artifacts").insert(rows).execute()
+                record_ids = [record["id"] for record in response.data or []]
+            for index, record_id in zip(row_indexes, record_ids):
+                artifact_ids[index] = record_id
+
+        except Exception as e:
+            logger.error(f"Failed to create artifact records: {e}")
+
+    stored = sum(1 for artifact_id in artifact_ids if artifact_id)
+    uploaded = [blob for blob in uploads.values() if blob and blob["uploaded"]]
+    stage_metrics.count_bytes("upload", sum(blob["bytes"] for blob in uploaded))
+    logger.info(
+        f"Stored {stored}/{len(artifacts)} artifacts in {time.perf_counter() - started:.1f}s "
+        f"({len(uploaded)} files uploaded, {sum(blob['bytes'] for blob in uploaded) / 1024 / 1024:.1f} MB; "
+        f"{sum(1 for blob in uploads.values() if blob) - len(uploaded)} already stored)"
+    )
+    return artifact_ids
 
 
 def upload_artifact(
@@ -143,44 +621,13 @@ def upload_artifact(
     Returns:
         Artifact ID if successful, None otherwise
     """
-    logger.info(f"Uploading artifact: {kind} for job {job_id}")
-
-    try:
-        # Generate storage path
-        filename = Path(local_file_path).name
-        storage_path = f"artifacts/{job_id}/{kind}/{filename}"
-
-        # Upload file to storage
-        with open(local_file_path, "rb") as f:
-            supabase.storage.from_("plans").upload(
-                storage_path,
-                f.read(),
-                {"upsert": "false"}
-            )
-
-        # Create database record
-        artifact_data = {
-            "job_id": job_id,
-            "kind": kind,
-            "artifact_path": storage_path,
-            "meta": meta or {}
-        }
-
-        if page_no is not None:
-            artifact_data["page_no"] = page_no
-
-        response = supabase.table("plan_job_artifacts").insert(artifact_data).execute()
-
-        if response.data and len(response.data) > 0:
-            artifact_id = response.data[0]["id"]
-            logger.info(f"Artifact uploaded: {artifact_id}")
-            return artifact_id
-
-        return None
-
-    except Exception as e:
-        logger.error(f"Failed to upload artifact: {e}")
-        return None
+    artifact = {
+        "kind": kind,
+        "local_file_path": local_file_path,
+        "page_no": page_no,
+        "meta": meta,
+    }
+    return upload_artifacts(job_id, [artifact], max_workers=1)[0]
 
 
 # ============================================================================
@@ -221,8 +668,14 @@ def save_analysis(
             "needs_review": needs_review
         }
 
-        response = supabase.table("plan_analyses") \
-            .upsert(analysis_data) \
+        if postgres_io.enabled():
+            analysis_id = postgres_io.save_analysis(**analysis_data)
+            logger.info(f"Analysis saved: {analysis_id}")
+            return analysis_id
+
+        # One analysis per job (uq_plan_analyses_job): re-analysis replaces it
+        response = get_client().table("plan_analyses") \
+            .upsert(analysis_data, on_conflict="job_id") \
             .execute()
 
         if response.data and len(response.data) > 0:
@@ -237,6 +690,107 @@ def save_analysis(
         return None
 
 
+def save_job_metrics(job_id: str, user_id: Optional[str], metrics: Dict) -> bool:
+    """
+    Save per-pass extraction metrics (plan_job_metrics, see database/job_metrics.sql)
+
+    Args:
+        job_id: UUID of the parent job
+        user_id: UUID of the job owner
+        metrics: Job metrics from openai_extract.summarize_job()
+
+    Returns:
+        True if successful
+    """
+    passes = metrics.get("passes") or {}
+    if not passes or not user_id:
+        return False
+
+    try:
+        rows = [
+            {
+                "job_id": job_id,
+                "user_id": user_id,
+                "pass": pass_name,
+                "model": pass_metrics["model"],
+                "calls": pass_metrics["calls"],
+                "prompt_tokens": pass_metrics["prompt_tokens"],
+                "completion_tokens": pass_metrics["completion_tokens"],
+                "total_tokens": pass_metrics["total_tokens"],
+                "image_count": pass_metrics["image_count"],
+                "payload_bytes": pass_metrics["payload_bytes"],
+                "wall_time_s": pass_metrics["wall_time_s"],
+                "cost_usd": pass_metrics["cost_usd"] or 0,
+                "skipped": pass_metrics["skipped"],
+                "batch": pass_metrics["batch"],
+            }
+            for pass_name, pass_metrics in passes.items()
+        ]
+
+        if postgres_io.enabled():
+            postgres_io.save_job_metrics(rows)
+        else:
+            get_client().table("plan_job_metrics") \
+                .upsert(rows, on_conflict="job_id,pass") \
+                .execute()
+
+        return True
+
+    except Exception as e:
+        # Metrics are best-effort (table may not be migrated yet)
+        logger.warning(f"Failed to save job metrics: {e}")
+        return False
+
+
+def save_job_memory(job_id: str, user_id: Optional[str], memory: Dict) -> bool:
+    """
+    Save a job's memory profile as its plan_job_metrics pass = 'job' row
+
+    Args:
+        job_id: UUID of the parent job
+        user_id: UUID of the job owner
+        memory: memory_profile.JobMemoryProfile.summary() output
+
+    Returns:
+        True if successful
+    """
+    if not memory or not user_id:
+        return False
+
+    row = {
+        "job_id": job_id,
+        "user_id": user_id,
+        "pass": "job",
+        "model": "n/a",
+        "calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "image_count": 0,
+        "payload_bytes": 0,
+        "wall_time_s": 0,
+        "cost_usd": 0,
+        "skipped": None,
+        "batch": False,
+        "peak_rss_mb": memory.get("peak_rss_mb"),
+        "memory": memory,
+    }
+
+    try:
+        if postgres_io.enabled():
+            postgres_io.save_job_metrics([row])
+        else:
+            get_client().table("plan_job_metrics") \
+                .upsert(row, on_conflict="job_id,pass") \
+                .execute()
+
+        return True
+
+    except Exception as e:
+        logger.warning(f"Failed to save job memory profile: {e}")
+        return False
+
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -244,7 +798,9 @@ def save_analysis(
 def job_exists(job_id: str) -> bool:
     """Check if a job exists"""
     try:
-        response = supabase.table("plan_jobs").select("id").eq("id", job_id).execute()
+        if postgres_io.enabled():
+            return postgres_io.job_exists(job_id)
+        response = get_client().table("plan_jobs").select("id").eq("id", job_id).execute()
         return response.data and len(response.data) > 0
     except:
         return False
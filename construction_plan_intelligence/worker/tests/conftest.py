@@ -0,0 +1,10 @@
+"""
+Pytest setup: worker modules import each other by bare name, so tests run with
+the worker directory on sys.path (run from construction_plan_intelligence/worker:
+python -m pytest tests)
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
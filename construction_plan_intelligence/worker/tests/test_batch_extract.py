@@ -0,0 +1,136 @@
+"""
+Batch extraction round trip against mock_batch_server (no network, no database)
+"""
+
+import functools
+import threading
+import uuid
+from contextlib import nullcontext
+
+import fitz  # PyMuPDF
+import pytest
+
+import batch_extract
+import config
+import mock_batch_server
+import postgres_io
+import storage_backends
+
+
+class FakeTables:
+    """In-memory plan_jobs / artifacts / analyses behind postgres_io"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.analyses = {}
+        self.metrics = []
+
+    def install(self, monkeypatch):
+        monkeypatch.setattr(postgres_io, "enabled", lambda: True)
+        monkeypatch.setattr(postgres_io, "transaction", nullcontext)
+        monkeypatch.setattr(postgres_io, "claim_jobs", self.claim_jobs)
+        monkeypatch.setattr(postgres_io, "update_job_status", self.update_job_status)
+        monkeypatch.setattr(postgres_io, "job_exists", lambda job_id: job_id in self.jobs)
+        monkeypatch.setattr(postgres_io, "find_artifacts", lambda job_id, paths: [])
+        monkeypatch.setattr(postgres_io, "insert_artifacts", lambda rows: [str(uuid.uuid4()) for _ in rows])
+        monkeypatch.setattr(postgres_io, "save_analysis", self.save_analysis)
+        monkeypatch.setattr(postgres_io, "save_job_metrics", self.metrics.extend)
+
+    def claim_jobs(self, jobs):
+        claimed = []
+        for job in jobs:
+            row = self.jobs[job["id"]]
+            if row["status"] == job["status"]:
+                row["status"] = "processing"
+                claimed.append(job["id"])
+        return claimed
+
+    def update_job_status(self, job_id, status, error=None):
+        self.jobs[job_id]["status"] = status
+        if error:
+            self.jobs[job_id]["error"] = error
+
+    def save_analysis(self, job_id, **analysis):
+        self.analyses[job_id] = analysis
+        return str(uuid.uuid4())
+
+
+@pytest.fixture
+def batch_server(monkeypatch):
+    server = mock_batch_server.serve(port=0, delay_seconds=0.1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(config, "OPENAI_BATCH_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(
+        batch_extract, "wait_for_batch", functools.partial(batch_extract.wait_for_batch, poll_interval=0.05)
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def tables(monkeypatch, tmp_path):
+    tables = FakeTables()
+    tables.install(monkeypatch)
+
+    storage = storage_backends.LocalStorage(root=str(tmp_path / "storage"))
+    storage_backends.set_storage(storage)
+    monkeypatch.setattr(config, "PDF_DPI", 50)
+
+    pdf_path = tmp_path / "plan.pdf"
+    doc = fitz.open()
+    for text in ["DOOR SCHEDULE\nD1 3'-0\" x 7'-0\" ENTRY", "FIRST FLOOR PLAN\nKITCHEN  BATH"]:
+        doc.new_page(width=612, height=792).insert_text((72, 72), text, fontsize=14)
+    doc.save(pdf_path)
+
+    for _ in range(2):
+        job_id = str(uuid.uuid4())
+        storage.put("plans", f"uploads/{job_id}.pdf", str(pdf_path))
+        tables.jobs[job_id] = {
+            "id": job_id, "user_id": str(uuid.uuid4()), "file_path": f"uploads/{job_id}.pdf", "file_type": "pdf", "status": "queued"
+        }
+
+    yield tables
+    storage_backends.set_storage(None)
+
+
+def test_batch_results_are_saved(batch_server, tables, tmp_path):
+    jobs = [dict(job) for job in tables.jobs.values()]
+
+    outcome = batch_extract.run_batch_extraction(jobs, str(tmp_path / "batches"))
+
+    assert outcome == {job["id"]: True for job in jobs}
+    assert set(tables.analyses) == set(tables.jobs)
+    for job_id, analysis in tables.analyses.items():
+        assert analysis["quantities"]["doors"]["total"] >= 0
+        assert analysis["evidence"]["usage"]["passes"]["pass1"]["batch"] is True
+        assert tables.jobs[job_id]["status"] in ("completed", "needs_review")
+    assert {row["pass"] for row in tables.metrics} >= {"pass1"}
+
+
+def test_jobs_claimed_by_a_worker_are_skipped(batch_server, tables, tmp_path):
+    jobs = [dict(job) for job in tables.jobs.values()]
+    taken = jobs[0]["id"]
+    tables.jobs[taken]["status"] = "processing"  # A worker claimed it after it was listed
+
+    outcome = batch_extract.run_batch_extraction(jobs, str(tmp_path / "batches"))
+
+    assert taken not in outcome
+    assert taken not in tables.analyses
+    assert tables.jobs[taken]["status"] == "processing"
+    assert outcome == {jobs[1]["id"]: True}
+
+
+def test_failed_round_returns_jobs_to_queue(batch_server, tables, tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise TimeoutError("batch still in_progress")
+
+    monkeypatch.setattr(batch_extract, "run_batch_round", fail)
+    jobs = [dict(job) for job in tables.jobs.values()]
+
+    with pytest.raises(TimeoutError):
+        batch_extract.run_batch_extraction(jobs, str(tmp_path / "batches"))
+
+    assert not tables.analyses
+    assert {job["status"] for job in tables.jobs.values()} == {"queued"}
@@ -0,0 +1,167 @@
+"""
+OpenAIBackend's streaming HTTP transport (sync and async) against a local
+stub of the chat completions endpoint
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import APIStatusError, RateLimitError
+from PIL import Image
+
+import extraction_backends
+from request_payload import ImagePayload
+
+COMPLETION = {
+    "choices": [{"message": {"content": '{"ok": true}'}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 12, "completion_tokens": 4, "total_tokens": 16},
+}
+
+STREAM_EVENTS = [
+    {"choices": [{"delta": {"content": '{"ok": '}}]},
+    {"choices": [{"delta": {"content": "true}"}, "finish_reason": "stop"}]},
+    {"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 4, "total_tokens": 16}},
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/chat/completions from a script of (status, payload) responses"""
+
+    protocol_version = "HTTP/1.1"
+    script = []
+    requests = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline(), 16)
+                body += self.rfile.read(size + 2)[:size]
+                if size == 0:
+                    return body
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        body = self._read_body()
+        StubHandler.requests.append({"headers": dict(self.headers), "body": body})
+        status, payload = StubHandler.script.pop(0)
+
+        if status == "stream":
+            data = "".join(f"data: {json.dumps(event)}\n\n" for event in payload) + "data: [DONE]\n\n"
+            content_type = "text/event-stream"
+            status = 200
+        else:
+            data = json.dumps(payload)
+            content_type = "application/json"
+        encoded = data.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(encoded)))
+        if status == 429:
+            self.send_header("retry-after", "2")
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    StubHandler.script = []
+    StubHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setattr(extraction_backends, "EXTRACTION_STREAM_PAYLOAD", True)
+    monkeypatch.setattr(extraction_backends, "_retry_delay", lambda attempt: 0.0)
+    yield StubHandler
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def messages(tmp_path):
+    image_path = tmp_path / "page.png"
+    Image.new("RGB", (64, 48), "white").save(image_path)
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": "Count the doors"},
+            {"type": "image_url", "image_url": {"url": ImagePayload.from_file(str(image_path)), "detail": "high"}},
+        ],
+    }]
+
+
+def complete(mode, messages, params, on_delta=None):
+    """Run one request through the sync backend or an async session"""
+    backend = extraction_backends.OpenAIBackend(api_key="test-key", max_retries=2)
+    if mode == "sync":
+        return backend.complete(messages, params, on_delta=on_delta)
+
+    async def run():
+        async with backend.async_session() as session:
+            return await session.complete_async(messages, params, on_delta=on_delta)
+    return asyncio.run(run())
+
+
+PARAMS = {"model": "gpt-4o", "max_tokens": 100}
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_server_error_is_retried(stub, messages, mode):
+    stub.script = [(503, {"error": {"message": "overloaded"}}), (200, COMPLETION)]
+
+    result = complete(mode, messages, PARAMS)
+
+    assert result == {"text": '{"ok": true}', "usage": COMPLETION["usage"], "finish_reason": "stop"}
+    assert len(stub.requests) == 2
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_server_errors_raise_after_the_last_retry(stub, messages, mode):
+    stub.script = [(500, {"error": {"message": "boom"}})] * 3
+
+    with pytest.raises(APIStatusError, match="boom"):
+        complete(mode, messages, PARAMS)
+    assert len(stub.requests) == 3
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_rate_limit_surfaces_with_retry_after(stub, messages, mode):
+    stub.script = [(429, {"error": {"message": "slow down"}})]
+
+    with pytest.raises(RateLimitError) as raised:
+        complete(mode, messages, PARAMS)
+
+    assert len(stub.requests) == 1  # Left to openai_extract's rate-limit handling
+    assert raised.value.response.headers["retry-after"] == "2"
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_streamed_response(stub, messages, mode):
+    stub.script = [("stream", STREAM_EVENTS)]
+    deltas = []
+
+    result = complete(mode, messages, {**PARAMS, "stream": True}, on_delta=deltas.append)
+
+    assert deltas == ['{"ok": ', "true}"]
+    assert result == {"text": '{"ok": true}', "usage": STREAM_EVENTS[-1]["usage"], "finish_reason": "stop"}
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_request_body_is_sent_with_content_length(stub, messages, mode):
+    stub.script = [(200, COMPLETION)]
+
+    complete(mode, messages, PARAMS)
+
+    request = stub.requests[0]
+    assert "Transfer-Encoding" not in request["headers"]
+    assert int(request["headers"]["Content-Length"]) == len(request["body"])
+    body = json.loads(request["body"])
+    assert body["messages"][0]["content"][1]["image_url"]["url"].startswith("data:image/png;base64,")
+    assert request["headers"]["Authorization"] == "Bearer test-key"
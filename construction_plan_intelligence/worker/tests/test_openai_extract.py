@@ -0,0 +1,149 @@
+"""
+Merging of chunked Pass 1 results (merge_partial_results) and streamed JSON
+checking (IncrementalJsonChecker)
+"""
+
+import pytest
+
+import openai_extract
+from openai_extract import IncrementalJsonChecker, MalformedOutputError
+
+
+def windows(total, by_type, confidence="high", evidence=None):
+    return {
+        "windows": {
+            "total": total,
+            "by_type": by_type,
+            "confidence": confidence,
+            "evidence": evidence or [],
+        }
+    }
+
+
+def test_chunks_of_a_group_sum_counts():
+    merged = openai_extract.merge_partial_results([
+        ("floor_plan", windows(2, {"fixed": 1, "casement": 1}, evidence=[{"page_no": 1}])),
+        ("floor_plan", windows(3, {"fixed": 3}, confidence="medium", evidence=[{"page_no": 2}])),
+    ])
+
+    assert merged["windows"] == {
+        "total": 5,
+        "by_type": {"fixed": 4, "casement": 1},
+        "confidence": "medium",
+        "evidence": [{"page_no": 1}, {"page_no": 2}],
+    }
+
+
+def test_null_breakdown_does_not_hide_other_chunks():
+    merged = openai_extract.merge_partial_results([
+        ("floor_plan", windows(0, None)),
+        ("floor_plan", windows(4, {"fixed": 4, "sliding": 0})),
+    ])
+
+    assert merged["windows"]["total"] == 4
+    assert merged["windows"]["by_type"] == {"fixed": 4, "sliding": 0}
+
+
+def test_keys_only_in_later_chunks_are_kept():
+    first = {"doors": {"total": 1, "confidence": "high"}}
+    second = {"doors": {"total": 2, "by_type": {"interior": 2}, "notes": "pocket door", "confidence": "high"}}
+
+    merged = openai_extract.merge_partial_results([("floor_plan", first), ("floor_plan", second)])
+
+    assert merged["doors"] == {
+        "total": 3,
+        "confidence": "high",
+        "by_type": {"interior": 2},
+        "notes": "pocket door",
+    }
+
+
+def test_most_confident_group_wins_ties_by_priority():
+    merged = openai_extract.merge_partial_results([
+        ("floor_plan", windows(7, {"fixed": 7}, confidence="high")),
+        ("schedule", windows(6, {"fixed": 6}, confidence="medium")),
+        ("other", {**windows(9, {"fixed": 9}, confidence="high"), "meta": {"floors_detected": 2}}),
+        ("legend", {"meta": {"floors_detected": 1, "plan_type": "residential"}}),
+    ])
+
+    assert merged["windows"]["total"] == 7
+    assert merged["meta"]["floors_detected"] == 2
+    assert merged["meta"]["plan_type"] == "residential"
+
+
+def feed_all(checker, deltas):
+    for delta in deltas:
+        checker.feed(delta)
+    checker.check_complete()
+
+
+def test_checker_accepts_object_split_across_deltas():
+    text = '{"doors": {"total": 3, "by_type": [1, 2.5e1, -0, true, false, null]}, "notes": "a, b: {c}"}'
+
+    feed_all(IncrementalJsonChecker(allow_fences=False), list(text))
+    feed_all(IncrementalJsonChecker(allow_fences=False), [text[:7], text[7:40], text[40:]])
+
+
+def test_checker_tracks_escapes_inside_strings():
+    text = r'{"note": "a \"quoted\" {brace] and a backslash \\", "path": "C:\\plans\\"}'
+
+    # Split right after each backslash so the escape state crosses deltas
+    deltas = []
+    current = ""
+    for char in text:
+        current += char
+        if char == "\\":
+            deltas.append(current)
+            current = ""
+    deltas.append(current)
+    feed_all(IncrementalJsonChecker(allow_fences=False), deltas)
+
+
+@pytest.mark.parametrize("text", [
+    '{"a": [1, 2}',          # Mismatched closer
+    '{"a": 1}}',             # Closer after the object
+    '{"a": 1} trailing',     # Text after the object
+    'Here is the JSON: {}',  # Prose before the object
+    '{"a": "line\nbreak"}',  # Unescaped newline in a string
+    '{"a": nope}',
+])
+def test_checker_rejects_malformed_json(text):
+    checker = IncrementalJsonChecker(allow_fences=False)
+
+    with pytest.raises(MalformedOutputError):
+        feed_all(checker, [text])
+
+
+def test_checker_rejects_mismatch_as_soon_as_it_arrives():
+    checker = IncrementalJsonChecker(allow_fences=False)
+    checker.feed('{"a": [1, 2')
+
+    with pytest.raises(MalformedOutputError, match="character 12"):
+        checker.feed("}")
+
+
+def test_checker_requires_a_closed_object():
+    checker = IncrementalJsonChecker(allow_fences=False)
+    checker.feed('{"a": [1, 2]')
+
+    with pytest.raises(MalformedOutputError, match="ended before"):
+        checker.check_complete()
+
+
+def test_checker_allows_trailing_whitespace():
+    feed_all(IncrementalJsonChecker(allow_fences=False), ['{"a": 1}', "\n  \n"])
+
+
+@pytest.mark.parametrize("fence", ["```json", "```JSON", "```"])
+def test_checker_fences(fence):
+    deltas = [fence[:2], fence[2:] + "\n{", '"a": 1}', "\n```\n"]
+
+    feed_all(IncrementalJsonChecker(allow_fences=True), deltas)
+    with pytest.raises(MalformedOutputError, match="does not start with a JSON object"):
+        feed_all(IncrementalJsonChecker(allow_fences=False), deltas)
+
+
+def test_parse_json_response_strips_uppercase_fence(monkeypatch):
+    monkeypatch.setattr(openai_extract, "EXTRACTION_STRUCTURED_OUTPUT", False)
+
+    assert openai_extract.parse_json_response('```JSON\n{"a": 1}\n```') == {"a": 1}
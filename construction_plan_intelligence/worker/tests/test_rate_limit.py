@@ -0,0 +1,126 @@
+"""
+Shared token-bucket limiter (state file shared by processes)
+"""
+
+import asyncio
+import json
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter
+
+pytestmark = pytest.mark.skipif(rate_limit.fcntl is None, reason="needs fcntl (shared state file lock)")
+
+
+def drained(tmp_path, rpm, tpm):
+    """Limiter whose buckets are empty as of now"""
+    state_path = str(tmp_path / "limits.json")
+    with open(state_path, "w") as f:
+        json.dump({"requests": 0, "tokens": 0, "updated": time.time(), "paused_until": 0}, f)
+    return RateLimiter(state_path, rpm, tpm)
+
+
+def _acquire_many(state_path, rpm, count, times):
+    limiter = RateLimiter(state_path, rpm, 0)
+    for _ in range(count):
+        limiter.acquire(1)
+        times.put(time.time())
+
+
+def test_rpm_ceiling_holds_across_processes(tmp_path):
+    rpm, processes, per_process = 1200, 4, 10  # 20 requests/s
+    limiter = drained(tmp_path, rpm, 0)
+    started = time.time()
+
+    context = multiprocessing.get_context("fork")
+    times = context.Queue()
+    workers = [
+        context.Process(target=_acquire_many, args=(limiter.state_path, rpm, per_process, times))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    acquired = sorted(times.get(timeout=30) for _ in range(processes * per_process))
+    for worker in workers:
+        worker.join()
+
+    # The n-th request can only go once n requests' worth has refilled
+    for n, acquired_at in enumerate(acquired, start=1):
+        assert acquired_at - started >= n * 60 / rpm - 0.02
+
+
+def test_large_request_is_not_starved_by_small_ones(tmp_path):
+    limiter = drained(tmp_path, 0, 60000)  # 1000 tokens/s
+    stop = threading.Event()
+
+    def small_calls():
+        while not stop.is_set():
+            limiter.acquire(50)
+
+    smalls = [threading.Thread(target=small_calls) for _ in range(3)]
+    for thread in smalls:
+        thread.start()
+    time.sleep(0.2)
+
+    # ~1s to refill 1000 tokens, plus the small calls already queued ahead
+    large = threading.Thread(target=limiter.acquire, args=(1000,), daemon=True)
+    large.start()
+    large.join(timeout=2.5)
+    starved = large.is_alive()
+    stop.set()
+    for thread in smalls:
+        thread.join()
+
+    assert not starved
+
+
+def test_oversized_request_runs_on_a_full_bucket_and_leaves_debt(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limits.json"), 0, 600)  # Starts full, 10 tokens/s
+
+    assert limiter.acquire(1500) < 0.1
+    wait = limiter._try_acquire(10, "next")
+    assert wait == pytest.approx(91, abs=1)  # 900 tokens of debt + 10
+
+
+def test_queue_entry_of_a_dead_process_expires(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limit, "QUEUE_TIMEOUT_SECONDS", 0.3)
+    limiter = drained(tmp_path, 0, 60000)  # 1000 tokens/s
+
+    assert limiter._try_acquire(100, "dead") > 0  # Queued, then never re-checked
+    time.sleep(0.15)
+    assert limiter._try_acquire(100, "alive") > 0  # Capacity is there, but behind "dead"
+    time.sleep(0.25)
+    assert limiter._try_acquire(100, "alive") == 0
+
+
+def test_acquire_async_does_not_block_the_event_loop(tmp_path):
+    limiter = RateLimiter(str(tmp_path / "limits.json"), 600, 0)
+    other_process = RateLimiter(limiter.state_path, 600, 0)  # Own thread lock, same file lock
+
+    def hold_lock():
+        with other_process._locked_state():
+            time.sleep(0.5)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        time.sleep(0.05)
+        task = asyncio.create_task(ticker())
+        await limiter.acquire_async(1)
+        task.cancel()
+        holder.join()
+        return ticks
+
+    assert asyncio.run(main()) >= 20
@@ -0,0 +1,246 @@
+"""
+Local consistency rules (decide whether the Pass 2 audit runs) and
+schema-driven repair
+"""
+
+import copy
+import random
+
+import pytest
+
+import validate
+
+
+def evidence(page_no=1, source="schedule"):
+    return {"page_no": page_no, "artifact_id": "a1", "source": source, "note": "door schedule"}
+
+
+def extraction():
+    """A complete, consistent extraction of a 2-page plan"""
+    return {
+        "meta": {"floors_detected": 1, "plan_type": "residential", "units": "imperial", "notes": ""},
+        "doors": {
+            "total": 5,
+            "by_type": {"entry": 1, "interior": 3, "sliding": 1, "bifold": 0, "other": 0},
+            "confidence": "high",
+            "evidence": [evidence(1)],
+        },
+        "windows": {
+            "total": 4,
+            "by_type": {"fixed": 1, "casement": 2, "sliding": 1, "other": 0},
+            "confidence": "medium",
+            "evidence": [evidence(2, "plan_symbols")],
+        },
+        "kitchen": {"cabinets_count_est": 12, "linear_ft_est": 18.5, "confidence": "medium", "evidence": []},
+        "bathrooms": {
+            "bathroom_count": 2, "toilets": 2, "sinks": 3, "showers": 1, "bathtubs": 1,
+            "confidence": "high", "evidence": [evidence(2, "legend")],
+        },
+        "other_fixtures": {"wardrobes": 2, "closets": 3, "shelving_units": 1, "confidence": "low", "evidence": []},
+        "review": {"needs_review": False, "flags": [], "assumptions": []},
+    }
+
+
+ANALYZED_PAGES = [1, 2]
+
+
+def rules_hit(violations):
+    return {(violation["rule"], violation["section"]) for violation in violations}
+
+
+def test_consistent_extraction_passes_every_rule():
+    assert validate.check_consistency(extraction(), ANALYZED_PAGES) == []
+
+
+def test_sections_present():
+    raw = extraction()
+    del raw["kitchen"]
+    raw["review"] = "ok"
+
+    assert rules_hit(validate.check_sections_present(raw)) == {
+        ("section_present", "kitchen"), ("section_present", "review")
+    }
+    assert validate.check_consistency([], ANALYZED_PAGES)[0]["section"] == "root"
+
+
+def test_breakdown_totals():
+    assert validate.check_breakdown_totals(extraction()) == []
+
+    raw = extraction()
+    raw["doors"]["total"] = 6
+    raw["windows"]["by_type"]["fixed"] = "two"
+    assert rules_hit(validate.check_breakdown_totals(raw)) == {
+        ("breakdown_total", "doors"), ("breakdown_total", "windows")
+    }
+
+
+def test_breakdown_totals_skips_missing_window_breakdown():
+    raw = extraction()
+    raw["windows"]["by_type"] = None
+
+    assert validate.check_breakdown_totals(raw) == []
+
+
+@pytest.mark.parametrize("changes", [
+    {"toilets": 1},                      # Fewer toilets than bathrooms
+    {"sinks": 5},                        # More than two sinks per bathroom
+    {"showers": 3, "bathtubs": 2},       # Too many showers/bathtubs
+    {"bathroom_count": None},
+])
+def test_bathroom_fixtures(changes):
+    assert validate.check_bathroom_fixtures(extraction()) == []
+
+    raw = extraction()
+    raw["bathrooms"].update(changes)
+    assert rules_hit(validate.check_bathroom_fixtures(raw)) == {("bathroom_fixtures", "bathrooms")}
+
+
+def test_evidence_pages():
+    assert validate.check_evidence_pages(extraction(), ANALYZED_PAGES) == []
+
+    raw = extraction()
+    raw["windows"]["evidence"].append(evidence(7))
+    violations = validate.check_evidence_pages(raw, ANALYZED_PAGES)
+    assert rules_hit(violations) == {("evidence_page", "windows")}
+    assert "cites page 7" in violations[0]["message"]
+
+    # Without the analyzed pages there is nothing to check against
+    assert validate.check_evidence_pages(raw, None) == []
+
+
+def test_confidence_evidence():
+    assert validate.check_confidence_evidence(extraction()) == []
+
+    raw = extraction()
+    raw["doors"]["evidence"] = []
+    raw["bathrooms"]["evidence"] = [evidence(1, "plan_symbols")]
+    assert rules_hit(validate.check_confidence_evidence(raw)) == {
+        ("confidence_evidence", "doors"), ("confidence_evidence", "bathrooms")
+    }
+
+
+def test_rule_that_raises_is_reported(monkeypatch):
+    def broken_rule(raw_json, analyzed_pages=None):
+        raise KeyError("by_type")
+
+    monkeypatch.setattr(validate, "CONSISTENCY_RULES", [*validate.CONSISTENCY_RULES, broken_rule])
+
+    violations = validate.check_consistency(extraction(), ANALYZED_PAGES)
+    assert rules_hit(violations) == {("broken_rule", "unknown")}
+    assert "rule failed" in violations[0]["message"]
+
+
+def test_malformed_evidence_is_reported_not_passed():
+    raw = extraction()
+    raw["doors"]["evidence"] = [{"page_no": [1, 2], "source": "schedule"}]  # Unhashable page number
+
+    assert ("check_evidence_pages", "unknown") in rules_hit(validate.check_consistency(raw, ANALYZED_PAGES))
+
+
+def test_rules_do_not_modify_the_extraction():
+    raw = extraction()
+    raw["doors"]["total"] = 9
+    before = copy.deepcopy(raw)
+
+    validate.check_consistency(raw, ANALYZED_PAGES)
+    assert raw == before
+
+
+def test_repair_fills_missing_sections():
+    raw = extraction()
+    del raw["kitchen"]
+    del raw["meta"]["units"]
+
+    repaired = validate.repair_extraction(raw)
+    assert repaired["kitchen"] == {
+        "cabinets_count_est": 0, "linear_ft_est": 0.0, "confidence": "low", "evidence": []
+    }
+    assert repaired["meta"]["units"] == "unknown"
+
+
+def test_repair_clamps_negative_counts():
+    raw = extraction()
+    raw["doors"]["by_type"]["other"] = -2
+    raw["kitchen"]["linear_ft_est"] = -4.5
+
+    repaired = validate.repair_extraction(raw)
+    assert repaired["doors"]["by_type"]["other"] == 0
+    assert repaired["kitchen"]["linear_ft_est"] == 0.0
+
+
+def test_repair_coerces_numeric_strings():
+    raw = extraction()
+    raw["windows"]["total"] = "3"
+    raw["kitchen"]["cabinets_count_est"] = "1,200"
+
+    repaired = validate.repair_extraction(raw)
+    assert repaired["windows"]["total"] == 3
+    assert repaired["kitchen"]["cabinets_count_est"] == 1200
+
+
+def test_repair_raises_floors_detected_to_one():
+    raw = extraction()
+    raw["meta"]["floors_detected"] = 0
+
+    assert validate.repair_extraction(raw)["meta"]["floors_detected"] == 1
+
+
+def test_repair_does_not_modify_its_input():
+    raw = extraction()
+    raw["doors"]["total"] = "5"
+    del raw["review"]["flags"]
+    before = copy.deepcopy(raw)
+
+    validate.repair_extraction(raw)
+    assert raw == before
+
+
+def test_repair_flags_result_for_review():
+    repaired = validate.repair_extraction(extraction())
+
+    assert repaired["review"]["needs_review"] is True
+    assert repaired["review"]["flags"].count(validate.REPAIR_FLAG) == 1
+    assert validate.repair_extraction(repaired)["review"]["flags"].count(validate.REPAIR_FLAG) == 1
+
+
+def test_repair_of_non_object_fails():
+    assert validate.repair_extraction(["not", "an", "object"]) is None
+
+
+@pytest.mark.parametrize("raw", [
+    {},
+    {"meta": None, "doors": [], "windows": "none", "review": {"needs_review": "yes"}},
+    {"doors": {"total": -1, "by_type": {"entry": "2", "interior": None}, "confidence": "certain",
+               "evidence": [7, {"page_no": "3", "source": "guess"}]}},
+    {"windows": {"total": float("nan"), "by_type": None}, "kitchen": {"linear_ft_est": "12.5 ft"}},
+    {"bathrooms": {"bathroom_count": True, "toilets": 1e3}, "other_fixtures": {"extra": {"x": 1}}},
+])
+def test_repaired_extraction_always_validates(raw):
+    repaired = validate.repair_extraction(raw)
+
+    assert repaired is not None
+    validate.extraction_adapter().validate_python(repaired)
+
+
+JUNK_VALUES = [None, "", "7", "-3", "seven", -5, 2.5, 1e9, True, [], {}, [1, "a"], {"x": None}]
+
+
+def _scramble(value, rng):
+    """Replace random leaves and containers of an extraction with junk"""
+    if rng.random() < 0.15:
+        return rng.choice(JUNK_VALUES)
+    if isinstance(value, dict):
+        return {key: _scramble(item, rng) for key, item in value.items() if rng.random() > 0.1}
+    if isinstance(value, list):
+        return [_scramble(item, rng) for item in value]
+    return value
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_repair_round_trip_on_scrambled_extractions(seed):
+    raw = _scramble(extraction(), random.Random(seed))
+
+    repaired = validate.repair_extraction(raw)
+    if isinstance(raw, dict):
+        assert repaired is not None
+        validate.extraction_adapter().validate_python(repaired)
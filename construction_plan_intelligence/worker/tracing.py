@@ -0,0 +1,296 @@
+"""
+Tracing Module
+Trace spans for each job and its pipeline stages (download, page renders,
+uploads, model calls, validation, save), exported as OTLP JSON
+
+Enabled by TRACE_FILE (one OTLP/JSON ExportTraceServiceRequest per line, one
+line per trace) and/or TRACE_OTLP_ENDPOINT (an OTLP/HTTP collector's
+/v1/traces). Logs from concurrent jobs interleave; a trace keeps one job's
+spans together, with their attributes (pages, bytes, DPI, tokens), so a slow
+job's critical path can be read from it.
+
+A trace is exported when its root span ends, from a background thread. When
+tracing is off span() yields a no-op span and records nothing.
+
+The current span follows contextvars: asyncio tasks and asyncio.to_thread()
+inherit it, ThreadPoolExecutor workers do not (pass parent=current_span()).
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+from config import TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_SERVICE_NAME
+
+logger = logging.getLogger(__name__)
+
+SCOPE_NAME = "plan-worker"
+
+# OTLP Span.SpanKind values
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+
+# OTLP Status.StatusCode.STATUS_CODE_ERROR
+STATUS_ERROR = 2
+
+# Spans buffered per open trace; later spans are dropped (counted on the root)
+MAX_SPANS_PER_TRACE = 10000
+
+EXPORT_TIMEOUT_S = 10
+
+
+def enabled() -> bool:
+    return bool(TRACE_FILE or TRACE_OTLP_ENDPOINT)
+
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+class Span:
+    """One timed operation in a trace (see span())"""
+
+    def __init__(self, name: str, parent: Optional["Span"], kind: str, attributes: Dict):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.kind = SPAN_KINDS.get(kind, SPAN_KINDS["internal"])
+        self.attributes: Dict = {}
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.set(**attributes)
+
+    def set(self, **attributes):
+        """Set attributes (None values are skipped)"""
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+
+    def record_error(self, error: BaseException):
+        """Mark the span as failed (for errors handled inside it)"""
+        self.error = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+class _NoopSpan:
+    """Yielded by span() when tracing is off"""
+
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_INHERIT = object()
+
+
+def current_span() -> Optional[Span]:
+    """The innermost open span in this context (None when tracing is off)"""
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, parent=_INHERIT, kind: str = "internal", **attributes) -> Iterator[Span]:
+    """
+    Trace the enclosed block as a span
+
+    Args:
+        name: Span name (e.g., "download", "render_page", "model_call")
+        parent: Parent span (default: current_span(); None starts a new trace)
+        kind: internal | client | server | producer | consumer
+        **attributes: Span attributes (str, int, float, bool or lists of them);
+            more can be added with the yielded span's set()
+
+    Yields:
+        The span (NOOP_SPAN when tracing is off). A raised exception marks it failed.
+    """
+    if not enabled():
+        yield NOOP_SPAN
+        return
+
+    current = Span(name, current_span() if parent is _INHERIT else parent, kind, attributes)
+    if current.parent_id is None:
+        _open_trace(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current.reset(token)
+        _finish(current)
+
+
+# ============================================================================
+# BUFFERING
+# ============================================================================
+
+_lock = threading.Lock()
+_traces: Dict[str, List[Span]] = {}  # Open traces (root span started, not ended) -> finished spans
+_dropped: Dict[str, int] = {}
+
+
+def _open_trace(root: Span):
+    with _lock:
+        _traces[root.trace_id] = []
+
+
+def _finish(finished: Span):
+    """Buffer a finished span with its trace, or export the trace when it is the root"""
+    with _lock:
+        spans = _traces.get(finished.trace_id)
+        if finished.parent_id is not None and spans is not None:
+            if len(spans) < MAX_SPANS_PER_TRACE:
+                spans.append(finished)
+            else:
+                _dropped[finished.trace_id] = _dropped.get(finished.trace_id, 0) + 1
+            return
+        if finished.parent_id is None:
+            spans = _traces.pop(finished.trace_id, None) or []
+            dropped = _dropped.pop(finished.trace_id, 0)
+            if dropped:
+                finished.set(dropped_spans=dropped)
+        else:
+            spans = []  # Ended after its root: exported on its own
+
+    _exporter().submit(spans + [finished])
+
+
+# ============================================================================
+# OTLP EXPORT
+# ============================================================================
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}  # int64 is a string in OTLP/JSON
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def _resource() -> Dict:
+    return {
+        "attributes": _otlp_attributes({
+            "service.name": TRACE_SERVICE_NAME,
+            "host.name": socket.gethostname(),
+            "process.pid": os.getpid(),
+        })
+    }
+
+
+def otlp_request(spans: List[Span]) -> Dict:
+    """
+    OTLP/JSON ExportTraceServiceRequest for spans
+
+    Returns:
+        {"resourceSpans": [{"resource": ..., "scopeSpans": [{"scope": ..., "spans": [...]}]}]}
+    """
+    return {
+        "resourceSpans": [{
+            "resource": _resource(),
+            "scopeSpans": [{
+                "scope": {"name": SCOPE_NAME},
+                "spans": [finished.to_otlp() for finished in spans],
+            }],
+        }]
+    }
+
+
+class _Exporter:
+    """Writes finished traces to TRACE_FILE / TRACE_OTLP_ENDPOINT from a background thread"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue()
+        self._file_lock = threading.Lock()
+        self._client = httpx.Client(timeout=EXPORT_TIMEOUT_S) if TRACE_OTLP_ENDPOINT else None
+        threading.Thread(target=self._run, name="trace-export", daemon=True).start()
+
+    def submit(self, spans: List[Span]):
+        self._queue.put(spans)
+
+    def flush(self):
+        """Wait for queued traces to be written"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self._export(otlp_request(spans))
+            except Exception as e:
+                logger.warning(f"Failed to export trace ({len(spans)} spans): {e}")
+            finally:
+                self._queue.task_done()
+
+    def _export(self, request: Dict):
+        if TRACE_FILE:
+            line = json.dumps(request, separators=(",", ":")) + "\n"
+            with self._file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line)  # One write per trace: lines from concurrent workers stay whole
+        if self._client is not None:
+            response = self._client.post(TRACE_OTLP_ENDPOINT, json=request)
+            response.raise_for_status()
+
+
+_exporters: Dict[int, _Exporter] = {}  # Per process: the export thread does not survive fork
+_exporters_lock = threading.Lock()
+
+
+def _exporter() -> _Exporter:
+    pid = os.getpid()
+    with _exporters_lock:
+        if pid not in _exporters:
+            _exporters[pid] = _Exporter()
+        return _exporters[pid]
+
+
+def flush():
+    """Write all finished traces of this process (called at exit)"""
+    exporter = _exporters.get(os.getpid())
+    if exporter is not None:
+        exporter.flush()
+
+
+atexit.register(flush)
@@ -3,9 +3,13 @@ Validation Module
 Validates and normalizes extraction results using Pydantic
 """
 
+import copy
 import logging
-from typing import List, Dict, Optional
-from pydantic import BaseModel, Field, validator
+import typing
+from functools import lru_cache
+from typing import Annotated, Any, Callable, List, Dict, Optional, Tuple
+
+from pydantic import AfterValidator, BaseModel, Field, TypeAdapter, ValidationError
 
 logger = logging.getLogger(__name__)
 
@@ -14,11 +18,20 @@ logger = logging.getLogger(__name__)
 # PYDANTIC MODELS
 # ============================================================================
 
+def _normalize_confidence(value: str) -> str:
+    return value if value in ('low', 'medium', 'high') else 'low'
+
+
+# low|medium|high (anything else is treated as low)
+Confidence = Annotated[str, AfterValidator(_normalize_confidence)]
+
+
 class Evidence(BaseModel):
     page_no: int
     artifact_id: str
     source: str  # schedule|legend|plan_symbols|ocr_text
     note: str
+    region: Optional[List[int]] = None  # [x0, y0, x1, y1] page pixels when cited from a tile
 
 
 class Meta(BaseModel):
@@ -39,15 +52,9 @@ class DoorsByType(BaseModel):
 class Doors(BaseModel):
     total: int = Field(ge=0)
     by_type: DoorsByType
-    confidence: str  # low|medium|high
+    confidence: Confidence
     evidence: List[Evidence] = []
 
-    @validator('confidence')
-    def validate_confidence(cls, v):
-        if v not in ['low', 'medium', 'high']:
-            return 'low'
-        return v
-
 
 class WindowsByType(BaseModel):
     fixed: int = Field(ge=0, default=0)
@@ -59,28 +66,16 @@ class WindowsByType(BaseModel):
 class Windows(BaseModel):
     total: int = Field(ge=0)
     by_type: Optional[WindowsByType] = None
-    confidence: str
+    confidence: Confidence
     evidence: List[Evidence] = []
 
-    @validator('confidence')
-    def validate_confidence(cls, v):
-        if v not in ['low', 'medium', 'high']:
-            return 'low'
-        return v
-
 
 class Kitchen(BaseModel):
     cabinets_count_est: int = Field(ge=0)
     linear_ft_est: float = Field(ge=0)
-    confidence: str
+    confidence: Confidence
     evidence: List[Evidence] = []
 
-    @validator('confidence')
-    def validate_confidence(cls, v):
-        if v not in ['low', 'medium', 'high']:
-            return 'low'
-        return v
-
 
 class Bathrooms(BaseModel):
     bathroom_count: int = Field(ge=0)
@@ -88,29 +83,17 @@ class Bathrooms(BaseModel):
     sinks: int = Field(ge=0)
     showers: int = Field(ge=0)
     bathtubs: int = Field(ge=0)
-    confidence: str
+    confidence: Confidence
     evidence: List[Evidence] = []
 
-    @validator('confidence')
-    def validate_confidence(cls, v):
-        if v not in ['low', 'medium', 'high']:
-            return 'low'
-        return v
-
 
 class OtherFixtures(BaseModel):
     wardrobes: int = Field(ge=0)
     closets: int = Field(ge=0)
     shelving_units: int = Field(ge=0)
-    confidence: str
+    confidence: Confidence
     evidence: List[Evidence] = []
 
-    @validator('confidence')
-    def validate_confidence(cls, v):
-        if v not in ['low', 'medium', 'high']:
-            return 'low'
-        return v
-
 
 class Review(BaseModel):
     needs_review: bool
@@ -128,6 +111,71 @@ class PlanExtractionResult(BaseModel):
     review: Review
 
 
+@lru_cache(maxsize=1)
+def extraction_adapter() -> TypeAdapter:
+    """Compiled validator for PlanExtractionResult (built once per process)"""
+    return TypeAdapter(PlanExtractionResult)
+
+
+# ============================================================================
+# STRUCTURED OUTPUT SCHEMA
+# ============================================================================
+
+# Allowed values for free-form string fields (enforced in the model-facing schema)
+FIELD_ENUMS = {
+    'confidence': ['low', 'medium', 'high'],
+    'source': ['schedule', 'legend', 'plan_symbols', 'ocr_text'],
+    'plan_type': ['residential', 'commercial', 'mixed', 'unknown'],
+    'units': ['imperial', 'metric', 'unknown'],
+}
+
+# JSON Schema keywords not accepted by strict structured outputs
+UNSUPPORTED_SCHEMA_KEYWORDS = {
+    'title', 'default', 'minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum'
+}
+
+
+def _strictify_schema(node):
+    """Recursively adapt a Pydantic JSON schema for strict structured outputs"""
+    if isinstance(node, list):
+        return [_strictify_schema(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+
+    node = {
+        key: _strictify_schema(value)
+        for key, value in node.items()
+        if key not in UNSUPPORTED_SCHEMA_KEYWORDS
+    }
+
+    if node.get('type') == 'object' and 'properties' in node:
+        # Strict mode: every property required, no extra properties
+        node['required'] = list(node['properties'].keys())
+        node['additionalProperties'] = False
+
+        for name, prop in node['properties'].items():
+            if name in FIELD_ENUMS and prop.get('type') == 'string':
+                prop['enum'] = FIELD_ENUMS[name]
+
+    return node
+
+
+@lru_cache(maxsize=1)
+def _extraction_json_schema() -> Dict:
+    return _strictify_schema(PlanExtractionResult.model_json_schema())
+
+
+def extraction_json_schema() -> Dict:
+    """
+    JSON Schema for PlanExtractionResult, adapted for strict structured outputs
+    (all properties required, no additional properties, enums for string fields)
+
+    Returns:
+        JSON Schema dict (a copy; safe to modify)
+    """
+    return copy.deepcopy(_extraction_json_schema())
+
+
 # ============================================================================
 # VALIDATION FUNCTIONS
 # ============================================================================
@@ -148,86 +196,208 @@ def validate_extraction(raw_json: Dict) -> Dict:
     logger.info("Validating extraction result")
 
     try:
-        # Parse with Pydantic
-        validated = PlanExtractionResult(**raw_json)
-
-        # Convert back to dict
-        result = validated.dict()
+        result = extraction_adapter().validate_python(raw_json).model_dump()
 
         logger.info("Validation successful")
         return result
 
-    except Exception as e:
-        logger.error(f"Validation failed: {e}")
+    except ValidationError as e:
+        logger.error(f"Validation failed: {e.error_count()} errors")
         raise ValueError(f"Extraction validation failed: {e}")
 
 
+def validate_many(results: List[Dict], repair: bool = True) -> Tuple[List[Optional[Dict]], List[Tuple[int, str]]]:
+    """
+    Validate many extraction results (partial/merged results, stored analyses)
+
+    Args:
+        results: Raw extraction dicts
+        repair: Repair results that fail validation (see repair_extraction)
+
+    Returns:
+        (validated, errors) - validated[i] is None for results that failed;
+        errors lists (index, message) for each failure
+    """
+    adapter = extraction_adapter()
+    validated: List[Optional[Dict]] = []
+    errors: List[Tuple[int, str]] = []
+
+    for index, raw_json in enumerate(results):
+        try:
+            validated.append(adapter.validate_python(raw_json).model_dump())
+            continue
+        except ValidationError as e:
+            error = f"{e.error_count()} validation errors"
+
+        repaired = repair_extraction(raw_json) if repair else None
+        validated.append(repaired)
+        if repaired is None:
+            errors.append((index, error))
+
+    logger.info(f"Validated {len(results)} results ({len(errors)} failed)")
+    return validated, errors
+
+
+# ============================================================================
+# SCHEMA-DRIVEN REPAIR
+# ============================================================================
+# Repair walks the Pydantic models rather than hard-coded sections: missing or
+# malformed objects are rebuilt from their fields, numbers are coerced and
+# clamped to their bounds, enum strings fall back to a safe value, and lists
+# drop items that cannot be repaired.
+
+# Values for required fields that have no model default
+REPAIR_DEFAULTS = {
+    'floors_detected': 1,
+    'plan_type': 'unknown',
+    'units': 'unknown',
+    'confidence': 'low',
+    'source': 'ocr_text',
+    'needs_review': True,
+}
+
+REPAIR_FLAG = 'Auto-repaired from validation errors'
+
+
+def _field_bounds(field) -> Tuple[Optional[float], Optional[float]]:
+    """(minimum, maximum) from a field's ge/le constraints"""
+    lower = upper = None
+    for constraint in field.metadata:
+        lower = getattr(constraint, 'ge', lower)
+        upper = getattr(constraint, 'le', upper)
+    return lower, upper
+
+
+def _coerce_number(value: Any, annotation) -> Optional[float]:
+    """Coerce a JSON value to int/float, or None if it is not numeric"""
+    if isinstance(value, bool):
+        value = int(value)
+    elif isinstance(value, str):
+        try:
+            value = float(value.strip().replace(',', ''))
+        except ValueError:
+            return None
+    if not isinstance(value, (int, float)) or value != value:  # NaN
+        return None
+    return int(round(value)) if annotation is int else float(value)
+
+
+def _repair_value(value: Any, annotation, name: str, field, path: str, repairs: List[str]) -> Any:
+    """Repair one value against its annotation (returns the repaired value)"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    # Optional[X]: None stays None, anything else is repaired as X
+    if origin is typing.Union and type(None) in args:
+        if value is None:
+            return None
+        inner = next(arg for arg in args if arg is not type(None))
+        return _repair_value(value, inner, name, field, path, repairs)
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        if not isinstance(value, dict):
+            repairs.append(f"{path}: rebuilt object")
+            value = {}
+        return _repair_model(annotation, value, path, repairs)
+
+    if origin in (list, List):
+        if not isinstance(value, list):
+            repairs.append(f"{path}: replaced non-list")
+            return []
+        (item_type,) = args or (Any,)
+        items = []
+        for index, item in enumerate(value):
+            if isinstance(item_type, type) and issubclass(item_type, BaseModel) and not isinstance(item, dict):
+                repairs.append(f"{path}[{index}]: dropped non-object item")
+                continue
+            items.append(_repair_value(item, item_type, name, None, f"{path}[{index}]", repairs))
+        return items
+
+    if annotation in (int, float):
+        number = _coerce_number(value, annotation)
+        lower, upper = _field_bounds(field) if field is not None else (None, None)
+        if number is None:
+            number = REPAIR_DEFAULTS.get(name, lower if lower is not None else 0)
+        if lower is not None and number < lower:
+            number = annotation(lower)
+        if upper is not None and number > upper:
+            number = annotation(upper)
+        if number != value or type(number) is not type(value):
+            repairs.append(f"{path}: {value!r} -> {number!r}")
+        return number
+
+    if annotation is bool:
+        if isinstance(value, bool):
+            return value
+        repaired = REPAIR_DEFAULTS.get(name, bool(value))
+        repairs.append(f"{path}: {value!r} -> {repaired!r}")
+        return repaired
+
+    if annotation is str:
+        if value is None:
+            repaired = REPAIR_DEFAULTS.get(name, '')
+        elif not isinstance(value, str):
+            repaired = str(value)
+        else:
+            repaired = value
+        if name in FIELD_ENUMS and repaired not in FIELD_ENUMS[name]:
+            repaired = REPAIR_DEFAULTS.get(name, FIELD_ENUMS[name][-1])
+        if repaired != value:
+            repairs.append(f"{path}: {value!r} -> {repaired!r}")
+        return repaired
+
+    return value
+
+
+def _repair_model(model, data: Dict, path: str, repairs: List[str]) -> Dict:
+    """Repair a dict against a Pydantic model's fields (unknown keys are kept)"""
+    repaired = dict(data)
+
+    for name, field in model.model_fields.items():
+        field_path = f"{path}.{name}" if path else name
+
+        if name in data:
+            repaired[name] = _repair_value(data[name], field.annotation, name, field, field_path, repairs)
+        elif field.is_required():
+            repairs.append(f"{field_path}: missing, filled with defaults")
+            repaired[name] = _repair_value(None, field.annotation, name, field, field_path, [])
+
+    return repaired
+
+
 def repair_extraction(raw_json: Dict) -> Optional[Dict]:
     """
-    Attempt to repair common validation errors
+    Repair an extraction against the PlanExtractionResult schema in one pass
+    (fill missing fields, coerce types, clamp out-of-range numbers), flag it
+    for review, and validate the result
 
     Args:
         raw_json: Raw JSON dict that failed validation
 
     Returns:
-        Repaired dict, or None if repair fails
+        Validated dict, or None if repair fails
     """
     logger.info("Attempting to repair extraction")
 
-    try:
-        # Common repairs:
-
-        # 1. Ensure required fields exist
-        if 'meta' not in raw_json:
-            raw_json['meta'] = {
-                'floors_detected': 1,
-                'plan_type': 'unknown',
-                'units': 'unknown',
-                'notes': ''
-            }
-
-        # 2. Ensure all main sections exist
-        for section in ['doors', 'windows', 'kitchen', 'bathrooms', 'other_fixtures', 'review']:
-            if section not in raw_json:
-                raw_json[section] = {
-                    'total': 0,
-                    'confidence': 'low',
-                    'evidence': []
-                }
-
-        # 3. Fix negative numbers (set to 0)
-        for section in ['doors', 'windows', 'kitchen', 'bathrooms', 'other_fixtures']:
-            if section in raw_json:
-                for key, value in raw_json[section].items():
-                    if isinstance(value, (int, float)) and value < 0:
-                        logger.warning(f"Fixed negative value in {section}.{key}: {value} -> 0")
-                        raw_json[section][key] = 0
-
-        # 4. Ensure confidence is valid
-        valid_confidence = ['low', 'medium', 'high']
-        for section in ['doors', 'windows', 'kitchen', 'bathrooms', 'other_fixtures']:
-            if section in raw_json:
-                conf = raw_json[section].get('confidence', 'low')
-                if conf not in valid_confidence:
-                    raw_json[section]['confidence'] = 'low'
-
-        # 5. Ensure review section exists
-        if 'review' not in raw_json:
-            raw_json['review'] = {
-                'needs_review': True,
-                'flags': ['Auto-repaired from validation errors'],
-                'assumptions': []
-            }
-        else:
-            # Add repair flag
-            if 'flags' not in raw_json['review']:
-                raw_json['review']['flags'] = []
-            raw_json['review']['flags'].append('Auto-repaired from validation errors')
+    if not isinstance(raw_json, dict):
+        logger.error("Repair failed: extraction is not a JSON object")
+        return None
 
-        # Try validation again
-        return validate_extraction(raw_json)
+    repairs: List[str] = []
+    repaired = _repair_model(PlanExtractionResult, raw_json, "", repairs)
+
+    for repair in repairs:
+        logger.warning(f"Repaired {repair}")
 
-    except Exception as e:
+    review = repaired['review']
+    review['needs_review'] = True
+    flags = review.setdefault('flags', [])
+    if REPAIR_FLAG not in flags:
+        flags.append(REPAIR_FLAG)
+
+    try:
+        return validate_extraction(repaired)
+    except ValueError as e:
         logger.error(f"Repair failed: {e}")
         return None
 
@@ -255,3 +425,189 @@ def validate_with_repair(raw_json: Dict) -> Dict:
             raise ValueError(f"Validation and repair both failed: {e}")
 
         return repaired
+
+
+# ============================================================================
+# LOCAL CONSISTENCY RULES
+# ============================================================================
+# Deterministic cross-field checks run on the raw Pass 1 JSON. Each rule returns
+# a list of violations: {"rule": <rule name>, "section": <section>, "message": <text>}
+
+COUNT_SECTIONS = ['doors', 'windows', 'kitchen', 'bathrooms', 'other_fixtures']
+
+# Upper bound on fixtures of one kind per bathroom (e.g., double vanity = 2 sinks)
+MAX_FIXTURES_PER_BATHROOM = 2
+
+
+def _violation(rule: str, section: str, message: str) -> Dict:
+    return {"rule": rule, "section": section, "message": message}
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def check_sections_present(raw_json: Dict, analyzed_pages: Optional[List[int]] = None) -> List[Dict]:
+    """Every section must be present as an object"""
+    return [
+        _violation("section_present", section, f"{section} is missing or not an object")
+        for section in ['meta', *COUNT_SECTIONS, 'review']
+        if not isinstance(raw_json.get(section), dict)
+    ]
+
+
+def check_breakdown_totals(raw_json: Dict, analyzed_pages: Optional[List[int]] = None) -> List[Dict]:
+    """doors.total / windows.total must equal the sum of their by_type breakdown"""
+    violations = []
+
+    for section in ['doors', 'windows']:
+        data = raw_json.get(section)
+        if not isinstance(data, dict) or not isinstance(data.get('by_type'), dict):
+            continue
+
+        total = _number(data.get('total'))
+        parts = [_number(v) for v in data['by_type'].values()]
+        if total is None or any(p is None for p in parts):
+            violations.append(_violation(
+                "breakdown_total", section, f"{section}.total or {section}.by_type has non-numeric values"
+            ))
+            continue
+
+        if total != sum(parts):
+            violations.append(_violation(
+                "breakdown_total", section,
+                f"{section}.total ({total}) != sum of {section}.by_type ({sum(parts)})"
+            ))
+
+    return violations
+
+
+def check_bathroom_fixtures(raw_json: Dict, analyzed_pages: Optional[List[int]] = None) -> List[Dict]:
+    """Toilet/sink counts must be plausible for the bathroom count"""
+    data = raw_json.get('bathrooms')
+    if not isinstance(data, dict):
+        return []
+
+    count = _number(data.get('bathroom_count'))
+    if count is None:
+        return [_violation("bathroom_fixtures", 'bathrooms', "bathrooms.bathroom_count is not numeric")]
+
+    violations = []
+    for fixture in ['toilets', 'sinks']:
+        value = _number(data.get(fixture))
+        if value is None:
+            violations.append(_violation(
+                "bathroom_fixtures", 'bathrooms', f"bathrooms.{fixture} is not numeric"
+            ))
+        elif value < count:
+            violations.append(_violation(
+                "bathroom_fixtures", 'bathrooms',
+                f"{value} {fixture} for {count} bathrooms (expected at least one per bathroom)"
+            ))
+        elif value > count * MAX_FIXTURES_PER_BATHROOM:
+            violations.append(_violation(
+                "bathroom_fixtures", 'bathrooms',
+                f"{value} {fixture} for {count} bathrooms "
+                f"(expected at most {MAX_FIXTURES_PER_BATHROOM} per bathroom)"
+            ))
+
+    bathing = sum(_number(data.get(key)) or 0 for key in ['showers', 'bathtubs'])
+    if bathing > count * MAX_FIXTURES_PER_BATHROOM:
+        violations.append(_violation(
+            "bathroom_fixtures", 'bathrooms',
+            f"{bathing} showers/bathtubs for {count} bathrooms"
+        ))
+
+    return violations
+
+
+def check_evidence_pages(raw_json: Dict, analyzed_pages: Optional[List[int]] = None) -> List[Dict]:
+    """Evidence must point at pages that were actually analyzed"""
+    if analyzed_pages is None:
+        return []
+
+    valid_pages = set(analyzed_pages)
+    violations = []
+
+    for section in COUNT_SECTIONS:
+        data = raw_json.get(section)
+        if not isinstance(data, dict):
+            continue
+
+        for evidence in data.get('evidence') or []:
+            page_no = evidence.get('page_no') if isinstance(evidence, dict) else None
+            if page_no not in valid_pages:
+                violations.append(_violation(
+                    "evidence_page", section,
+                    f"{section} evidence cites page {page_no}, which was not analyzed"
+                ))
+
+    return violations
+
+
+def check_confidence_evidence(raw_json: Dict, analyzed_pages: Optional[List[int]] = None) -> List[Dict]:
+    """High confidence needs evidence, and symbol counting alone is low confidence"""
+    violations = []
+
+    for section in COUNT_SECTIONS:
+        data = raw_json.get(section)
+        if not isinstance(data, dict) or data.get('confidence') != 'high':
+            continue
+
+        sources = {
+            evidence.get('source')
+            for evidence in data.get('evidence') or []
+            if isinstance(evidence, dict)
+        }
+        if not sources:
+            violations.append(_violation(
+                "confidence_evidence", section, f"{section} has high confidence but no evidence"
+            ))
+        elif sources <= {'plan_symbols'}:
+            violations.append(_violation(
+                "confidence_evidence", section,
+                f"{section} has high confidence from symbol counting only"
+            ))
+
+    return violations
+
+
+CONSISTENCY_RULES: List[Callable[[Dict, Optional[List[int]]], List[Dict]]] = [
+    check_sections_present,
+    check_breakdown_totals,
+    check_bathroom_fixtures,
+    check_evidence_pages,
+    check_confidence_evidence,
+]
+
+
+def check_consistency(raw_json: Dict, analyzed_pages: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Run all local consistency rules on an extraction
+
+    Args:
+        raw_json: Raw extraction JSON (Pass 1 output)
+        analyzed_pages: Optional page numbers that were sent to the model
+
+    Returns:
+        List of violations (empty if the extraction is consistent)
+    """
+    if not isinstance(raw_json, dict):
+        return [_violation("section_present", "root", "extraction is not a JSON object")]
+
+    violations = []
+    for rule in CONSISTENCY_RULES:
+        try:
+            violations.extend(rule(raw_json, analyzed_pages))
+        except Exception as e:
+            # A rule tripping over malformed data is itself an inconsistency
+            violations.append(_violation(rule.__name__, "unknown", f"rule failed: {e}"))
+
+    if violations:
+        logger.info(f"Consistency check found {len(violations)} violations")
+    else:
+        logger.info("Consistency check passed")
+
+    return violations
@@ -7,25 +7,32 @@ import logging
 import time
 import tempfile
 import shutil
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, Optional
 
 # Local modules
 import config
 import supabase_io as sio
 import pdf_to_images
 import select_pages
+import memory_profile
 import openai_extract
+import stage_metrics
+import tracing
 import validate
 
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, config.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
+def configure_logging():
+    """Configure root logging (called by entry points, not at import)"""
+    logging.basicConfig(
+        level=getattr(logging, config.LOG_LEVEL),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
 class PlanProcessor:
     """Process a single plan job"""
 
@@ -35,6 +42,9 @@ class PlanProcessor:
         self.file_path = job['file_path']
         self.file_type = job['file_type']
         self.temp_dir = None
+        self.input_sha256 = None  # Set by download_input (hashed while streaming)
+        self.memory = memory_profile.JobMemoryProfile()  # No-op unless MEMORY_PROFILE
+        self.span = tracing.NOOP_SPAN  # The job's trace span (set by process())
 
     def setup_workspace(self) -> str:
         """Create temporary workspace for processing"""
@@ -48,6 +58,29 @@ class PlanProcessor:
             shutil.rmtree(self.temp_dir)
             logger.info(f"Cleaned up workspace: {self.temp_dir}")
 
+    def download_input(self, workspace: str) -> str:
+        """
+        Download the job's input file into the workspace
+
+        Returns:
+            Local path of the downloaded file
+        """
+        local_file = Path(workspace) / "input_file"
+        if self.file_type == 'pdf':
+            local_file = local_file.with_suffix('.pdf')
+        else:
+            local_file = local_file.with_suffix('.png')
+
+        with self.stage("download", kind="client", path=self.file_path) as span:
+            download = sio.download_file(self.file_path, str(local_file))
+            span.set(bytes=download["size"] if download else None)
+        if not download:
+            raise Exception("Failed to download file from storage")
+        self.memory.note(input_mb=round(download["size"] / 1024 / 1024, 2))
+
+        self.input_sha256 = download["sha256"]
+        return str(local_file)
+
     def process(self) -> bool:
         """
         Main processing pipeline
@@ -55,69 +88,136 @@ class PlanProcessor:
         Returns:
             True if successful, False otherwise
         """
-        try:
-            logger.info(f"Starting processing for job {self.job_id}")
-
-            # 1. Setup workspace
-            workspace = self.setup_workspace()
-
-            # 2. Download file from Supabase Storage
-            local_file = Path(workspace) / "input_file"
-            if self.file_type == 'pdf':
-                local_file = local_file.with_suffix('.pdf')
-            else:
-                local_file = local_file.with_suffix('.png')
-
-            success = sio.download_file(self.file_path, str(local_file))
-            if not success:
-                raise Exception("Failed to download file from storage")
-
-            # 3. Process based on file type
-            if self.file_type == 'pdf':
-                result = self.process_pdf(str(local_file), workspace)
-            else:
-                result = self.process_image(str(local_file), workspace)
-
-            return result
+        with stage_metrics.job_in_flight(), tracing.span(
+            "job", parent=None, job_id=self.job_id, file_type=self.file_type
+        ) as self.span:
+            try:
+                trace = f" (trace {self.span.trace_id})" if self.span.trace_id else ""
+                logger.info(f"Starting processing for job {self.job_id}{trace}")
+                self.memory.start()
+
+                # 1. Setup workspace
+                workspace = self.setup_workspace()
+
+                # 2. Download file from Supabase Storage
+                local_file = self.download_input(workspace)
+
+                # 3. Process based on file type
+                if self.file_type == 'pdf':
+                    result = self.process_pdf(local_file, workspace)
+                else:
+                    result = self.process_image(local_file, workspace)
+
+                return result
+
+            except Exception as e:
+                logger.error(f"Processing failed for job {self.job_id}: {e}")
+                self.span.record_error(e)
+                self.span.set(status='failed')
+                sio.update_job_status(self.job_id, 'failed', str(e))
+                stage_metrics.count_job('failed')
+                return False
+
+            finally:
+                # Cleanup
+                self.cleanup_workspace()
+                memory = self.memory.stop()
+                self.log_memory(memory)
+                # Failed jobs too: a job that died after a memory spike is the one to size for
+                sio.save_job_memory(self.job_id, self.job.get('user_id'), memory)
+
+    @contextmanager
+    def stage(self, name: str, kind: str = "internal", **attributes) -> Iterator[tracing.Span]:
+        """
+        Trace and memory-profile the enclosed pipeline stage, and time it when
+        it is one of stage_metrics.STAGES
 
-        except Exception as e:
-            logger.error(f"Processing failed for job {self.job_id}: {e}")
-            sio.update_job_status(self.job_id, 'failed', str(e))
-            return False
+        Yields:
+            The stage's span (add attributes with span.set())
+        """
+        timer = stage_metrics.stage_timer(name) if name in stage_metrics.STAGES else nullcontext()
+        with timer, self.memory.stage(name), tracing.span(name, kind=kind, **attributes) as span:
+            yield span
+
+    def log_memory(self, memory: Optional[Dict]):
+        """Log a job's memory profile summary (peak RSS overall and per stage)"""
+        if not memory:
+            return
+        stages = ", ".join(f"{name} {stage['peak_rss_mb']:.0f}" for name, stage in memory["stages"].items())
+        logger.info(f"Job {self.job_id} memory: peak RSS {memory['peak_rss_mb']:.0f} MB ({stages})")
+
+    def prepare(self, local_file: str, workspace: str) -> Dict:
+        """
+        Prepare extraction inputs for the downloaded file (see prepare_pdf)
+        """
+        if self.file_type == 'pdf':
+            return self.prepare_pdf(local_file, workspace)
+        return self.prepare_image(local_file, workspace)
 
-        finally:
-            # Cleanup
-            self.cleanup_workspace()
+    def prepare_pdf(self, pdf_path: str, workspace: str) -> Dict:
+        """
+        Render, upload and select pages of a PDF for extraction
 
-    def process_pdf(self, pdf_path: str, workspace: str) -> bool:
-        """Process PDF file"""
+        Returns:
+            Dict with extraction inputs:
+            {
+                "image_paths": [...],        # images to analyze, priority order
+                "page_numbers": [...],       # page number of each image
+                "page_info": {...},          # has_schedules / has_legend
+                "page_groups": {...},        # group -> [(page_no, image_path)]
+                "page_texts": {...},         # page_no -> layout text (sent instead of image)
+                "evidence": {...}            # analysis evidence pointers
+            }
+        """
 
         # 1. Render PDF pages to images
         logger.info("Step 1: Rendering PDF pages")
         output_dir = Path(workspace) / "pages"
-        rendered_pages = pdf_to_images.render_pdf_pages(pdf_path, str(output_dir))
+        pyramid = {} if config.PAGE_PYRAMID else None
+        with self.stage("render", dpi=config.PDF_DPI) as span:
+            rendered_pages = pdf_to_images.render_pdf_pages(pdf_path, str(output_dir), pyramid_out=pyramid)
+            span.set(pages=len(rendered_pages))
 
         if not rendered_pages:
             raise Exception("No pages rendered from PDF")
+        stage_metrics.count_pages("rendered", len(rendered_pages))
+        self.memory.note(
+            pages=len(rendered_pages),
+            dpi=config.PDF_DPI,
+            max_page_megapixels=max(
+                (levels["full"]["width"] * levels["full"]["height"] / 1e6 for levels in (pyramid or {}).values()),
+                default=None
+            )
+        )
 
-        # Upload page images as artifacts
-        for page_no, image_path in rendered_pages:
-            sio.upload_artifact(
+        # Upload page images as artifacts (concurrent uploads, one batched insert);
+        # thumbnail/preview/full levels go in each page_image's meta["levels"]
+        with self.stage("upload", artifacts=len(rendered_pages)):
+            sio.upload_artifacts(
                 self.job_id,
-                "page_image",
-                image_path,
-                page_no=page_no,
-                meta={"dpi": config.PDF_DPI}
+                [
+                    {
+                        "kind": "page_image",
+                        "local_file_path": image_path,
+                        "page_no": page_no,
+                        "meta": {"dpi": config.PDF_DPI},
+                        "levels": (pyramid or {}).get(page_no)
+                    }
+                    for page_no, image_path in rendered_pages
+                ]
             )
 
         # 2. Extract text for page selection
         logger.info("Step 2: Extracting text for page selection")
-        page_texts = pdf_to_images.extract_text_from_pdf(pdf_path)
+        with self.stage("text_extraction", pages=len(rendered_pages)):
+            page_texts = pdf_to_images.extract_text_from_pdf(pdf_path)
 
         # 3. Select relevant pages
         logger.info("Step 3: Selecting relevant pages")
-        categorized_pages = select_pages.select_relevant_pages(page_texts, rendered_pages)
-        priority_pages = select_pages.get_page_priority(categorized_pages)
+        with self.stage("selection") as span:
+            categorized_pages = select_pages.select_relevant_pages(page_texts, rendered_pages)
+            priority_pages = select_pages.get_page_priority(categorized_pages)
+            span.set(selected_pages=len(priority_pages))
 
         # If no relevant pages found, use all pages (up to first 10)
         if select_pages.should_process_all_pages(categorized_pages):
@@ -125,83 +225,156 @@ class PlanProcessor:
 
         # Get image paths for priority pages
         page_dict = {page_no: image_path for page_no, image_path in rendered_pages}
-        images_to_analyze = [page_dict[page_no] for page_no in priority_pages if page_no in page_dict]
+        analyzed_pages = [page_no for page_no in priority_pages if page_no in page_dict]
+        images_to_analyze = [page_dict[page_no] for page_no in analyzed_pages]
 
         if not images_to_analyze:
             raise Exception("No pages selected for analysis")
 
         logger.info(f"Analyzing {len(images_to_analyze)} pages")
-
-        # 4. OpenAI 2-pass extraction
-        logger.info("Step 4: Running OpenAI extraction (2-pass)")
+        stage_metrics.count_pages("analyzed", len(images_to_analyze))
 
         page_info = {
             "has_schedules": len(categorized_pages.get("schedule", [])) > 0,
             "has_legend": len(categorized_pages.get("legend", [])) > 0,
         }
 
-        raw_extraction = openai_extract.extract_with_2pass(images_to_analyze, page_info)
-
-        # 5. Validate and normalize
-        logger.info("Step 5: Validating extraction")
-        validated_extraction = validate.validate_with_repair(raw_extraction)
-
-        # 6. Save analysis results
-        logger.info("Step 6: Saving analysis")
-
-        needs_review = validated_extraction['review']['needs_review']
-        confidence_summary = {
-            "doors": validated_extraction['doors']['confidence'],
-            "windows": validated_extraction['windows']['confidence'],
-            "kitchen": validated_extraction['kitchen']['confidence'],
-            "bathrooms": validated_extraction['bathrooms']['confidence'],
-            "other_fixtures": validated_extraction['other_fixtures']['confidence'],
+        # Page groups for concurrent chunked extraction (used when EXTRACTION_ASYNC is on)
+        extraction_groups = select_pages.group_pages_for_extraction(categorized_pages, priority_pages)
+        page_groups = {
+            group: [(page_no, page_dict[page_no]) for page_no in pages if page_no in page_dict]
+            for group, pages in extraction_groups.items()
         }
 
-        analysis_id = sio.save_analysis(
-            job_id=self.job_id,
-            model=config.OPENAI_MODEL,
-            quantities=validated_extraction,
-            confidence=confidence_summary,
-            evidence={
+        # Vector PDFs: send schedule/legend pages as layout text instead of images
+        page_texts = {}
+        if config.EXTRACTION_TEXT_LAYER:
+            text_pages = [
+                page_no
+                for group in config.EXTRACTION_TEXT_LAYER_GROUPS
+                for page_no in extraction_groups.get(group, [])
+            ]
+            if text_pages:
+                with self.stage("text_layer", pages=len(text_pages)):
+                    page_texts = pdf_to_images.extract_layout_text(pdf_path, text_pages)
+
+        return {
+            "image_paths": images_to_analyze,
+            "page_numbers": analyzed_pages,
+            "page_info": page_info,
+            "page_groups": page_groups,
+            "page_texts": page_texts,
+            "evidence": {
                 "analyzed_pages": priority_pages,
                 "total_pages": len(rendered_pages),
-                "page_categorization": categorized_pages
+                "page_categorization": categorized_pages,
+                "text_layer_pages": sorted(page_texts)
             },
-            needs_review=needs_review
-        )
+        }
 
-        if not analysis_id:
-            raise Exception("Failed to save analysis")
+    def prepare_image(self, image_path: str, workspace: str) -> Dict:
+        """
+        Upload a single image and prepare it for extraction (see prepare_pdf)
+        """
 
-        # 7. Update job status
-        final_status = 'needs_review' if needs_review else 'completed'
-        sio.update_job_status(self.job_id, final_status)
+        # Upload image as artifact
+        with self.stage("upload", artifacts=1):
+            sio.upload_artifact(
+                self.job_id,
+                "page_image",
+                image_path,
+                page_no=0,
+                meta={"source": "direct_upload"}
+            )
+        stage_metrics.count_pages("analyzed", 1)
+
+        return {
+            "image_paths": [image_path],
+            "page_numbers": [0],
+            "page_info": None,
+            "page_groups": None,
+            "page_texts": None,
+            "evidence": {"analyzed_pages": [0], "total_pages": 1},
+        }
 
-        logger.info(f"Job {self.job_id} completed successfully with status: {final_status}")
-        return True
+    def process_pdf(self, pdf_path: str, workspace: str) -> bool:
+        """Process PDF file"""
+
+        # 1-3. Render, upload and select pages
+        prepared = self.prepare_pdf(pdf_path, workspace)
+
+        # 4. OpenAI 2-pass extraction
+        logger.info("Step 4: Running OpenAI extraction (2-pass)")
+
+        metrics: Dict = {}
+        try:
+            with self.stage("extraction", pages=len(prepared["image_paths"])):
+                raw_extraction = openai_extract.extract_with_2pass(
+                    prepared["image_paths"],
+                    prepared["page_info"],
+                    prepared["page_groups"],
+                    page_numbers=prepared["page_numbers"],
+                    metrics=metrics,
+                    page_texts=prepared["page_texts"]
+                )
+        finally:
+            stage_metrics.record_passes(metrics)  # Failed extractions too
+
+        # 5-7. Validate, save and update status
+        return self.save_results(raw_extraction, prepared["evidence"], metrics)
 
     def process_image(self, image_path: str, workspace: str) -> bool:
         """Process single image file"""
 
-        # Upload image as artifact
-        sio.upload_artifact(
-            self.job_id,
-            "page_image",
-            image_path,
-            page_no=0,
-            meta={"source": "direct_upload"}
-        )
+        prepared = self.prepare_image(image_path, workspace)
 
         # OpenAI extraction (single image)
         logger.info("Running OpenAI extraction on single image")
 
-        raw_extraction = openai_extract.extract_with_2pass([image_path])
+        metrics: Dict = {}
+        try:
+            with self.stage("extraction", pages=1):
+                raw_extraction = openai_extract.extract_with_2pass(
+                    prepared["image_paths"],
+                    page_numbers=prepared["page_numbers"],
+                    metrics=metrics
+                )
+        finally:
+            stage_metrics.record_passes(metrics)  # Failed extractions too
+
+        return self.save_results(raw_extraction, prepared["evidence"], metrics)
 
-        # Validate
-        validated_extraction = validate.validate_with_repair(raw_extraction)
+    def save_results(
+        self,
+        raw_extraction: Dict,
+        evidence: Dict,
+        metrics: Optional[Dict] = None
+    ) -> bool:
+        """
+        Validate an extraction, save the analysis and set the final job status
+
+        Args:
+            raw_extraction: Extraction JSON from the model
+            evidence: Evidence pointers to store with the analysis
+            metrics: Optional extraction usage metrics (stored as evidence["usage"]
+                and in plan_job_metrics)
+
+        The job's memory profile (MEMORY_PROFILE) is stored as evidence["memory"]
+        and its trace ID (TRACE_FILE / TRACE_OTLP_ENDPOINT) as evidence["trace_id"].
+
+        Returns:
+            True if successful
+        """
+
+        # 5. Validate and normalize
+        logger.info("Step 5: Validating extraction")
+        with self.stage("validation") as span:
+            validated_extraction = validate.validate_with_repair(raw_extraction)
+            span.set(needs_review=validated_extraction['review']['needs_review'])
+
+        # 6. Save analysis results
+        logger.info("Step 6: Saving analysis")
 
-        # Save analysis
         needs_review = validated_extraction['review']['needs_review']
         confidence_summary = {
             "doors": validated_extraction['doors']['confidence'],
@@ -211,23 +384,40 @@ class PlanProcessor:
             "other_fixtures": validated_extraction['other_fixtures']['confidence'],
         }
 
-        analysis_id = sio.save_analysis(
-            job_id=self.job_id,
-            model=config.OPENAI_MODEL,
-            quantities=validated_extraction,
-            confidence=confidence_summary,
-            evidence={"analyzed_pages": [0], "total_pages": 1},
-            needs_review=needs_review
-        )
+        if metrics:
+            evidence = {**evidence, "usage": metrics}
+        if self.input_sha256:
+            evidence = {**evidence, "input_sha256": self.input_sha256}
+        memory = self.memory.summary()
+        if memory:
+            evidence = {**evidence, "memory": memory}
+        if self.span.trace_id:
+            evidence = {**evidence, "trace_id": self.span.trace_id}
+
+        # Analysis, metrics and final status commit together (direct Postgres)
+        with self.stage("save"), sio.transaction():
+            analysis_id = sio.save_analysis(
+                job_id=self.job_id,
+                model=config.OPENAI_MODEL,
+                quantities=validated_extraction,
+                confidence=confidence_summary,
+                evidence=evidence,
+                needs_review=needs_review
+            )
+
+            if not analysis_id:
+                raise Exception("Failed to save analysis")
 
-        if not analysis_id:
-            raise Exception("Failed to save analysis")
+            if metrics:
+                sio.save_job_metrics(self.job_id, self.job.get('user_id'), metrics)
 
-        # Update job status
-        final_status = 'needs_review' if needs_review else 'completed'
-        sio.update_job_status(self.job_id, final_status)
+            # 7. Update job status
+            final_status = 'needs_review' if needs_review else 'completed'
+            sio.update_job_status(self.job_id, final_status)
 
-        logger.info(f"Job {self.job_id} completed successfully")
+        stage_metrics.count_job(final_status)
+        self.span.set(status=final_status)
+        logger.info(f"Job {self.job_id} completed successfully with status: {final_status}")
         return True
 
 
@@ -238,6 +428,10 @@ def main_worker_loop():
     logger.info("Starting Construction Plan Intelligence Worker")
     logger.info(f"Polling interval: {config.POLL_INTERVAL_SECONDS}s")
 
+    if config.METRICS_PORT:
+        if stage_metrics.start_metrics_server(config.METRICS_PORT, config.METRICS_ADDR):
+            stage_metrics.set_queue_depth_source(lambda: sio.count_jobs("queued"))
+
     while True:
         try:
             # Get next queued job
@@ -262,4 +456,5 @@ def main_worker_loop():
 
 
 if __name__ == "__main__":
+    configure_logging()
     main_worker_loop()